@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import csv
+import time
+
+# Implementación actual del repositorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+from dataCollector.dataCollector import DataGatherer
+
+
+CRITERIA = [Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_DISTANCE]
+
+
+def getEdges(filename):
+    """Read a links.csv generated by gen_topos.py (single header line, unlike the IEEE files)"""
+    with open(filename, 'r') as file:
+        reader = csv.reader(file)
+        next(reader)
+        return [{"node_a": row[0], "node_b": row[1], "dist": int(row[2]), "conf": int(row[3])} for row in reader]
+
+
+def bench_topo(folder, confs, root="1"):
+    """Ideal balance of every delta of a gen_topos folder: sparse tree solve vs level-by-level globalBalanceDeltas"""
+    loads = DataGatherer.getLoads(os.path.join(folder, "loads.csv"), 3)
+    edges = getEdges(os.path.join(folder, "links.csv"))
+
+    G = Graph(0, loads, edges, [], confs, root=root)
+
+    # globalBalanceSparse solo acepta selecciones consistentes, así que ambos motores usan la selección reparada
+    alg = Den2ne(G, compact=True, consistent=True)
+    alg.spread_ids()
+
+    rows = list()
+    for criterion in CRITERIA:
+        # Si algún nodo no tiene ninguna ID consistente no hay resolución dispersa (se deja la fila sin ella)
+        try:
+            t0 = time.perf_counter()
+            [balance, abs_flux, _] = alg.globalBalanceSparse(loads, criterion)
+            t_sparse = round(time.perf_counter() - t0, 6)
+        except ValueError:
+            balance = None
+            t_sparse = None
+
+        t0 = time.perf_counter()
+        [ref_balance, _, iterations] = alg.globalBalanceDeltas(loads, criterion, False, False)
+        t_levels = time.perf_counter() - t0
+
+        max_diff = None if balance is None else float(abs(balance - ref_balance).max())
+        rows.append([criterion, len(ref_balance), t_sparse, round(t_levels, 6), int(iterations.max()), max_diff])
+
+    return len(G.names), rows
+
+
+def test_topos(base="topo", conf_path="links_config_8.csv"):
+    out_dir = "results"
+    os.makedirs(out_dir, exist_ok=True)
+    confs = DataGatherer.getEdges_Config(conf_path)
+
+    # Carpetas topo_N de gen_topos.py, de menor a mayor número de nodos
+    folders = sorted(
+        (fld for fld in os.listdir(base) if fld.startswith("topo_")),
+        key=lambda fld: int(fld.split("_")[1]),
+    )
+
+    with open(os.path.join(out_dir, "bench_sparse_balance.csv"), 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Topo", "Nodes", "Criterion", "Deltas", "Sparse(s)", "Levels(s)", "LevelIterations", "MaxBalanceDiff"])
+        for fld in folders:
+            num_nodes, rows = bench_topo(os.path.join(base, fld), confs)
+            for criterion, deltas, t_sparse, t_levels, iterations, max_diff in rows:
+                if t_sparse is None:
+                    print(f"{fld} c{criterion} Sparse: inconsistent IDs Levels:{t_levels:.4f}s ({iterations} it)")
+                else:
+                    print(f"{fld} c{criterion} Sparse:{t_sparse:.4f}s Levels:{t_levels:.4f}s ({iterations} it) Diff:{max_diff:.2e}")
+                w.writerow([fld, num_nodes, criterion, deltas, t_sparse, t_levels, iterations, max_diff])
+
+
+if __name__ == "__main__":
+    test_topos()
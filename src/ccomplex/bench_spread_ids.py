@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import csv
+import time
+import random
+
+# Implementación original (copia autocontenida del arnés de tiempos de spread_id.py)
+import spread_id as legacy
+
+# Implementación actual del repositorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+
+
+SEED = 42
+
+
+def generate_random_edges(num_nodes):
+    """Same topology model as gen_topos.generate_random_graph (spanning tree + 1.5*N extra edges), without pandas"""
+    length_samples = [100,125,150,175,200,225,250,275,300,325,350,375,400,425,450,475,500,525,550,575,650,700,750,800,825,1000]
+    nodes = [str(n) for n in range(1, num_nodes+1)]
+    random.shuffle(nodes)
+    edges = []
+    seen = set()
+    # spanning tree
+    for i in range(num_nodes-1):
+        a, b = nodes[i], nodes[i+1]
+        seen.add(frozenset((a, b)))
+        edges.append({"node_a": a, "node_b": b, "dist": random.choice(length_samples), "conf": random.randint(1, 12)})
+    # extra edges
+    extra_edges = int(num_nodes * 1.5)
+    while len(edges) < num_nodes - 1 + extra_edges:
+        a, b = random.sample(nodes, 2)
+        if frozenset((a, b)) not in seen:
+            seen.add(frozenset((a, b)))
+            edges.append({"node_a": a, "node_b": b, "dist": random.choice(length_samples), "conf": random.randint(1, 12)})
+    return nodes, edges
+
+
+def time_spread(graph_cls, den2ne_cls, loads, edges, confs, root, repeats=3):
+    """Build the graph and time only the ID diffusion phase (best of several repetitions)"""
+    best = None
+    for _ in range(repeats):
+        G = graph_cls(0, loads, edges, [], confs, root=root)
+        alg = den2ne_cls(G)
+        t0 = time.perf_counter()
+        alg.spread_ids()
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, G
+
+
+def test_scaling(sizes=(100, 250, 500, 1000, 2000, 4000), runs=3):
+    random.seed(SEED)
+    conf_path = "links_config_8.csv"
+    out_dir = "results"
+    os.makedirs(out_dir, exist_ok=True)
+    confs = legacy.getEdges_Config(conf_path)
+
+    with open(os.path.join(out_dir, "bench_spread_ids.csv"), 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Nodes", "Run", "Root", "Legacy(s)", "Deque(s)", "Speedup", "SameIDs"])
+        for n in sizes:
+            nodes, edges = generate_random_edges(n)
+            loads = {node: [0.0] for node in nodes}
+            for run in range(1, runs+1):
+                root = random.choice(nodes)
+                t_old, G_old = time_spread(legacy.Graph, legacy.Den2ne, loads, edges, confs, root)
+                t_new, G_new = time_spread(Graph, Den2ne, loads, edges, confs, root)
+                same = all(
+                    [id.hlmac for id in G_old.nodes[node].ids] == [id.hlmac for id in G_new.nodes[node].ids]
+                    for node in nodes
+                )
+                print(f"Topo {n} run{run} Legacy:{t_old:.4f}s Deque:{t_new:.4f}s x{t_old / t_new:.1f} SameIDs:{same}")
+                w.writerow([n, run, root, round(t_old, 6), round(t_new, 6), round(t_old / t_new, 2), same])
+
+
+if __name__ == "__main__":
+    test_scaling()
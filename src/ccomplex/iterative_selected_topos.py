@@ -4,7 +4,7 @@ import time
 import csv
 import os
 import random
-import copy
+import sys
 import numpy as np
 # Compatibility workarounds for NumPy 2.0
 np.float_ = np.float64
@@ -13,6 +13,10 @@ import concurrent.futures
 from functools import partial
 from tqdm import tqdm
 
+# Lectores de CSV (con caché binaria) del repositorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataCollector.dataCollector import DataGatherer
+
 
 SEED = 42
 
@@ -25,69 +29,8 @@ SELECT_TOPOLOGIES = [
     "topo_530","topo_80","topo_830","topo_890","topo_970","topo_100", "topo_10"
 ]
 
-# Datagather
-def getLoads(filename, threshold):
-    """
-        Funcion para recolectar las cargas de los nodos
-    """
-
-    loads = dict()
-
-    try:
-        with open(filename, 'r') as file:
-            reader = csv.reader(file)
-            lines = 0
-            for row in reader:
-                if lines != 0:
-                    loads[row[0]] = [round(float(load), threshold) for load in row[1:]]
-                lines += 1
-
-    except Exception as e:
-        print(str(e))
-
-    return loads
-
-def getEdges(filename):
-    """
-        Funcion para recolectar los enlaces del grafo
-    """
-
-    edges = list()
-
-    try:
-        with open(filename, 'r') as file:
-            reader = csv.reader(file)
-            lines = 0
-            for row in reader:
-                if lines >= 1:
-                    edges.append({"node_a": row[0], "node_b": row[1], "dist": int(row[2]), "conf": int(row[3])})
-                lines += 1
-
-    except Exception as e:
-        print(str(e))
-
-    return edges
-
-def getEdges_Config(filename):
-    """
-        Funcion para recolectar las configuraciones de los enlaces
-    """
-
-    confs = dict()
-
-    try:
-        with open(filename, 'r') as file:
-            reader = csv.reader(file)
-            lines = 0
-            for row in reader:
-                if lines != 0:
-                    confs[int(row[0])] = {"coef_r": float(row[1]), "i_max": float(row[2]), "section": row[3]}
-                lines += 1
-
-    except Exception as e:
-        print(str(e))
-
-    return confs
+# Caché binaria (.npz) de los CSV ya procesados, la de DataGatherer (ver DataGatherer.setCacheDir, None -> sin caché)
+CACHE_DIR = ".den2ne_cache"
 
 # Graph
 class Link(object):
@@ -358,6 +301,39 @@ class Graph(object):
 
         return ret_cap
 
+    def snapshot(self):
+        """
+            Función para guardar el estado mutable del grafo (cargas, IDs activas, dirección y estado de los enlaces
+            y estado de los switches) para restaurarlo después con restore
+        """
+        nodes = self.nodes.values()
+
+        return {
+            "loads": np.array([node.load for node in nodes], dtype=float),
+            "active": np.array([-1 if node.getActiveID() is None else node.ids.index(node.getActiveID()) for node in nodes], dtype=np.int64),
+            "directions": [link.direction for node in nodes for link in node.links],
+            "states": [link.state for node in nodes for link in node.links],
+            "switches": [(self.sw_config[key]['state'], self.sw_config[key]['pruned']) for key in self.sw_config],
+        }
+
+    def restore(self, snapshot):
+        """
+            Función para devolver el grafo al estado guardado con snapshot sin copiar nodos, enlaces ni IDs
+        """
+        for node, load, active in zip(self.nodes.values(), snapshot["loads"].tolist(), snapshot["active"].tolist()):
+            node.load = load
+            for j, id in enumerate(node.ids):
+                id.active = j == active
+
+        links = [link for node in self.nodes.values() for link in node.links]
+        for link, direction, state in zip(links, snapshot["directions"], snapshot["states"]):
+            link.direction = direction
+            link.state = state
+
+        for key, (state, pruned) in zip(self.sw_config, snapshot["switches"]):
+            self.sw_config[key]['state'] = state
+            self.sw_config[key]['pruned'] = pruned
+
     def removeNode(self, name):
         """
             Funcion para eliminar un nodo del grafo
@@ -822,6 +798,21 @@ class Den2ne(object):
             else:
                 self.G.nodes[node].load = 0
 
+    def snapshot(self):
+        """
+        Función para guardar el estado mutable del algoritmo (el del grafo y el listado de IDs globales)
+        """
+        return [self.G.snapshot(), list(self.global_ids)]
+
+    def restore(self, snapshot):
+        """
+        Función para volver al estado guardado con snapshot sin tener que copiar el grafo etiquetado
+        """
+        [graph_snapshot, global_ids] = snapshot
+
+        self.G.restore(graph_snapshot)
+        self.global_ids = list(global_ids)
+
     def clearSelectedIDs(self):
         """
         Función para borrar el flag de active de todas las IDs de cada nodo
@@ -848,16 +839,20 @@ def process_run(base, fld, conf_path, topo_out_dir, run_idx, root, criteria, cri
         np.random.seed(s)
 
         # Leer archivos desde disco (evitamos pasar grandes objetos entre procesos)
+        DataGatherer.setCacheDir(CACHE_DIR)
         p = os.path.join(base, fld)
-        edges = getEdges(os.path.join(p, "links.csv"))
-        loads = getLoads(os.path.join(p, "loads.csv"), 3)
-        confs = getEdges_Config(conf_path)
+        edges = DataGatherer.getEdges(os.path.join(p, "links.csv"), header=1)
+        loads = DataGatherer.getLoads(os.path.join(p, "loads.csv"), 3)
+        confs = DataGatherer.getEdges_Config(conf_path)
 
         # Construir grafo y difundir IDs
         G_root = Graph(0, loads, edges, [], confs, root=root)
         den_root = Den2ne(G_root)
         den_root.spread_ids()  # una vez por root
 
+        # Estado del grafo recién etiquetado, se restaura antes de cada criterio
+        snap_root = den_root.snapshot()
+
         # Nombre fichero CSV para este run/root (guardamos seed para trazabilidad)
         csv_fname = os.path.join(
             topo_out_dir,
@@ -873,11 +868,11 @@ def process_run(base, fld, conf_path, topo_out_dir, run_idx, root, criteria, cri
             for delta in range(num_deltas):
                 row_times = [delta]
 
-                # Nota: aquí hacemos una copia profunda del grafo ya etiquetado para cada criterio
-                # (podríamos optimizar más, pero así mantenemos el comportamiento original)
+                # Restauramos el grafo ya etiquetado para cada criterio (en lugar de una copia profunda),
+                # así los tiempos medidos son los del algoritmo
                 for crit in criteria:
-                    Gc = copy.deepcopy(G_root)
-                    alg = Den2ne(Gc)
+                    den_root.restore(snap_root)
+                    alg = den_root
                     alg.updateLoads(loads, delta)
 
                     t_start = time.time()
@@ -911,6 +906,7 @@ def process_run(base, fld, conf_path, topo_out_dir, run_idx, root, criteria, cri
 def test_all_topos(parallel=True, max_workers=None):
     random.seed(SEED)
     np.random.seed(SEED)
+    DataGatherer.setCacheDir(CACHE_DIR)
 
     base = "topo"
     conf_path = "links_config_8.csv"
@@ -937,7 +933,7 @@ def test_all_topos(parallel=True, max_workers=None):
 
         n = int(fld.split("_")[1])
         p = folder_path
-        loads = getLoads(os.path.join(p, "loads.csv"), 3)
+        loads = DataGatherer.getLoads(os.path.join(p, "loads.csv"), 3)
         all_nodes = list(loads.keys())
         all_nodes.sort()
 
@@ -1,6 +1,10 @@
 #!/usr/bin/python3
 
 import csv
+import hashlib
+import os
+import numpy as np
+from .loadProfile import LoadProfile
 
 
 class DataGatherer(object):
@@ -8,6 +12,82 @@ class DataGatherer(object):
         Clase para recolectar los datos suministrados en formato CSV
     """
 
+    # Directorio de la caché binaria de datos ya procesados (None -> sin caché, ver setCacheDir)
+    CACHE_DIR = None
+
+    @staticmethod
+    def setCacheDir(path):
+        """
+            Funcion para activar (o desactivar con None) la caché binaria (.npz) de los datos procesados
+
+            Cada fichero de entrada se cachea según su ruta, fecha de modificación y tamaño, así que cualquier cambio en
+            el CSV invalida su entrada de la caché.
+        """
+        DataGatherer.CACHE_DIR = path
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def getCachePath(filename, kind, params=()):
+        """
+            Funcion para obtener la ruta en caché de un fichero de entrada ya procesado
+        """
+        stat = os.stat(filename)
+        key = f"{os.path.abspath(filename)}|{stat.st_mtime_ns}|{stat.st_size}|{kind}|{params}"
+
+        return os.path.join(DataGatherer.CACHE_DIR, f"{kind}_{hashlib.sha1(key.encode()).hexdigest()}.npz")
+
+    @staticmethod
+    def readCache(filename, kind, params=()):
+        """
+            Funcion para leer de la caché los arrays de un fichero ya procesado (None si no está o no hay caché)
+        """
+        if DataGatherer.CACHE_DIR is None:
+            return None
+
+        # Sin fichero de entrada no hay entrada en la caché: el lector sin caché es el que informa del error
+        try:
+            path = DataGatherer.getCachePath(filename, kind, params)
+        except OSError:
+            return None
+
+        try:
+            if not os.path.exists(path):
+                return None
+
+            with np.load(path, allow_pickle=False) as data:
+                return {key: data[key] for key in data.files}
+
+        except Exception as e:
+            print(str(e))
+            return None
+
+    @staticmethod
+    def writeCache(filename, kind, arrays, params=()):
+        """
+            Funcion para guardar en la caché los arrays de un fichero procesado
+
+            Se escribe en un fichero temporal y se renombra, para que varios procesos puedan compartir la caché
+        """
+        if DataGatherer.CACHE_DIR is None:
+            return
+
+        try:
+            path = DataGatherer.getCachePath(filename, kind, params)
+        except OSError:
+            return
+
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+
+            with open(tmp_path, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(tmp_path, path)
+
+        except Exception as e:
+            print(str(e))
+
     @staticmethod
     def getLoads(filename, threshold):
         """
@@ -16,6 +96,10 @@ class DataGatherer(object):
 
         loads = dict()
 
+        cached = DataGatherer.readCache(filename, "loads", (threshold,))
+        if cached is not None:
+            return dict(zip(cached["nodes"].tolist(), cached["loads"].tolist()))
+
         try:
             with open(filename, 'r') as file:
                 reader = csv.reader(file)
@@ -26,29 +110,61 @@ class DataGatherer(object):
                                          for load in row[1:]]
                     lines += 1
 
+            # Solo se cachean perfiles rectangulares (todos los nodos con el mismo número de instantes)
+            if len(loads) > 0 and len(set(map(len, loads.values()))) == 1:
+                DataGatherer.writeCache(filename, "loads", {
+                    "nodes": np.array(list(loads), dtype=str),
+                    "loads": np.array(list(loads.values()), dtype=float),
+                }, (threshold,))
+
         except Exception as e:
             print(str(e))
 
         return loads
 
     @staticmethod
-    def getEdges(filename):
+    def getLoadProfile(filename, threshold, cache=None):
+        """
+            Funcion para recolectar las cargas de los nodos como perfil (LoadProfile), opcionalmente mapeado en memoria
+            desde una caché binaria para perfiles que no caben en memoria
+        """
+        return LoadProfile.fromCSV(filename, threshold, cache)
+
+    @staticmethod
+    def getEdges(filename, header=3):
         """
             Funcion para recolectar los enlaces del grafo
+
+            Los ficheros IEEE tienen tres líneas de cabecera; los links.csv de ccomplex/gen_topos.py, una (header=1)
         """
 
         edges = list()
 
+        cached = DataGatherer.readCache(filename, "edges", (header,))
+        if cached is not None:
+            return [
+                {"node_a": node_a, "node_b": node_b, "dist": dist, "conf": conf}
+                for node_a, node_b, dist, conf in zip(cached["node_a"].tolist(), cached["node_b"].tolist(),
+                                                      cached["dist"].tolist(), cached["conf"].tolist())
+            ]
+
         try:
             with open(filename, 'r') as file:
                 reader = csv.reader(file)
                 lines = 0
                 for row in reader:
-                    if lines >= 3:
+                    if lines >= header:
                         edges.append(
                             {"node_a": row[0], "node_b": row[1], "dist": int(row[2]), "conf": int(row[3])})
                     lines += 1
 
+            DataGatherer.writeCache(filename, "edges", {
+                "node_a": np.array([edge["node_a"] for edge in edges], dtype=str),
+                "node_b": np.array([edge["node_b"] for edge in edges], dtype=str),
+                "dist": np.array([edge["dist"] for edge in edges], dtype=np.int64),
+                "conf": np.array([edge["conf"] for edge in edges], dtype=np.int64),
+            }, (header,))
+
         except Exception as e:
             print(str(e))
 
@@ -62,6 +178,14 @@ class DataGatherer(object):
 
         switches = list()
 
+        cached = DataGatherer.readCache(filename, "switches")
+        if cached is not None:
+            return [
+                {"node_a": node_a, "node_b": node_b, "state": state}
+                for node_a, node_b, state in zip(cached["node_a"].tolist(), cached["node_b"].tolist(),
+                                                 cached["state"].tolist())
+            ]
+
         try:
             with open(filename, 'r') as file:
                 reader = csv.reader(file)
@@ -72,6 +196,12 @@ class DataGatherer(object):
                             {"node_a": row[0], "node_b": row[1], "state": row[2]})
                     lines += 1
 
+            DataGatherer.writeCache(filename, "switches", {
+                "node_a": np.array([sw["node_a"] for sw in switches], dtype=str),
+                "node_b": np.array([sw["node_b"] for sw in switches], dtype=str),
+                "state": np.array([sw["state"] for sw in switches], dtype=str),
+            })
+
         except Exception as e:
             print(str(e))
 
@@ -85,12 +215,25 @@ class DataGatherer(object):
 
         postions = list()
 
+        cached = DataGatherer.readCache(filename, "positions")
+        if cached is not None:
+            return [
+                {"node": node, "x": x, "y": y}
+                for node, x, y in zip(cached["node"].tolist(), cached["x"].tolist(), cached["y"].tolist())
+            ]
+
         try:
             with open(filename, 'r') as file:
                 reader = csv.reader(file)
                 for row in reader:
                     postions.append({"node": row[0], "x": float(row[1]), "y": float(row[2])})
 
+            DataGatherer.writeCache(filename, "positions", {
+                "node": np.array([pos["node"] for pos in postions], dtype=str),
+                "x": np.array([pos["x"] for pos in postions], dtype=float),
+                "y": np.array([pos["y"] for pos in postions], dtype=float),
+            })
+
         except Exception as e:
             print(str(e))
 
@@ -104,6 +247,14 @@ class DataGatherer(object):
 
         confs = dict()
 
+        cached = DataGatherer.readCache(filename, "edges_config")
+        if cached is not None:
+            return {
+                conf: {"coef_r": coef_r, "i_max": i_max, "section": section}
+                for conf, coef_r, i_max, section in zip(cached["conf"].tolist(), cached["coef_r"].tolist(),
+                                                        cached["i_max"].tolist(), cached["section"].tolist())
+            }
+
         try:
             with open(filename, 'r') as file:
                 reader = csv.reader(file)
@@ -113,6 +264,13 @@ class DataGatherer(object):
                         confs[int(row[0])] = {"coef_r": float(row[1]), "i_max": float(row[2]), "section": row[3]}
                     lines += 1
 
+            DataGatherer.writeCache(filename, "edges_config", {
+                "conf": np.array(list(confs), dtype=np.int64),
+                "coef_r": np.array([conf["coef_r"] for conf in confs.values()], dtype=float),
+                "i_max": np.array([conf["i_max"] for conf in confs.values()], dtype=float),
+                "section": np.array([conf["section"] for conf in confs.values()], dtype=str),
+            })
+
         except Exception as e:
             print(str(e))
 
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+
+import csv
+import glob
+import hashlib
+import os
+import numpy as np
+
+
+class LoadProfile(object):
+    """
+        Clase para gestionar un perfil de cargas (nodos x instantes) sin tenerlo entero como listas de Python
+
+        Los datos son un array de NumPy (instantes x nodos), que puede estar mapeado en memoria desde una caché binaria
+        (.npy), de forma que solo se leen del disco los instantes que se consultan; al guardarse por instantes, cada
+        instante (y cada bloque de instantes consecutivos) es un único bloque contiguo del fichero. Se comporta como el dict que devuelve DataGatherer.getLoads
+        (loads[nodo][delta], "nodo in loads", len(loads[nodo])...), así que Den2ne.updateLoads y los drivers de main.py
+        lo pueden usar tal cual, instante a instante.
+    """
+
+    def __init__(self, nodes, data):
+        """
+            Constructor de la clase LoadProfile
+        """
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.data = data
+
+    @staticmethod
+    def fromCSV(filename, threshold, cache=None):
+        """
+            Función para leer un perfil de cargas en el formato de DataGatherer.getLoads (mismo redondeo)
+
+            Sin caché se carga el perfil en un único array. Con cache (ruta base sin extensión) el CSV se vuelca, fila a
+            fila, a cache_<clave>.npy (datos) y cache_<clave>_nodes.npy (nombres de los nodos) y se abre mapeado en
+            memoria. La clave depende de la ruta, fecha de modificación y tamaño del CSV y del redondeo (threshold), como
+            en DataGatherer.getCachePath, así que un CSV modificado o un redondeo distinto nunca reutilizan otra caché
+            (ver getCacheKey).
+        """
+        if cache is None:
+            nodes = list()
+            rows = list()
+            for node, row in LoadProfile.readRows(filename, threshold):
+                nodes.append(node)
+                rows.append(row)
+
+            return LoadProfile(nodes, np.ascontiguousarray(np.array(rows, dtype=float).T))
+
+        key = LoadProfile.getCacheKey(filename, threshold)
+        [data_path, nodes_path] = LoadProfile.getCachePaths(cache, key)
+
+        if not LoadProfile.isCacheValid(data_path, nodes_path):
+            LoadProfile.writeCache(filename, threshold, cache, key)
+
+        nodes = np.load(nodes_path, allow_pickle=False).tolist()
+        data = np.load(data_path, mmap_mode="r")
+
+        return LoadProfile(nodes, data)
+
+    @staticmethod
+    def getCacheKey(filename, threshold):
+        """
+            Función para obtener la clave de la caché binaria de un CSV: <fuente>_<versión>, donde la fuente identifica
+            el CSV (ruta absoluta) y el redondeo, y la versión su estado (mtime y tamaño)
+
+            Al separar ambas partes, las cachés de versiones anteriores de la misma fuente se pueden reconocer y borrar
+            (ver pruneCache) sin tocar las de otros redondeos.
+        """
+        stat = os.stat(filename)
+        source = f"{os.path.abspath(filename)}|{threshold}"
+        version = f"{stat.st_mtime_ns}|{stat.st_size}"
+
+        return f"{hashlib.sha1(source.encode()).hexdigest()[:16]}_{hashlib.sha1(version.encode()).hexdigest()[:16]}"
+
+    @staticmethod
+    def getCachePaths(cache, key):
+        """
+            Función para obtener las rutas de los datos y de los nombres de los nodos de la caché con una clave
+        """
+        return [f"{cache}_{key}.npy", f"{cache}_{key}_nodes.npy"]
+
+    @staticmethod
+    def readCSVRows(filename):
+        """
+            Generador que devuelve la cabecera y luego, fila a fila, las filas del CSV que no están vacías
+        """
+        with open(filename, "r", newline="") as file:
+            for row in csv.reader(file):
+                if row:
+                    yield row
+
+    @staticmethod
+    def readRows(filename, threshold):
+        """
+            Generador que devuelve, fila a fila, el nodo y sus cargas redondeadas (sin leer el fichero entero)
+        """
+        rows = LoadProfile.readCSVRows(filename)
+        next(rows)
+        for row in rows:
+            yield row[0], [round(float(load), threshold) for load in row[1:]]
+
+    @staticmethod
+    def isCacheValid(data_path, nodes_path):
+        """
+            Función para comprobar si la caché binaria existe (la clave del nombre ya identifica el CSV y el redondeo)
+        """
+        return os.path.exists(data_path) and os.path.exists(nodes_path)
+
+    @staticmethod
+    def writeCache(filename, threshold, cache, key, block=4096):
+        """
+            Función para volcar el CSV a la caché binaria (instantes x nodos) sin tenerlo entero en memoria
+        """
+        [data_path, nodes_path] = LoadProfile.getCachePaths(cache, key)
+
+        # Primera pasada: dimensiones (número de instantes de la cabecera y número de filas que da el lector CSV, el
+        # mismo que recorre la segunda pasada, así que las líneas vacías no descuadran el tamaño)
+        rows = LoadProfile.readCSVRows(filename)
+        num_deltas = len(next(rows)) - 1
+        num_nodes = sum(1 for _ in rows)
+
+        # Segunda pasada: el CSV viene por nodos, así que se vuelca fila a fila a un fichero temporal por nodos...
+        tmp_rows_path = f"{data_path}.{os.getpid()}.rows.tmp"
+        by_node = np.lib.format.open_memmap(tmp_rows_path, mode="w+", dtype=float, shape=(num_nodes, num_deltas))
+        nodes = list()
+
+        try:
+            for i, (node, row) in enumerate(LoadProfile.readRows(filename, threshold)):
+                if len(row) != num_deltas:
+                    raise ValueError(f"Fila del nodo {node} con {len(row)} cargas en lugar de {num_deltas}")
+                by_node[i] = row
+                nodes.append(node)
+
+            # ... y se traspone por bloques de instantes, cada uno escrito de forma contigua, a un fichero temporal que
+            # se renombra al terminar para que nunca quede una caché a medio escribir con el nombre definitivo
+            tmp_data_path = f"{data_path}.{os.getpid()}.tmp"
+            data = np.lib.format.open_memmap(tmp_data_path, mode="w+", dtype=float, shape=(num_deltas, num_nodes))
+            try:
+                for start in range(0, num_deltas, block):
+                    data[start:start + block] = by_node[:, start:start + block].T
+                data.flush()
+            finally:
+                del data
+
+        finally:
+            del by_node
+            os.remove(tmp_rows_path)
+
+        tmp_nodes_path = f"{nodes_path}.{os.getpid()}.tmp"
+        with open(tmp_nodes_path, "wb") as file:
+            np.save(file, np.array(nodes, dtype=str), allow_pickle=False)
+        os.replace(tmp_nodes_path, nodes_path)
+        os.replace(tmp_data_path, data_path)
+
+        LoadProfile.pruneCache(cache, key)
+
+    @staticmethod
+    def pruneCache(cache, key):
+        """
+            Función para borrar las cachés de versiones anteriores del mismo CSV y redondeo (misma fuente en la clave)
+        """
+        source = key.split("_")[0]
+        current = LoadProfile.getCachePaths(cache, key)
+
+        for path in glob.glob(f"{glob.escape(cache)}_{source}_*.npy"):
+            if path not in current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Por ejemplo, si otro proceso la tiene abierta (mapeada) en un sistema que no deja borrarla
+                    pass
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def __getitem__(self, node):
+        """
+            Cargas de un nodo en todos los instantes (vista, con memmap no se lee nada hasta que se indexa)
+        """
+        return self.data[:, self.index[node]]
+
+    def keys(self):
+        return list(self.nodes)
+
+    def values(self):
+        return (self.data[:, i] for i in range(len(self.nodes)))
+
+    def items(self):
+        return ((node, self.data[:, i]) for i, node in enumerate(self.nodes))
+
+    def getNumDeltas(self):
+        """
+            Función para obtener el número de instantes del perfil
+        """
+        return self.data.shape[0]
+
+    def getDelta(self, delta):
+        """
+            Función para obtener las cargas de todos los nodos en un instante, como dict nodo -> carga
+        """
+        return dict(zip(self.nodes, np.asarray(self.data[delta]).tolist()))
+
+    def window(self, names, start, stop):
+        """
+            Función para obtener un bloque de instantes [start, stop) como matriz alineada con names (por ejemplo,
+            Graph.names); los nodos sin perfil de carga quedan a cero
+        """
+        matrix = np.zeros((len(names), stop - start))
+
+        # Los instantes [start, stop) son un único bloque contiguo de los datos: se leen de una vez
+        rows = [i for i, name in enumerate(names) if name in self.index]
+        columns = [self.index[names[i]] for i in rows]
+        matrix[rows] = np.asarray(self.data[start:stop])[:, columns].T
+
+        return matrix
+
+    def windows(self, names, size):
+        """
+            Generador de bloques consecutivos de como mucho size instantes: devuelve (start, matriz) con window
+        """
+        for start in range(0, self.getNumDeltas(), size):
+            yield start, self.window(names, start, min(start + size, self.getNumDeltas()))
@@ -1,7 +1,14 @@
 #!/usr/bin/python3
 
-from .den2neHLMAC import HLMAC
+from .den2neHLMAC import HLMAC, HLMACCompact
+from .den2neBalance import BalanceTree, IncrementalBalance, SparseBalance
+from collections import OrderedDict, deque
+import heapq
+import itertools
+import numpy as np
 import os
+import time
+from graph.link import Link
 
 
 class Den2ne(object):
@@ -17,28 +24,98 @@ class Den2ne(object):
     CRITERION_POWER_TO_ZERO_WITH_LOSSES = 4
     CRITERION_LOW_LINKS_LOSSES = 5
 
+    # Criterios que dependen de las cargas (la selección cambia al mover potencia)
+    LOAD_CRITERIA = [
+        CRITERION_LINKS_LOSSES,
+        CRITERION_POWER_TO_ZERO,
+        CRITERION_POWER_TO_ZERO_WITH_LOSSES,
+        CRITERION_LOW_LINKS_LOSSES,
+    ]
+
+    # Declaramos los escenarios de balance (ver solve): (withLosses, withCap)
+    SCENARIO_IDEAL = 0
+    SCENARIO_LOSSES = 1
+    SCENARIO_LOSSES_CAP = 2
+    SCENARIOS = {
+        SCENARIO_IDEAL: (False, False),
+        SCENARIO_LOSSES: (True, False),
+        SCENARIO_LOSSES_CAP: (True, True),
+    }
+
     # Fijamos el número máximo de IDs por nodo
     IDS_MAX = 10
 
-    def __init__(self, graph):
+    # Número máximo de selecciones guardadas en la caché de criterios que no dependen de la carga (ver selectBestIDs)
+    SELECTION_CACHE_SIZE = 16
+
+    # Declaramos las métricas para la difusión de las k mejores IDs (ver spread_ids_best): peso de cada enlace
+    METRIC_HOPS = 0
+    METRIC_DISTANCE = 1
+    METRIC_RESISTANCE = 2
+
+    def __init__(self, graph, compact=False, closedFormLosses=False, consistent=False):
         """
         Constructor de la clase Den2ne
+
+        Con compact=True las HLMACs se generan en modo compacto (HLMACCompact): comparten el prefijo con la HLMAC
+        padre en lugar de copiar la lista de saltos, lo que reduce la memoria y el tiempo de difusión en mallas grandes.
+
+        Con closedFormLosses=True las perdidas de cada ID hasta el root (criterios por perdidas) se aproximan en O(1)
+        con la resistencia acumulada del camino, sin descontar las perdidas de cada salto a la potencia incidente.
+
+        Con consistent=True cada selección de IDs (selectBestIDs, y con ella solve) termina con consistentIDs, así que
+        una sola pasada de globalBalance no deja cargas encerradas. Por defecto se mantiene la selección de cada
+        criterio tal cual y las cargas encerradas se resuelven repitiendo selección y balance, como en main.py.
         """
         self.G = graph
         self.global_ids = list()
         self.root = graph.root
+        self.compact = compact
+        self.hlmac_type = HLMACCompact if compact else HLMAC
+        self.closedFormLosses = closedFormLosses
+        self.consistent = consistent
+
+
+        # Estado del balance incremental (ver incrementalBalance) y versión de la selección con la que se construyó
+        self.incremental = None
+        self.incremental_version = None
+
+        # Nodos (distintos del root) con carga encerrada tras el último balance y versión de las cargas del grafo con
+        # la que se calcularon (ver getEnclosedNodes)
+        self.enclosed = None
+        self.enclosed_version = None
+
+        # Caché LRU de selecciones de los criterios que no dependen de la carga (ver getSelectionKey)
+        self.selection_cache = OrderedDict()
+
+        # Número de switches que han cambiado de estado al aplicar las selecciones (ver setSwitchesConfig)
+        self.switch_toggles = 0
+
+        # Arrays de todas las IDs del grafo para puntuarlas en bloque y versión de las IDs con la que se construyeron
+        # (ver getIDsArrays)
+        self.ids_arrays = None
+        self.ids_arrays_version = None
+
+        # Orden de balance (IDs de mayor a menor longitud) y selección de la que se obtuvo (ver getBalanceOrder)
+        self.balance_order = None
+        self.balance_order_ids = None
 
     def spread_ids(self):
         """
         Funcion para difundir los IDs entre todos los nodos del grafo
         """
 
-        # Var aux: lista con los nodos que debemos visitar (Va a funcionar como una pila)
-        nodes_to_attend = list()
+        # Var aux: cola FIFO con los nodos que debemos visitar. Hay una entrada por cada HLMAC recibida para respetar
+        # el orden de llegada (que es el que decide qué IDs entran antes de alcanzar IDS_MAX)
+        nodes_to_attend = deque()
+
+        # Var aux: número de IDs de cada nodo que ya se han difundido. Las IDs se marcan como usadas en el orden en el
+        # que llegan, así que si no hay IDs nuevas la entrada de la cola se descarta en O(1)
+        ids_spread = dict()
 
         # Empezamos por el root, como no tiene padre el root, su HLMAC parent addr es None -> No hereda.
         # además, no tiene ninguna dependencia (es decir no tiene ninguno enlace por delante de el de tipo switch)
-        self.G.nodes[self.root].ids.append(HLMAC(None, self.root, None))
+        self.G.nodes[self.root].addID(self.hlmac_type(None, self.root, None))
 
         # El primero en ser visitado es el root
         nodes_to_attend.append(self.root)
@@ -46,263 +123,305 @@ class Den2ne(object):
         # Mientras haya nodos a visitar...
         while len(nodes_to_attend) > 0:
 
-            curr_node = self.G.nodes[nodes_to_attend[0]]
-
-            # Iteramos por las posibles IDs disponibles en el nodo
-            for i in range(0, len(curr_node.ids)):
-
-                if not curr_node.ids[i].used:
-
-                    # Iteramos por los vecinos del primer nodo a atender
-                    for neighbor in curr_node.neighbors:
-
-                        # Vamos a comprobar antes de asignar IDs al vecino, que no hay bucles
-                        if HLMAC.hlmac_check_loop(curr_node.ids[i], neighbor):
-                            pass
-                        elif len(self.G.nodes[neighbor].ids) >= Den2ne.IDS_MAX:
-                            pass
-                        else:
-                            # Si no hay bucles asignamos la ID al vecino
-
-                            # Vamos a comprobar si la relación del nodo con el vecino viene dada por un enlace de tipo switch
-                            id_switch_node = self.G.findSwitchID(curr_node.name)
-                            id_switch_neighbor = self.G.findSwitchID(neighbor)
-
-                            if id_switch_node == id_switch_neighbor:
-                                self.G.nodes[neighbor].ids.append(
-                                    HLMAC(curr_node.ids[i], neighbor, id_switch_node)
-                                )
-                            else:
-                                self.G.nodes[neighbor].ids.append(
-                                    HLMAC(curr_node.ids[i], neighbor, None)
-                                )
-
-                            # Registramos el vecino emn la pila para ser visitado más adelante
-                            nodes_to_attend.append(neighbor)
-
-                    # Y tenemos que marcar la HLMAC como que ya ha sido usada
-                    self.G.nodes[nodes_to_attend[0]].ids[i].used = True
-
-            # Por último desalojamos al nodo atendido
-            nodes_to_attend.pop(0)
-
-    def flowInertia(self, ids_to_fix=None, n_repetition=None):
-        """
-        Función para preservar la coherencia en el grafo de los distintos flujos
-        """
-        if (
-            ids_to_fix != None
-        ):  # Si no es la primera llamada de flowInertia, entonces cogemos las ids que no se han cambiado para tratar con ellas
-            ids_list = ids_to_fix
-        else:  # Si es la primera vez que se llama a flowInertia, se ejecuta seleccionando las IDs más grandes
-            # Vamos a ordenar la lista de globals ids
-            self.global_ids.sort(key=Den2ne.key_sort_by_HLMAC_len, reverse=True)
-            ids_list = [
-                j
-                for j in self.global_ids
-                if len(self.global_ids[0].hlmac) == len(j.hlmac)
-            ]
-        for ids_max_len in ids_list:
-            for i in range(len(ids_max_len.hlmac) - 2, 0, -1):
-
-                # Vamos a ver la ID más larga en el camino hacia el root
-                nextNode = self.G.nodes[ids_max_len.hlmac[i]]
-
-                # Miramos el index que debería haber
-                nextID = nextNode.ids[nextNode.getIndexID(ids_max_len.hlmac[0 : i + 1])]
-
-                if nextID not in self.global_ids:
-                    # Sacamos la ID antigua de la lista
-                    self.global_ids.remove(nextNode.getActiveID())
-
-                    # Establecemos como activa la nueva ID
-                    self.G.nodes[ids_max_len.hlmac[i]].ids[
-                        nextNode.ids.index(nextNode.getActiveID())
-                    ].active = False
-                    self.G.nodes[ids_max_len.hlmac[i]].ids[
-                        nextNode.ids.index(nextID)
-                    ].active = True
-
-                    # Actualizamos la lista
-                    self.global_ids.append(nextID)
-
-                    # Por último, notificamos a nuestros vecinos de la ramas anexas a la rama
-                    # principal, para que sean conscientes de la incercia que está ocurriendo
-                    # en aras de que entregen su potencia, antes que se recorra el camino principal
-                    for neighbor in nextNode.neighbors:
-
-                        # Para que sea un vecino valido no tiene que ser ni el nextHop ni el anterior
-                        if (
-                            neighbor not in ids_max_len.hlmac
-                        ):  # Pongo esto porque si está en la id principal ya lo vamos a revisar más tarde y es tiempo de computo perdido creo yo
-
-                            # En este punto desconocemos la longitud de la rama.. por ello vamos a recorrerla con un while
-                            branch_nodes_to_attend = [neighbor]
-                            branch_nodes_to_attended = [nextNode.name]
-
-                            while len(branch_nodes_to_attend) > 0:
-
-                                # Hay que visitar todos los vecinos de la rama que no hayan sido visitados
-                                curr_node = self.G.nodes[branch_nodes_to_attend[0]]
-                                # Bucle de exploración, comprobamos que no hayan sido visitados
-                                # Atendemos al nodo en cuestión, si su HLMAC es más corta que el nodo de la rama
-                                # principal, hay un problema.. hay que cambiar la HLMAC activa por la HLMAC que siga la incercia del
-                                # camino principal
-                                # Creo que esto deberíamos hacerlo solo si su anterior paso es el nodo que hemos cambiado
-                                # es decir, si en este caso hemos cambiado el 0, solo cambiar los que en su ids tengan un 0
-                                if nextID.getOrigin() in curr_node.getActiveID().hlmac:
-                                    # Entonces este nodo está utilizando el nodo cuya ids hemos cambiado
-                                    # Tenemos que revisar que esta ID esté bien
-                                    if len(curr_node.getActiveID().hlmac) <= len(
-                                        nextID.hlmac
-                                    ) or nextID.hlmac.index(
-                                        nextNode.name
-                                    ) != curr_node.getActiveID().hlmac.index(
-                                        nextNode.name
-                                    ):
-                                        possible_id = list()
-                                        # Con la conectividad alta pueden darse casos que incluyan todos los nodos necesarios, más unos extras que no se corresponden con la id que queremos
-                                        # Entonces lo que hacemos es guardar todas las ids que cumplen la condición de los saltos, y cogemos la más pequeña, que es la que tiene los saltos necesarios, sin extras
-                                        for id in curr_node.ids:
-                                            if all(
-                                                hop in id.hlmac for hop in nextID.hlmac
-                                            ):
-                                                possible_id.append(id)
-                                        if possible_id:
-                                            possible_id.sort(
-                                                key=Den2ne.key_sort_by_HLMAC_len
-                                            )  # Cogemos la más pequeña
-                                            # Sacamos la ID antigua de la lista
-                                            self.global_ids.remove(
-                                                curr_node.getActiveID()
-                                            )
-
-                                            # Marcamos como activa la nueva ID
-                                            self.G.nodes[branch_nodes_to_attend[0]].ids[
-                                                curr_node.ids.index(
-                                                    curr_node.getActiveID()
-                                                )
-                                            ].active = False
-                                            self.G.nodes[branch_nodes_to_attend[0]].ids[
-                                                curr_node.ids.index(possible_id[0])
-                                            ].active = True
-
-                                            # Añadidmos la nueva ID a la lista
-                                            self.global_ids.append(possible_id[0])
-                                            # Si cambiamos la id, añadimos los vecinos a revisar
-                                            for neig in curr_node.neighbors:
-                                                if neig not in branch_nodes_to_attended:
-                                                    branch_nodes_to_attend.append(neig)
-
-                                    # Desalojamos al nodo atendido, y lo marcamos como atendido
-                                    branch_nodes_to_attended.append(curr_node.name)
-                                    branch_nodes_to_attend.pop(0)
-                                else:
-                                    # Desalojamos al nodo atendido, y lo marcamos como atendido
-                                    branch_nodes_to_attended.append(curr_node.name)
-                                    branch_nodes_to_attend.pop(0)
-        # Una vez realizado flow inertia revisamos que los ids sean correctos
-        # Para evitar bucles infinitos pasamos el parámetro repeticion
-        if n_repetition == None or n_repetition <= 10:
-            self.IDsCheck(n_repetition)
-
-    def selectBestIDs(self, criterion):
+            curr_node = self.G.nodes[nodes_to_attend.popleft()]
+
+            # Si desde la última visita no ha llegado ninguna ID nueva no hay nada que hacer
+            first = ids_spread.get(curr_node.name, 0)
+            if first == len(curr_node.ids):
+                continue
+
+            # La relación con cada vecino (switch o no) no depende de la ID, la resolvemos una sola vez por visita
+            neighbors = self.getSpreadNeighbors(curr_node)
+
+            # Iteramos por las IDs pendientes de difundir en el nodo
+            for i in range(first, len(curr_node.ids)):
+
+                # Iteramos por los vecinos del nodo a atender
+                for neighbor, dependency, link in neighbors:
+
+                    # Vamos a comprobar antes de asignar IDs al vecino que no está lleno y que no hay bucles
+                    if len(neighbor.ids) >= Den2ne.IDS_MAX:
+                        pass
+                    elif self.hlmac_type.hlmac_check_loop(curr_node.ids[i], neighbor.name):
+                        pass
+                    else:
+                        # Si no hay bucles asignamos la ID al vecino, con la dependencia del switch si
+                        # la relación del nodo con el vecino viene dada por un enlace de tipo switch. Con el enlace
+                        # del vecino hacia el nodo se acumulan las métricas del camino (distancia y resistencia)
+                        neighbor.addID(self.hlmac_type(curr_node.ids[i], neighbor.name, dependency, link))
+
+                        # Registramos el vecino en la cola para ser visitado más adelante
+                        nodes_to_attend.append(neighbor.name)
+
+                # Y tenemos que marcar la HLMAC como que ya ha sido usada
+                curr_node.ids[i].used = True
+
+                # En modo compacto ya no vamos a comprobar más bucles con esta HLMAC
+                if self.compact:
+                    curr_node.ids[i].releaseHops()
+
+            ids_spread[curr_node.name] = len(curr_node.ids)
+
+    def getSpreadNeighbors(self, node):
+        """
+        Función para obtener, para cada vecino de un nodo, el vecino, la dependencia del switch que los une (None si no
+        la hay) y el enlace del vecino hacia el nodo (con el que se acumulan las métricas del camino)
+        """
+        id_switch_node = self.G.findSwitchID(node.name)
+
+        return [
+            (
+                self.G.nodes[neighbor],
+                id_switch_node if id_switch_node == self.G.findSwitchID(neighbor) else None,
+                self.G.getLink(neighbor, node.name),
+            )
+            for neighbor in node.neighbors
+        ]
+
+    @staticmethod
+    def getMetricWeight(metric):
+        """
+        Función para obtener el peso de un enlace según la métrica de difusión (una de las METRIC_* o una función
+        enlace -> peso no negativo)
+        """
+        if callable(metric):
+            return metric
+        elif Den2ne.METRIC_HOPS == metric:
+            return lambda link: 1
+        elif Den2ne.METRIC_DISTANCE == metric:
+            return lambda link: link.dist
+        elif Den2ne.METRIC_RESISTANCE == metric:
+            return lambda link: link.getResistance()
+
+        raise ValueError(f"Unknown spread metric: {metric}")
+
+    def spread_ids_best(self, metric=METRIC_HOPS, k=None):
+        """
+        Funcion para difundir los IDs quedándose, en cada nodo, con las k mejores HLMACs (sin bucles) según una métrica
+
+        Alternativa a spread_ids: en lugar de aceptar las IDS_MAX primeras HLMACs que llegan, las candidatas se
+        expanden por orden de coste del camino (suma de los pesos de los enlaces, ver getMetricWeight) con una cola de
+        prioridad. Cada nodo acepta las k primeras que salen de la cola, que son las de menor coste, y solo las aceptadas
+        se difunden, por lo que el trabajo queda acotado a k expansiones por nodo. Las IDs de cada nodo quedan
+        ordenadas de menor a mayor coste.
+        """
+        if k is None:
+            k = Den2ne.IDS_MAX
+
+        weight = Den2ne.getMetricWeight(metric)
+
+        # Var aux: cola de prioridad con las candidatas (coste, orden de llegada, HLMAC padre, nodo, dependencia,
+        # enlace). La HLMAC solo se crea si la candidata se acepta
+        candidates = list()
+        order = itertools.count()
+
+        # Var aux: vecinos de cada nodo (con el peso del enlace), se resuelven la primera vez que se acepta una ID en el nodo
+        neighbors = dict()
+
+        # Empezamos por el root, que no tiene padre ni dependencias
+        heapq.heappush(candidates, (0, next(order), None, self.G.nodes[self.root], None, None))
+
+        while len(candidates) > 0:
+            (cost, _, parent, curr_node, dependency, link) = heapq.heappop(candidates)
+
+            # Si el nodo ya tiene sus k mejores IDs la candidata se descarta
+            if len(curr_node.ids) >= k:
+                continue
+
+            curr_id = self.hlmac_type(parent, curr_node.name, dependency, link)
+            curr_node.addID(curr_id)
+
+            if curr_node.name not in neighbors:
+                neighbors[curr_node.name] = [
+                    (neighbor, dependency, link, weight(link))
+                    for neighbor, dependency, link in self.getSpreadNeighbors(curr_node)
+                ]
+
+            # Difundimos la ID aceptada a los vecinos que todavía no están llenos y con los que no hay bucle
+            for neighbor, dependency, link, link_weight in neighbors[curr_node.name]:
+                if len(neighbor.ids) < k and not self.hlmac_type.hlmac_check_loop(curr_id, neighbor.name):
+                    heapq.heappush(candidates, (cost + link_weight, next(order), curr_id, neighbor, dependency, link))
+
+            curr_id.used = True
+
+            # En modo compacto ya no vamos a comprobar más bucles con esta HLMAC
+            if self.compact:
+                curr_id.releaseHops()
+
+    def selectBestIDs(self, criterion, nodes=None):
         """
         Función para decidir la mejor ID de en nodo dado un criterio
+
+        Con nodes (listado de nombres) solo se vuelve a decidir la ID de esos nodos: el resto conserva su ID activa y
+        global_ids pasa a tener las IDs activas de todos los nodos.
+
+        Los criterios que no dependen de la carga (número de saltos y distancia) dan siempre la misma selección sobre
+        las mismas IDs, así que al seleccionar todos los nodos (con global_ids vacío, tras clearSelectedIDs) el
+        resultado se guarda en una caché LRU y, si ya estaba, se restaura en O(n) en lugar de recalcularlo.
+
+        Con consistent (ver el constructor) la selección se hace coherente con consistentIDs antes de configurar los
+        switches.
         """
+        key = None
+        if nodes is None and criterion not in Den2ne.LOAD_CRITERIA and len(self.global_ids) == 0:
+            key = self.getSelectionKey(criterion)
+
+            if key in self.selection_cache:
+                self.selection_cache.move_to_end(key)
+                self.restoreSelection(self.selection_cache[key])
+                return
 
         # Vamos a elegir la mejor ID para cada nodo
         if Den2ne.CRITERION_NUM_HOPS == criterion:
-            self.selectBestID_by_hops()
+            self.selectBestID_by_hops(nodes)
 
         elif Den2ne.CRITERION_DISTANCE == criterion:
-            self.selectBestID_by_distance()
+            self.selectBestID_by_distance(nodes)
 
         elif Den2ne.CRITERION_LINKS_LOSSES == criterion:
-            self.selectBestID_by_Links_Losses()
+            self.selectBestID_by_Links_Losses(nodes)
 
         elif Den2ne.CRITERION_POWER_TO_ZERO == criterion:
-            self.selectBestID_by_power2zero()
+            self.selectBestID_by_power2zero(nodes=nodes)
 
         elif Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES == criterion:
-            self.selectBestID_by_power2zero_with_Losses()
+            self.selectBestID_by_power2zero_with_Losses(nodes)
 
         elif Den2ne.CRITERION_LOW_LINKS_LOSSES == criterion:
-            self.selectBestID_by_lowLinks_Losses()
+            self.selectBestID_by_lowLinks_Losses(nodes=nodes)
+
+        if nodes is not None:
+            self.global_ids = [node.getActiveID() for node in self.G.nodes.values()]
 
-        # Por último, vamos a ver el las dependencias con los switchs y activar aquellos que sean necesarios
-        dependences = list(
-            set(sum([active_ids.depends_on for active_ids in self.global_ids], []))
+        if self.consistent:
+            self.consistentIDs()
+
+        dependences = self.setSwitchesConfig()
+
+        if key is not None:
+            self.selection_cache[key] = [
+                [node.active_index for node in self.G.nodes.values()],
+                list(self.global_ids),
+                dependences,
+            ]
+            if len(self.selection_cache) > Den2ne.SELECTION_CACHE_SIZE:
+                self.selection_cache.popitem(last=False)
+
+    def getSelectionKey(self, criterion):
+        """
+        Función para obtener la clave de la caché de selecciones: el criterio y el estado del que depende la selección
+        cuando no influyen las cargas (la versión de las IDs de los nodos, el número de nodos, los switches podados y si
+        la selección se hace consistente, ver consistentIDs)
+
+        El estado abierto/cerrado de los switches no forma parte de la clave a propósito: no influye en la selección,
+        sino que es su resultado (setSwitchesConfig lo deriva de las IDs activas y restoreSelection lo restaura).
+        """
+        return (
+            criterion,
+            self.consistent,
+            self.G.selection.ids_version,
+            len(self.G.nodes),
+            tuple(sw["pruned"] for sw in self.G.sw_config.values()),
         )
 
-        for sw in self.G.sw_config:
-            if not self.G.sw_config[sw]["pruned"]:
-                self.G.setSwitchConfig(sw, "open")
+    def restoreSelection(self, entry):
+        """
+        Función para restaurar una selección guardada en la caché: ID activa de cada nodo, global_ids y switches
+        """
+        [active_indices, global_ids, dependences] = entry
+
+        for node, index in zip(self.G.nodes.values(), active_indices):
+            node.setActiveID(index)
+
+        self.global_ids = list(global_ids)
+        self.setSwitchesConfig(dependences)
+
+    def setSwitchesConfig(self, dependences=None):
+        """
+        Función para abrir los switches (no podados) y cerrar aquellos de los que dependen las IDs globales
+
+        Las dependencias se unen como máscara de bits (HLMAC.depends_mask) y solo se tocan los switches cuyo estado
+        cambia; el número de cambios se acumula en switch_toggles. Devuelve la máscara de switches cerrados; si ya se
+        conoce (ver restoreSelection) se puede pasar con dependences.
+        """
+        # Vamos a ver el las dependencias con los switchs y activar aquellos que sean necesarios
+        if dependences is None:
+            dependences = 0
+            for active_id in self.global_ids:
+                dependences |= active_id.depends_mask
+
+        for sw, config in self.G.sw_config.items():
+            if (dependences >> sw) & 1:
+                state = "closed"
+            elif not config["pruned"]:
+                state = "open"
+            else:
+                continue
+
+            if config["state"] != state:
+                self.G.setSwitchConfig(sw, state)
+                self.switch_toggles += 1
 
-        for deps in dependences:
-            self.G.setSwitchConfig(deps, "closed")
+        return dependences
 
-    def selectBestID_by_hops(self):
+    def selectBestID_by_hops(self, nodes=None):
         """
         Función para decidir la mejor ID de un nodo por numero de saltos al root
         """
-        for node in self.G.nodes:
-            lens = [len(id.hlmac) for id in self.G.nodes[node].ids]
+        for node in self.G.nodes if nodes is None else nodes:
+            lens = [id.depth for id in self.G.nodes[node].ids]
 
             # La ID con un menor tamaño será la ID con menor numero de saltos al root
             # Por ello, esa será la activa.
-            self.G.nodes[node].ids[lens.index(min(lens))].active = True
+            self.G.nodes[node].setActiveID(lens.index(min(lens)))
             self.global_ids.append(self.G.nodes[node].getActiveID())
 
-    def selectBestID_by_distance(self):
+    def selectBestID_by_distance(self, nodes=None):
         """
         Función para decidir la mejor ID de un nodo por distancia al root
         """
-        for node in self.G.nodes:
+        for node in self.G.nodes if nodes is None else nodes:
             dists = [self.getTotalDistance(id) for id in self.G.nodes[node].ids]
 
-            self.G.nodes[node].ids[dists.index(min(dists))].active = True
+            self.G.nodes[node].setActiveID(dists.index(min(dists)))
             self.global_ids.append(self.G.nodes[node].getActiveID())
 
-        #self.flowInertia()
-
     def getTotalDistance(self, id):
         """
         Funcion para calcular la distancia total de una HLMAC
         """
+        # Si la métrica se acumuló al difundir la ID no hace falta recorrer el camino
+        if id.dist is not None:
+            return id.dist
+
         distances = 0
-        for i in range(0, len(id.hlmac) - 1):
-            distances += (
-                self.G.nodes[id.hlmac[i]]
-                .links[self.G.nodes[id.hlmac[i]].neighbors.index(id.hlmac[i + 1])]
-                .dist
-            )
+        hops = id.hlmac
+        for i in range(0, len(hops) - 1):
+            distances += self.G.getLink(hops[i], hops[i + 1]).dist
 
         return distances
 
-    def selectBestID_by_Links_Losses(self):
+    def selectBestID_by_Links_Losses(self, nodes=None):
         """
         Función para decidir la mejor ID de un nodo en función de sus perdidas al root
         """
-        for node in self.G.nodes:
+        for node in self.G.nodes if nodes is None else nodes:
             losses = [self.getTotalLinks_Losses(id) for id in self.G.nodes[node].ids]
 
-            self.G.nodes[node].ids[losses.index(min(losses))].active = True
+            self.G.nodes[node].setActiveID(losses.index(min(losses)))
             self.global_ids.append(self.G.nodes[node].getActiveID())
 
-        #self.flowInertia()
-
-    def selectBestID_by_lowLinks_Losses(self, alpha=0.5, beta=0.5):
+    def selectBestID_by_lowLinks_Losses(self, alpha=0.5, beta=0.5, nodes=None):
         """
         Función para decidir la mejor ID de un nodo en función de sus perdidas al root
         """
-        for node in self.G.nodes:
+        for node in self.G.nodes if nodes is None else nodes:
             ids = self.G.nodes[node].ids
-            scores = [ alpha * self.getTotalLinks_Losses(id) + beta * len(id.hlmac) for id in ids]
+            scores = [ alpha * self.getTotalLinks_Losses(id) + beta * id.depth for id in ids]
 
             # Seleccionar el ID con el menor score
             best_index = scores.index(min(scores))
-            ids[best_index].active = True
+            self.G.nodes[node].setActiveID(best_index)
             self.global_ids.append(self.G.nodes[node].getActiveID())
 
     def getTotalLinks_Losses(self, id):
@@ -310,65 +429,81 @@ class Den2ne(object):
         Funcion para calcular las perdidas desde un nodo dado al root
         """
 
-        init_node = self.G.nodes[id.hlmac[len(id.hlmac) - 1]]
+        # Aproximación en forma cerrada: la potencia del origen atraviesa la resistencia acumulada del camino
+        if self.closedFormLosses and id.r_eff is not None:
+            return Link.getLosses_R(self.G.nodes[id.getOrigin()].load, id.r_eff)
+
+        # Con las resistencias de cada salto ya calculadas subimos por las HLMACs padre, sin buscar enlaces
+        if id.r_link is not None:
+            curr_load = self.G.nodes[id.getOrigin()].load
+            total_losses = 0
+            curr_id = id
+
+            while curr_id.parent is not None:
+                losses = Link.getLosses_R(curr_load, curr_id.r_link)
+                total_losses += losses
+
+                curr_load -= losses
+                curr_id = curr_id.parent
+
+            return total_losses
+
+        hops = id.hlmac
+        init_node = self.G.nodes[hops[len(hops) - 1]]
         curr_load = init_node.load
         losses = 0
         total_losses = 0
 
-        for i in range(len(id.hlmac) - 1, 0, -1):
-            curr_node = self.G.nodes[id.hlmac[i]]
+        for i in range(len(hops) - 1, 0, -1):
+            link = self.G.getLink(hops[i], hops[i - 1])
 
-            total_losses += curr_node.links[
-                curr_node.neighbors.index(id.hlmac[i - 1])
-            ].getLosses(curr_load)
-            losses = curr_node.links[
-                curr_node.neighbors.index(id.hlmac[i - 1])
-            ].getLosses(curr_load)
+            losses = link.getLosses(curr_load)
+            total_losses += losses
 
             curr_load -= losses
 
         return total_losses
 
-    def selectBestID_by_power2zero(self, alpha=0.5, beta=0.5):
+    def selectBestID_by_power2zero(self, alpha=0.5, beta=0.5, nodes=None):
         """
         Función para decidir la mejor ID de un nodo cercanía de potecia a cero, al root
         """
-        for node in self.G.nodes:
-            ids = self.G.nodes[node].ids
-            scores = [  alpha * self.getTotalPower2Zero(id) + beta * len(id.hlmac)  for id in ids ]
+        [origins, next_hops, slots, depths, not_root] = self.getIDsArrays()[1:]
+        loads = self.getLoadsArray()
 
-            # Seleccionar el ID con el menor score
-            best_index = scores.index(min(scores))
-            ids[best_index].active = True
-            self.global_ids.append(self.G.nodes[node].getActiveID())
+        # Misma expresión que getTotalPower2Zero, para todas las IDs a la vez
+        origin_load = loads[origins]
+        dst_load = loads[next_hops]
+        power2zero = np.where(not_root, np.abs(dst_load + origin_load), origin_load)
 
-        #self.flowInertia()
+        self.selectBestID_by_scores(alpha * power2zero + beta * depths, nodes)
 
     def getTotalPower2Zero(self, id):
         """
         Función para calcular la distancia a zero de la suma de la potencia origen y la destino
         """
         # En caso de que seamos el root
-        if len(id.hlmac) == 1:
+        if id.depth == 1:
             return self.G.nodes[id.getOrigin()].load
         else:
             origin_load = self.G.nodes[id.getOrigin()].load
             dst_load = self.G.nodes[id.getNextHop()].load
             return abs(dst_load + origin_load)
 
-    def selectBestID_by_power2zero_with_Losses(self):
+    def selectBestID_by_power2zero_with_Losses(self, nodes=None):
         """
         Función para decidir la mejor ID de un nodo cercanía de potecia a cero, al root teniendo en cuenta las perdidas
         """
-        for node in self.G.nodes:
-            power2zero = [
-                self.getTotalPower2Zero_with_Losses(id) for id in self.G.nodes[node].ids
-            ]
+        [origins, next_hops, slots, depths, not_root] = self.getIDsArrays()[1:]
+        loads = self.getLoadsArray()
 
-            self.G.nodes[node].ids[power2zero.index(min(power2zero))].active = True
-            self.global_ids.append(self.G.nodes[node].getActiveID())
+        # Misma expresión que getTotalPower2Zero_with_Losses, para todas las IDs a la vez
+        origin_load = loads[origins]
+        dst_load = loads[next_hops]
+        losses = Link.losses(origin_load, self.G.loss_coef[slots])
+        power2zero = np.where(not_root, np.abs(dst_load + origin_load - losses), origin_load)
 
-        #self.flowInertia()
+        self.selectBestID_by_scores(power2zero, nodes)
 
     def getTotalPower2Zero_with_Losses(self, id):
         """
@@ -378,7 +513,7 @@ class Den2ne(object):
         val = 0
 
         # En caso de que seamos el root
-        if len(id.hlmac) == 1:
+        if id.depth == 1:
             val = self.G.nodes[id.getOrigin()].load
         else:
             # Origen
@@ -390,43 +525,191 @@ class Den2ne(object):
             val = abs(
                 dst_load
                 + origin_load
-                - self.G.nodes[id.getOrigin()]
-                .links[
-                    self.G.nodes[id.getOrigin()].neighbors.index(
-                        self.G.nodes[id.getNextHop()].name
-                    )
-                ]
-                .getLosses(origin_load)
+                - self.G.getLink(id.getOrigin(), id.getNextHop()).getLosses(origin_load)
             )
 
         return val
 
-    def IDsCheck(self, n_repetition=0):
+    def getIDsArrays(self):
         """
-        Función que revisa que todas las IDs seleccionadas son coherentes
-        y por tanto no se quedará carga en nodos distintos al root
+        Función para obtener los arrays de todas las IDs del grafo, nodo a nodo y en el orden de Node.ids
+
+        Devuelve [offsets, origins, next_hops, slots, depths, not_root]: offsets[i]:offsets[i+1] delimita las IDs del
+        nodo i (índice denso) y, por ID, el índice del origen, el del siguiente salto, el slot del enlace entre ambos,
+        la longitud de la HLMAC y si no es la ID del root (en ese caso el siguiente salto y el slot son 0, sin uso).
+        Se reconstruyen solo cuando cambian las IDs de los nodos (Selection.ids_version).
         """
-        ids_to_fix = list()
-        if n_repetition == None:
-            n_repetition = 0
-        else:
-            n_repetition = n_repetition + 1
-        for i in self.global_ids:
-            nextHop = i.getNextHop()
-            if nextHop != None and self.G.nodes[nextHop].getActiveID().hlmac.index(
-                nextHop
-            ) > i.hlmac.index(nextHop):
-                ids_to_fix.append(i)
-        if len(ids_to_fix) != 0:
-            self.flowInertia(ids_to_fix, n_repetition)
+        version = (self.G.selection.ids_version, len(self.G.names))
+
+        if self.ids_arrays_version != version:
+            offsets = [0]
+            next_hops = list()
+            slots = list()
+            depths = list()
+
+            for i, name in enumerate(self.G.names):
+                for id in self.G.nodes[name].ids:
+                    if id.depth > 1:
+                        j = self.G.index[id.getNextHop()]
+                        next_hops.append(j)
+                        slots.append(self.G.link_slot[(i, j)])
+                    else:
+                        next_hops.append(0)
+                        slots.append(0)
+                    depths.append(id.depth)
+                offsets.append(len(depths))
+
+            offsets = np.array(offsets, dtype=np.int64)
+            depths = np.array(depths, dtype=np.int64)
+
+            self.ids_arrays = [
+                offsets,
+                np.repeat(np.arange(len(self.G.names), dtype=np.int64), np.diff(offsets)),
+                np.array(next_hops, dtype=np.int64),
+                np.array(slots, dtype=np.int64),
+                depths,
+                depths > 1,
+            ]
+            self.ids_arrays_version = version
+
+        return self.ids_arrays
+
+    def getLoadsArray(self):
+        """
+        Función para obtener las cargas actuales de los nodos como array alineado con el indexado denso (Graph.names)
+        """
+        return np.array([self.G.nodes[name].load for name in self.G.names], dtype=float)
+
+    def selectBestID_by_scores(self, scores, nodes=None):
+        """
+        Función para activar en cada nodo la ID de menor puntuación (scores alineado con getIDsArrays)
+
+        El mínimo de cada nodo se obtiene con reducciones por segmentos; ante empates gana la primera ID, igual que
+        scores.index(min(scores)).
+        """
+        offsets = self.getIDsArrays()[0]
+        counts = np.diff(offsets)
+        starts = offsets[:-1][counts > 0]
+
+        # Mínimo de cada nodo y primera posición que lo alcanza
+        mins = np.repeat(np.minimum.reduceat(scores, starts), counts[counts > 0])
+        positions = np.where(scores == mins, np.arange(len(scores)), len(scores))
+
+        best = np.zeros(len(counts), dtype=np.int64)
+        best[counts > 0] = np.minimum.reduceat(positions, starts) - starts
+        best = best.tolist()
+
+        for node in self.G.nodes if nodes is None else nodes:
+            self.G.nodes[node].setActiveID(best[self.G.index[node]])
+            self.global_ids.append(self.G.nodes[node].getActiveID())
+
+    def consistentIDs(self):
+        """
+        Función para que las IDs activas sean coherentes entre padres e hijos: la ID activa de cada nodo es la ID activa
+        de su siguiente salto más él mismo, así que en globalBalance no queda ninguna carga encerrada
+
+        Cada pasada va de arriba abajo. Partiendo de la ID del root, cada ID que se fija como activa habilita a sus IDs
+        hijas (las que la tienen como padre) en los vecinos:
+
+        - Si la hija es la ID que se quiere para el vecino (la que tenía activa o una forzada), se fija en ese momento.
+        - Si no, se apunta como alternativa del vecino (la primera que llega, es decir, la más corta) y solo se usa
+          cuando ya no queda ninguna ID por fijar que pueda mantener la selección de algún nodo.
+
+        Es decir, el desempate prima conservar la selección del criterio: un nodo mantiene su ID si la de su padre
+        llega a fijarse antes de agotar las demás; si no, toma la primera ID coherente que le llega en el recorrido, no
+        la más parecida a la que tenía (no reproduce, por tanto, la selección del antiguo flowInertia/IDsCheck).
+
+        Un nodo que conserva su ID puede dejar sin ninguna ID coherente a sus descendientes (huérfanos), si ninguna de
+        las IDs de estos tiene como padre la que se ha fijado. En ese caso se fuerza, para cada huérfano y para todos
+        los nodos del camino de su primera ID, la ID correspondiente de ese camino, y se repite la pasada. Las primeras
+        IDs de spread_ids forman un árbol (el de la primera difusión), así que las IDs forzadas nunca se contradicen y
+        cada repetición fija al menos un huérfano: al terminar no queda ninguno. Solo si las primeras IDs no forman un
+        árbol (por ejemplo, IDs cargadas de otra forma) puede quedar algún nodo sin ID coherente, que conserva la que
+        tenía.
+
+        Cada pasada visita cada ID una sola vez. Si cambia alguna ID activa se actualiza global_ids y la configuración
+        de los switches. Devuelve el número de nodos cuya ID activa ha cambiado.
+        """
+
+        # IDs hijas de cada ID: (nodo, posición en el nodo, ID hija), y posición de cada ID en su nodo
+        children = dict()
+        positions = dict()
+        for node in self.G.nodes.values():
+            for index, id in enumerate(node.ids):
+                positions[id] = index
+                if id.parent is not None:
+                    children.setdefault(id.parent, list()).append((node, index, id))
+
+        root = self.G.nodes[self.root]
+        root_index = next(index for index, id in enumerate(root.ids) if id.parent is None)
+
+        # Posición de la ID que se quiere mantener en cada nodo: la activa, salvo las forzadas por los huérfanos
+        wanted = {node.name: node.active_index for node in self.G.nodes.values() if node.getActiveID() is not None}
+        forced = set()
+
+        while True:
+
+            # Var aux: posición de la ID fijada en cada nodo, IDs fijadas pendientes de habilitar a sus hijas y alternativas
+            fixed = {root.name: root_index}
+            to_attend = deque([root.ids[root_index]])
+            alternatives = deque()
+
+            while len(to_attend) > 0 or len(alternatives) > 0:
+
+                # Sin IDs pendientes, fijamos la alternativa más antigua de un nodo que siga sin fijar
+                if len(to_attend) == 0:
+                    (node, index, id) = alternatives.popleft()
+                    if node.name not in fixed:
+                        fixed[node.name] = index
+                        to_attend.append(id)
+                    continue
+
+                for node, index, id in children.get(to_attend.popleft(), ()):
+                    if node.name in fixed:
+                        continue
+
+                    if wanted.get(node.name) == index:
+                        fixed[node.name] = index
+                        to_attend.append(id)
+                    else:
+                        alternatives.append((node, index, id))
+
+            # Forzamos el camino de la primera ID de los huérfanos (sin tocar lo ya forzado) y repetimos
+            new_forced = False
+            for node in self.G.nodes.values():
+                if node.name in fixed or len(node.ids) == 0:
+                    continue
+
+                id = node.ids[0]
+                while id is not None and id.getOrigin() not in forced:
+                    forced.add(id.getOrigin())
+                    wanted[id.getOrigin()] = positions[id]
+                    new_forced = True
+                    id = id.parent
+
+            if not new_forced:
+                break
+
+        # Fijamos las IDs que han cambiado
+        changed = 0
+        for node in self.G.nodes.values():
+            if node.name in fixed and not node.isActiveID(node.ids[fixed[node.name]]):
+                node.setActiveID(fixed[node.name])
+                changed += 1
+
+        if changed > 0:
+            self.global_ids = [node.getActiveID() for node in self.G.nodes.values()]
+            self.setSwitchesConfig()
+
+        return changed
 
     def globalBalance(self, withLosses, withCap, withDebugPlot, positions, path):
         """
         Funcion que obtniene el balance global de la red y la dirección de cada enlace (hacia donde va el flujo de potencia)
         """
 
-        # Primero hay que ordenar la lista de global_ids de mayor a menor
-        self.global_ids.sort(key=Den2ne.key_sort_by_HLMAC_len, reverse=True)
+        # Primero hay que ordenar la lista de global_ids de mayor a menor (por cubetas de longitud, ver getBalanceOrder)
+        order = self.getBalanceOrder()
 
         # Vamos a estudiar tambien el abs() del movimiento de flujo de Potencia
         abs_flux = 0.0
@@ -440,15 +723,18 @@ class Den2ne(object):
         # Vamos a usar una var aux para devolver la potencia
         ret_load = float()
 
-        # Mientras haya IDs != del root -> Vamos a trabajar con listado global como si fuera una pila
-        while len(self.global_ids) > 1:
+        # Vamos a mantener el conjunto de nodos con carga encerrada: se vacía cada origen y se revisa cada destino
+        enclosed = self.getEnclosedNodes()
+
+        # Mientras haya IDs != del root -> Recorremos el orden con un cursor, sin desalojar IDs de la lista
+        for cursor in range(len(order) - 1):
 
             # Origen
-            origin_index = self.global_ids[0].getOrigin()
+            origin_index = order[cursor].getOrigin()
             origin = self.G.nodes[origin_index]
 
             # Destino
-            dst_index = self.global_ids[0].getNextHop()
+            dst_index = order[cursor].getNextHop()
             dst = self.G.nodes[dst_index]
 
             # Establecemos la dirección del flujo de potencia en el enlace
@@ -461,45 +747,28 @@ class Den2ne(object):
 
             cap = self.G.getLinkCapacity(origin.name, dst.name)
 
+            # Enlace por el que se entrega la potencia
+            link = self.G.getLink(origin.name, dst.name)
 
             # Agregamos la carga de origen a destino
             if withLosses and withCap:
                 if cap is None or cap >= origin.load:
-                    self.G.nodes[dst_index].load += origin.load - origin.links[
-                        origin.neighbors.index(dst.name)
-                    ].getLosses(origin.load)
+                    self.G.nodes[dst_index].load += origin.load - link.getLosses(origin.load)
 
                     # Actualizamos el flujo absoluto
-                    abs_flux += abs(
-                        origin.load
-                        - origin.links[origin.neighbors.index(dst.name)].getLosses(
-                            origin.load
-                        )
-                    )
+                    abs_flux += abs(origin.load - link.getLosses(origin.load))
 
                 else:
-                    self.G.nodes[dst_index].load += cap - origin.links[
-                        origin.neighbors.index(dst.name)
-                    ].getLosses(cap)
+                    self.G.nodes[dst_index].load += cap - link.getLosses(cap)
 
                     # Actualizamos el flujo absoluto
-                    abs_flux += abs(
-                        cap
-                        - origin.links[origin.neighbors.index(dst.name)].getLosses(cap)
-                    )
+                    abs_flux += abs(cap - link.getLosses(cap))
 
             elif withLosses:
-                self.G.nodes[dst_index].load += origin.load - origin.links[
-                    origin.neighbors.index(dst.name)
-                ].getLosses(origin.load)
+                self.G.nodes[dst_index].load += origin.load - link.getLosses(origin.load)
 
                 # Actualizamos el flujo absoluto
-                abs_flux += abs(
-                    origin.load
-                    - origin.links[origin.neighbors.index(dst.name)].getLosses(
-                        origin.load
-                    )
-                )
+                abs_flux += abs(origin.load - link.getLosses(origin.load))
 
             elif withCap:
                 if cap is None or cap >= origin.load:
@@ -522,41 +791,361 @@ class Den2ne(object):
 
             # Ajustamos a cero el valor de la carga en origen
             self.G.nodes[origin_index].load = 0.0
+            enclosed.discard(origin_index)
 
-            # Una vez atendida la ID más larga de la lista, la desalojamos
-            self.global_ids.pop(0)
+            if dst_index != self.root:
+                if dst.load != 0:
+                    enclosed.add(dst_index)
+                else:
+                    enclosed.discard(dst_index)
 
             # Incrementamos el contador de iteraciones
             iteration += 1
 
+        # Como antes, del listado global solo queda la ID del root
+        self.global_ids = order[-1:]
 
         # Devolvemos el balance total
         ret_load = self.G.nodes[self.root].load
         self.G.nodes[self.root].load = 0.0
 
+        # El conjunto de cargas encerradas corresponde a las cargas que deja el balance
+        self.enclosed_version = self.G.selection.load_version
+
         return [ret_load, abs_flux]
 
+    def globalBalanceArray(self, withLosses, withCap):
+        """
+        Versión vectorizada de globalBalance: agrega las cargas nivel a nivel (por longitud de HLMAC) con NumPy.
+
+        Deja el grafo en el mismo estado que globalBalance (cargas, dirección de los enlaces y global_ids)
+        y devuelve el mismo par [balance, abs_flux].
+        """
+        tree = BalanceTree.fromIDs(self.G, self.global_ids)
+
+        [loss_coef, cap] = BalanceTree.linkArrays(self.G)
+        loads = [self.G.nodes[name].load for name in self.G.names]
+
+        [ret_load, abs_flux, loads, down] = tree.balance(loads, loss_coef, cap, withLosses, withCap)
+
+        # Volcamos el resultado sobre el grafo
+        for node, load in zip(self.G.nodes.values(), loads.tolist()):
+            node.load = load
+
+        self.enclosed = set(self.G.names[i] for i in np.flatnonzero(loads).tolist()) - {self.root}
+        self.enclosed_version = self.G.selection.load_version
+
+        # Dirección del flujo de potencia en cada enlace (mismo criterio que globalBalance)
+        for slot, rev_slot, is_down in zip(tree.order_slots.tolist(), tree.order_rev_slots.tolist(), down.tolist()):
+            if is_down:
+                self.G.links[slot].direction = "down"
+                self.G.links[rev_slot].direction = "up"
+            else:
+                self.G.links[slot].direction = "up"
+                self.G.links[rev_slot].direction = "down"
+
+        # Igual que en globalBalance, del listado global solo queda la ID del root
+        self.global_ids = self.getBalanceOrder()[-1:]
+
+        return [float(ret_load), float(abs_flux)]
+
+    def globalBalanceDeltas(self, loads, criterion, withLosses, withCap, max_iter=30):
+        """
+        Función para obtener el balance global de todos los instantes de carga en una sola pasada
+
+        Solo es válida para criterios que no dependen de la carga (número de saltos y distancia): el árbol de IDs
+        activas es el mismo para todos los instantes, así que se agrega la matriz de cargas (nodos x instantes) de una vez.
+        Al igual que los drivers de main.py, se repite el balance sobre las cargas encerradas hasta que no quede ninguna
+        (o hasta max_iter iteraciones). No modifica las cargas ni la dirección de los enlaces del grafo.
+
+        Devuelve [balance, abs_flux, iterations], un valor por instante.
+        """
+        if criterion not in [Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_DISTANCE]:
+            raise ValueError(f"Criterion {criterion} depends on the loads, it cannot be batched")
+
+        self.clearSelectedIDs()
+        self.selectBestIDs(criterion)
+
+        tree = BalanceTree.fromIDs(self.G, self.global_ids)
+
+        [loss_coef, cap] = BalanceTree.linkArrays(self.G)
+        loads = self.loadsMatrix(loads)
+
+        total_balance = np.zeros(loads.shape[1])
+        abs_flux = np.zeros(loads.shape[1])
+        iterations = np.zeros(loads.shape[1], dtype=np.int64)
+
+        # Instantes que todavía tienen cargas por balancear
+        pending = np.ones(loads.shape[1], dtype=bool)
+        not_root = np.arange(loads.shape[0]) != tree.root
+
+        while pending.any() and (max_iter is None or iterations.max() < max_iter):
+            [ret_load, ret_flux, ret_loads, _] = tree.balance(loads[:, pending], loss_coef, cap, withLosses, withCap)
+
+            total_balance[pending] += ret_load
+            abs_flux[pending] += ret_flux
+            iterations[pending] += 1
+            loads[:, pending] = ret_loads
+
+            # Seguimos solo con los instantes con cargas encerradas
+            pending[pending] = (ret_loads[not_root] != 0).any(axis=0)
+
+        return [total_balance, abs_flux, iterations]
+
+    def globalBalanceSparse(self, loads, criterion):
+        """
+        Función para obtener el balance ideal (sin perdidas ni capacidad) de todos los instantes de carga con una única
+        resolución triangular dispersa sobre el árbol de IDs activas (ver SparseBalance)
+
+        Igual que globalBalanceDeltas, solo es válida para criterios que no dependen de la carga. Se usa la selección
+        del propio criterio, sin modificarla, y solo si es consistente (ver BalanceTree.isConsistent): entonces el
+        resultado es el de una pasada de globalBalance. Si no lo es se lanza ValueError; en ese caso hay que usar
+        globalBalanceDeltas, que repite el balance sobre las cargas encerradas, o hacer la selección consistente
+        (consistent=True en el constructor). No modifica las cargas ni la dirección de los enlaces del grafo.
+
+        Devuelve [balance, abs_flux, flows]: un valor por instante y la matriz (nodos x instantes) de la potencia que
+        cada nodo entrega a su siguiente salto.
+        """
+        if criterion not in [Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_DISTANCE]:
+            raise ValueError(f"Criterion {criterion} depends on the loads, it cannot be batched")
+
+        self.clearSelectedIDs()
+        self.selectBestIDs(criterion)
+
+        tree = BalanceTree.fromIDs(self.G, self.global_ids)
+
+        return SparseBalance(tree, len(self.G.names)).balance(self.loadsMatrix(loads))
+
+    def solve(self, criterion, scenario, max_iter=None):
+        """
+        Función para balancear las cargas actuales con un criterio y un escenario (SCENARIO_*), repitiendo la selección
+        de IDs y el balance global mientras queden cargas encerradas, como el bucle de los drivers de main.py
+
+        La primera iteración es completa. En las siguientes solo se trabaja sobre la parte afectada:
+
+        - Solo se vuelve a decidir la ID de los nodos cuya puntuación puede haber cambiado: ninguno con los criterios que
+          no dependen de la carga, y los nodos cuya carga ha cambiado desde la última selección y sus vecinos (siguientes
+          saltos de sus IDs) con el resto. Los demás nodos elegirían la misma ID.
+        - Solo se balancean las IDs activas de los nodos con carga encerrada y las de sus siguientes saltos hasta el
+          root, el resto de enlaces no mueve potencia (los enlaces sin flujo conservan la dirección que tenían).
+
+        Se para cuando no quedan cargas encerradas, tras max_iter iteraciones o cuando una iteración no avanza: deja las
+        cargas encerradas en los mismos nodos sin que haya cambiado el árbol de IDs activas, así que con ese árbol solo
+        seguirían moviéndose en ciclo sin llegar al root.
+
+        Devuelve [balance, abs_flux, iteraciones, tiempo en ms].
+        """
+        [withLosses, withCap] = Den2ne.SCENARIOS[scenario]
+        start = time.time() * 1000
+
+        nodes = list(self.G.nodes.values())
+        root = self.G.index[self.root]
+        load_criterion = criterion in Den2ne.LOAD_CRITERIA
+
+        # Primera iteración completa, guardando las cargas con las que se decidieron las IDs
+        selected_loads = np.array([node.load for node in nodes], dtype=float)
+
+        self.clearSelectedIDs()
+        self.selectBestIDs(criterion)
+
+        [total_balance, abs_flux] = self.globalBalance(withLosses, withCap, False, None, None)
+        iteration = 1
+
+        enclosed = self.getEnclosedLoads()
+
+        while len(enclosed) > 0 and (max_iter is None or iteration < max_iter):
+            changed_tree = False
+
+            # Volvemos a decidir solo las IDs cuya puntuación depende de alguna carga que haya cambiado
+            if load_criterion:
+                loads = np.array([node.load for node in nodes], dtype=float)
+                changed = np.flatnonzero(loads != selected_loads)
+                selected_loads = loads
+
+                dirty = set(changed.tolist())
+                for i in changed.tolist():
+                    dirty.update(self.G.adj_targets[self.G.adj_offsets[i]:self.G.adj_offsets[i + 1]].tolist())
+                dirty = sorted(dirty)
+
+                before = [nodes[i].active_index for i in dirty]
+                self.selectBestIDs(criterion, [self.G.names[i] for i in dirty])
+                changed_tree = before != [nodes[i].active_index for i in dirty]
+
+            # Balanceamos solo las IDs de los caminos de las cargas encerradas (y la del root, que es la que queda)
+            affected = {root}
+            for i in enclosed:
+                while i not in affected:
+                    affected.add(i)
+                    i = self.G.index[nodes[i].getActiveID().getNextHop()]
+
+            self.global_ids = [nodes[i].getActiveID() for i in sorted(affected)]
+
+            [balance, flux] = self.globalBalance(withLosses, withCap, False, None, None)
+            total_balance += balance
+            abs_flux += flux
+            iteration += 1
+
+            # Sin avance: mismas cargas encerradas con el mismo árbol
+            new_enclosed = self.getEnclosedLoads()
+            if not changed_tree and new_enclosed == enclosed:
+                break
+
+            enclosed = new_enclosed
+
+        return [total_balance, abs_flux, iteration, time.time() * 1000 - start]
+
+    def getEnclosedNodes(self):
+        """
+        Función para obtener el conjunto de nodos (distintos del root) que tienen carga encerrada
+
+        globalBalance y globalBalanceArray lo dejan calculado, así que tras un balance no hay que recorrer los nodos.
+        Solo se recorren si alguna carga del grafo se ha escrito desde entonces, por el algoritmo (updateLoads,
+        incrementalBalance, restore) o desde fuera (Graph.restore, escrituras directas de node.load), ya que cada
+        escritura cambia la versión de las cargas de la selección compartida (ver Node.load).
+        """
+        version = self.G.selection.load_version
+        if self.enclosed is None or self.enclosed_version != version:
+            self.enclosed = set(name for name, node in self.G.nodes.items() if node.load != 0 and name != self.root)
+            self.enclosed_version = version
+
+        return self.enclosed
+
+    def getEnclosedLoads(self):
+        """
+        Función para obtener los índices de los nodos (distintos del root) que tienen carga encerrada, ordenados
+        """
+        return sorted(self.G.index[name] for name in self.getEnclosedNodes())
+
+    def incrementalBalance(self, changes, withLosses, withCap):
+        """
+        Función para actualizar el balance global a partir de un conjunto disperso de cargas nuevas (nodo -> carga)
+
+        La primera llamada (o cuando cambia el árbol de IDs activas o el escenario) hace el cálculo completo con las
+        cargas actuales de los nodos; a partir de ahí solo se propagan hacia el root las contribuciones de los nodos que
+        cambian. Las cargas nuevas se escriben también en los nodos, pero, a diferencia de globalBalance, no se vacían,
+        y global_ids no se consume. updateLoads descarta el estado, ya que reescribe todas las cargas.
+
+        Si el árbol activo no es consistente (quedarían cargas encerradas) se recalcula entero en cada llamada, con el
+        mismo resultado que una pasada de globalBalanceArray. Devuelve [balance, abs_flux].
+        """
+        version = self.G.selection.version
+        state = self.incremental
+
+        # Si la selección ha cambiado comprobamos si el árbol activo sigue siendo el mismo
+        if state is None or version != self.incremental_version or (state.withLosses, state.withCap) != (withLosses, withCap):
+            active_ids = [node.getActiveID() for node in self.G.nodes.values() if node.getActiveID() is not None]
+            tree = BalanceTree.fromIDs(self.G, active_ids)
+
+            if state is None or not state.sameTree(tree) or (state.withLosses, state.withCap) != (withLosses, withCap):
+                [loss_coef, cap] = BalanceTree.linkArrays(self.G)
+                loads = [node.load for node in self.G.nodes.values()] if state is None else state.loads
+
+                state = IncrementalBalance(tree, loss_coef, cap, loads, withLosses, withCap)
+                state.setDirections(self.G.links)
+
+            self.incremental = state
+            self.incremental_version = version
+
+        # Aplicamos los cambios sobre el estado y sobre los nodos
+        changes_index = dict()
+        for name, load in changes.items():
+            self.G.nodes[name].load = load
+            changes_index[self.G.index[name]] = load
+
+        return state.update(changes_index, self.G.links)
+
+    def snapshot(self):
+        """
+        Función para guardar el estado mutable del algoritmo (el del grafo y el listado de IDs globales)
+        """
+        return [self.G.snapshot(), list(self.global_ids)]
+
+    def restore(self, snapshot):
+        """
+        Función para volver al estado guardado con snapshot sin tener que copiar el grafo etiquetado
+        """
+        [graph_snapshot, global_ids] = snapshot
+
+        self.G.restore(graph_snapshot)
+        self.global_ids = list(global_ids)
+        self.incremental = None
+
+    def loadsMatrix(self, loads):
+        """
+        Función para pasar las cargas (formato de DataGatherer.getLoads) a una matriz nodos x instantes
+        alineada con los índices del grafo. Los nodos sin carga (virtuales) quedan a cero.
+        """
+        if isinstance(loads, np.ndarray):
+            return np.array(loads, dtype=float)
+
+        num_deltas = len(next(iter(loads.values())))
+        matrix = np.zeros((len(self.G.names), num_deltas))
+
+        for i, name in enumerate(self.G.names):
+            if name in loads:
+                matrix[i] = loads[name]
+
+        return matrix
+
     def are_enlclosedLoads(self):
-        """Funcion para ver si hay cargas encerradas"""
-        for node in self.G.nodes:
-            if self.G.nodes[node].load != 0:
-                if node != self.G.root:
-                    return True
-        else:
-            return False
+        """Funcion para ver si hay cargas encerradas (en O(1) tras un balance, ver getEnclosedNodes)"""
+        return len(self.getEnclosedNodes()) > 0
+
+    def getBalanceOrder(self):
+        """
+        Función para obtener las IDs de global_ids ordenadas de mayor a menor longitud de HLMAC, que es el orden en el
+        que las atiende globalBalance
+
+        Las longitudes son enteros pequeños, así que se ordena por cubetas en O(n) (ver sortByDepth). El orden se
+        guarda junto con la selección de la que sale y se reutiliza mientras global_ids tenga las mismas IDs en el
+        mismo orden, como ocurre entre instantes con criterios que no dependen de la carga.
+        """
+        if self.balance_order_ids != self.global_ids:
+            self.balance_order = Den2ne.sortByDepth(self.global_ids)
+            self.balance_order_ids = list(self.global_ids)
+
+        return self.balance_order
+
+    @staticmethod
+    def sortByDepth(ids):
+        """
+        Función para ordenar un listado de IDs de mayor a menor longitud de HLMAC por cubetas (counting sort)
+
+        Es estable, igual que sort(key=key_sort_by_HLMAC_len, reverse=True): las IDs de la misma longitud conservan
+        su orden relativo, y con él el orden en que se suman las cargas en cada destino.
+        """
+        buckets = list()
+        for id in ids:
+            while len(buckets) <= id.depth:
+                buckets.append(list())
+            buckets[id.depth].append(id)
+
+        order = list()
+        for bucket in reversed(buckets):
+            order.extend(bucket)
+
+        return order
 
     @staticmethod
     def key_sort_by_HLMAC_len(id):
         """
         Función para key para ordenar el listado global de IDs en función de la longitud de las HLMACs
         """
-        return len(id.hlmac)
+        return id.depth
 
     def updateLoads(self, loads, delta):
         """
         Funcion para actualizar las cargas de los nodos del grafo
         """
 
+        # Se reescriben todas las cargas, el estado del balance incremental deja de ser válido
+        self.incremental = None
+
+        # Con un perfil de cargas (LoadProfile) solo leemos el instante que nos piden
+        if hasattr(loads, "getDelta"):
+            loads = {node: [load] for node, load in loads.getDelta(delta).items()}
+            delta = 0
+
         # Como solo tenemos las cargas de los nodos normales, vamos a poner a 0 todos y establecer las cargas de los normales
         for node in self.G.nodes:
             if node in loads:
@@ -571,10 +1160,8 @@ class Den2ne(object):
         # Limpiamos las IDs globales
         self.global_ids = list()
 
-        # De esta forma podemos volver a tomar una función objetivo
-        for node in self.G.nodes:
-            for j in range(0, len(self.G.nodes[node].ids)):
-                self.G.nodes[node].ids[j].active = False
+        # De esta forma podemos volver a tomar una función objetivo: basta con cambiar de generación
+        self.G.selection.clear()
 
     def write_ids_report(self, filename):
         """
@@ -648,7 +1235,7 @@ class Den2ne(object):
                 )
                 for id in self.G.nodes[node].ids:
                     file.write(
-                        f"|     {int(id.active)}     |  {HLMAC.hlmac_addr_print(id)} \n"
+                        f"|     {int(self.G.nodes[node].isActiveID(id))}     |  {HLMAC.hlmac_addr_print(id)} \n"
                     )
                 file.write(
                     "-------------------------------------------------------------------------"
@@ -0,0 +1,375 @@
+#!/usr/bin/python3
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve_triangular
+from graph.link import Link
+
+
+class BalanceTree(object):
+    """
+    Clase para representar mediante arrays el árbol de IDs activas sobre el que se calcula el balance global
+    """
+
+    def __init__(self, origins, parents, depths, slots, rev_slots, root):
+        """
+        Constructor de la clase BalanceTree
+
+        Recibe, en el orden en el que estén las IDs globales, el índice del nodo origen, el de su siguiente salto
+        (parent vector, -1 para el root), la longitud de la HLMAC activa y los slots de los enlaces
+        origen -> siguiente salto y siguiente salto -> origen.
+        """
+        self.root = root
+        self.origins = np.asarray(origins, dtype=np.int64)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.depths = np.asarray(depths, dtype=np.int64)
+        self.slots = np.asarray(slots, dtype=np.int64)
+        self.rev_slots = np.asarray(rev_slots, dtype=np.int64)
+
+        # Mismo orden que globalBalance: de mayor a menor longitud de HLMAC respetando el orden original en empates
+        order = np.argsort(-self.depths, kind='stable')
+        order = order[self.parents[order] >= 0]
+
+        # Orígenes y destinos en el orden en el que se van a procesar
+        self.order_origins = self.origins[order]
+        self.order_dsts = self.parents[order]
+        self.order_slots = self.slots[order]
+        self.order_rev_slots = self.rev_slots[order]
+
+        # Agrupamos por niveles (misma longitud de HLMAC)
+        self.levels = list()
+        if len(order) > 0:
+            cuts = np.flatnonzero(np.diff(self.depths[order])) + 1
+            for level in np.split(order, cuts):
+                origins = self.origins[level]
+                dsts = self.parents[level]
+
+                # Si algún destino también es origen en el mismo nivel, el resultado depende del orden -> secuencial
+                sequential = np.intersect1d(origins, dsts).size > 0
+
+                self.levels.append((origins, dsts, self.slots[level], sequential))
+
+    @staticmethod
+    def fromIDs(graph, active_ids):
+        """
+        Función para construir el árbol a partir del listado de IDs activas (Den2ne.global_ids)
+        """
+        origins = list()
+        parents = list()
+        depths = list()
+        slots = list()
+        rev_slots = list()
+
+        for id in active_ids:
+            origin = graph.index[id.getOrigin()]
+            next_hop = id.getNextHop()
+
+            origins.append(origin)
+            depths.append(id.depth)
+
+            if next_hop is None:
+                parents.append(-1)
+                slots.append(-1)
+                rev_slots.append(-1)
+            else:
+                dst = graph.index[next_hop]
+                parents.append(dst)
+                slots.append(graph.link_slot[(origin, dst)])
+                rev_slots.append(graph.link_slot[(dst, origin)])
+
+        return BalanceTree(origins, parents, depths, slots, rev_slots, graph.index[graph.root])
+
+    def isConsistent(self, num_nodes):
+        """
+        Función para comprobar si el árbol es consistente: todos los nodos salvo el root se procesan una vez y antes
+        que su siguiente salto, es decir, una pasada de globalBalance no deja cargas encerradas
+        """
+        position = np.full(num_nodes, num_nodes, dtype=np.int64)
+        position[self.order_origins] = np.arange(len(self.order_origins))
+
+        return (
+            len(self.order_origins) == num_nodes - 1
+            and np.unique(self.order_origins).size == num_nodes - 1
+            and bool((position[self.order_dsts] > position[self.order_origins]).all())
+        )
+
+    @staticmethod
+    def linkArrays(graph):
+        """
+        Función para obtener, por slot de enlace, el coeficiente de perdidas y la capacidad (kW, inf si no tiene)
+        """
+        return [graph.loss_coef, graph.link_cap]
+
+    @staticmethod
+    def losses(P_in, loss_coef):
+        """
+        Función para calcular las perdidas de un conjunto de enlaces dada la potencia incidente (ver Link.losses)
+        """
+        return Link.losses(P_in, loss_coef)
+
+    def balance(self, loads, loss_coef, cap, withLosses, withCap):
+        """
+        Función para agregar las cargas de las hojas al root nivel a nivel
+
+        loads puede ser un vector (nodos) o una matriz (nodos x instantes), en cuyo caso se balancean todas las columnas.
+        Devuelve [balance, abs_flux, loads, down], donde loads son las cargas finales (root a cero) y down indica,
+        para cada origen procesado (orden de order_origins), si la potencia fluye del siguiente salto hacia el origen.
+        """
+        loads = np.array(loads, dtype=float)
+        abs_flux = np.zeros(loads.shape[1:])
+        down = list()
+
+        for origins, dsts, slots, sequential in self.levels:
+            if sequential:
+                for k in range(len(origins)):
+                    P = loads[origins[k]].copy()
+                    delivered = self.deliver(P, loss_coef[slots[k]], cap[slots[k]], withLosses, withCap)
+
+                    loads[dsts[k]] += delivered
+                    loads[origins[k]] = 0.0
+
+                    abs_flux = abs_flux + np.abs(delivered)
+                    down.append((P < 0)[np.newaxis])
+            else:
+                P = loads[origins]
+                coef_lvl = loss_coef[slots]
+                cap_lvl = cap[slots]
+                if loads.ndim > 1:
+                    coef_lvl = coef_lvl[:, np.newaxis]
+                    cap_lvl = cap_lvl[:, np.newaxis]
+
+                delivered = self.deliver(P, coef_lvl, cap_lvl, withLosses, withCap)
+
+                np.add.at(loads, dsts, delivered)
+                loads[origins] = 0.0
+
+                # Suma acumulada secuencial para reproducir el mismo redondeo que el bucle original
+                abs_flux = np.cumsum(np.concatenate((abs_flux[np.newaxis], np.abs(delivered))), axis=0)[-1]
+                down.append(P < 0)
+
+        ret_load = loads[self.root].copy()
+        loads[self.root] = 0.0
+
+        if len(down) > 0:
+            down = np.concatenate(down)
+        else:
+            down = np.zeros((0,) + loads.shape[1:], dtype=bool)
+
+        return [ret_load, abs_flux, loads, down]
+
+    @staticmethod
+    def deliver(P, loss_coef, cap, withLosses, withCap):
+        """
+        Función para obtener la potencia que llega al siguiente salto según el escenario
+        """
+        if withCap:
+            P = np.where(cap >= P, P, cap)
+
+        if withLosses:
+            P = P - BalanceTree.losses(P, loss_coef)
+
+        return P
+
+
+class SparseBalance(object):
+    """
+    Clase para obtener el balance ideal (sin perdidas ni capacidad) como un sistema triangular sobre la matriz de
+    incidencia del árbol de IDs activas
+
+    Sin perdidas, la potencia que un nodo entrega a su siguiente salto es la suma de las cargas de su subárbol, s, que
+    cumple s = l + C s (C[padre, hijo] = 1). Ordenando los nodos como los procesa globalBalance (y el root al final),
+    I - C es triangular inferior con diagonal unidad, así que todas las sumas salen de una única resolución
+    triangular, para todos los instantes (columnas de l) a la vez.
+
+    Solo es aplicable si el árbol es consistente (ver BalanceTree.isConsistent), y entonces el resultado es el de una
+    pasada de globalBalance sin perdidas ni capacidad. Con un árbol no consistente globalBalance deja cargas encerradas
+    que no tienen equivalente en una sola resolución, así que se rechaza con ValueError.
+    """
+
+    def __init__(self, tree, num_nodes):
+        """
+        Constructor de la clase SparseBalance, construye la matriz I - C permutada en el orden de globalBalance
+        """
+        self.tree = tree
+
+        if not tree.isConsistent(num_nodes):
+            raise ValueError("The active IDs are not consistent, a single pass of globalBalance would leave enclosed loads")
+
+        # Permutación: posición -> nodo, en el orden de globalBalance, de modo que cada padre va después de sus hijos
+        self.perm = np.append(tree.order_origins, tree.root)
+        position = np.empty(num_nodes, dtype=np.int64)
+        position[self.perm] = np.arange(num_nodes)
+
+        # Cada hijo (columna) suma en su padre (fila, posición posterior): por debajo de la diagonal
+        incidence = sp.csr_matrix(
+            (np.ones(num_nodes - 1), (position[tree.order_dsts], position[tree.order_origins])),
+            shape=(num_nodes, num_nodes),
+        )
+        self.matrix = (sp.identity(num_nodes, format="csr") - incidence).tocsr()
+
+    def subtreeSums(self, loads):
+        """
+        Función para obtener la suma de las cargas del subárbol de cada nodo (vector o matriz nodos x instantes)
+        """
+        loads = np.asarray(loads, dtype=float)
+
+        sums = np.empty_like(loads)
+        sums[self.perm] = spsolve_triangular(self.matrix, loads[self.perm], lower=True, unit_diagonal=True)
+
+        return sums
+
+    def balance(self, loads):
+        """
+        Función para obtener el balance ideal de un vector (nodos) o una matriz (nodos x instantes) de cargas
+
+        Devuelve [balance, abs_flux, flows], donde flows es la potencia que cada nodo entrega a su siguiente salto
+        (cero en el root); es negativa si la potencia fluye del siguiente salto hacia el nodo.
+        """
+        flows = self.subtreeSums(loads)
+
+        ret_load = flows[self.tree.root].copy()
+        flows[self.tree.root] = 0.0
+
+        return [ret_load, np.abs(flows).sum(axis=0), flows]
+
+
+class IncrementalBalance(object):
+    """
+    Clase para mantener el balance global de un árbol de IDs activas y actualizarlo con cambios dispersos de carga
+
+    Para cada nodo guarda la potencia incidente (su carga más lo que le entregan sus hijos) y la potencia que entrega
+    a su siguiente salto. Un cambio de carga en un nodo solo altera esos valores en su camino hacia el root, así que
+    basta con recorrer ese camino (y se corta en cuanto la potencia entregada deja de cambiar).
+
+    Solo es aplicable si el árbol es consistente: cada nodo tiene una ID activa y su siguiente salto se procesa después
+    que él en el orden de globalBalance, es decir, no quedan cargas encerradas tras una pasada.
+    """
+
+    def __init__(self, tree, loss_coef, cap, loads, withLosses, withCap):
+        """
+        Constructor de la clase IncrementalBalance, hace el cálculo completo sobre el vector de cargas (uno por nodo)
+        """
+        self.tree = tree
+        self.withLosses = withLosses
+        self.withCap = withCap
+        self.loads = np.array(loads, dtype=float)
+
+        num_nodes = len(self.loads)
+
+        # Por nodo: siguiente salto, enlaces hacia/desde él y sus parámetros (-1 si no tiene)
+        self.parent = np.full(num_nodes, -1, dtype=np.int64)
+        self.slot = np.full(num_nodes, -1, dtype=np.int64)
+        self.rev_slot = np.full(num_nodes, -1, dtype=np.int64)
+        self.parent[tree.order_origins] = tree.order_dsts
+        self.slot[tree.order_origins] = tree.order_slots
+        self.rev_slot[tree.order_origins] = tree.order_rev_slots
+
+        self.loss_coef = np.zeros(num_nodes)
+        self.cap = np.full(num_nodes, np.inf)
+        self.loss_coef[tree.order_origins] = loss_coef[tree.order_slots]
+        self.cap[tree.order_origins] = cap[tree.order_slots]
+
+        # Consistencia: todos los nodos salvo el root se procesan una vez y antes que su siguiente salto
+        self.consistent = tree.isConsistent(num_nodes)
+
+        self.recompute()
+
+    def sameTree(self, tree):
+        """
+        Función para comprobar si un árbol (recién construido a partir de las IDs activas) es el mismo que el cacheado
+        """
+        return (
+            tree.root == self.tree.root
+            and np.array_equal(tree.order_origins, self.tree.order_origins)
+            and np.array_equal(tree.order_dsts, self.tree.order_dsts)
+        )
+
+    def recompute(self):
+        """
+        Función para recalcular desde cero la potencia incidente y entregada de cada nodo
+        """
+        self.incident = self.loads.copy()
+        self.delivered = np.zeros(len(self.loads))
+
+        for origins, dsts, slots, sequential in self.tree.levels:
+            if sequential:
+                for k in range(len(origins)):
+                    delivered = self.deliver(self.incident[origins[k]], self.loss_coef[origins[k]], self.cap[origins[k]])
+                    self.delivered[origins[k]] = delivered
+                    self.incident[dsts[k]] += delivered
+            else:
+                delivered = BalanceTree.deliver(self.incident[origins], self.loss_coef[origins], self.cap[origins],
+                                                self.withLosses, self.withCap)
+                self.delivered[origins] = delivered
+                np.add.at(self.incident, dsts, delivered)
+
+        self.balance = float(self.incident[self.tree.root])
+        self.abs_flux = float(np.abs(self.delivered).sum())
+
+    def deliver(self, P, loss_coef, cap):
+        """
+        Función para obtener la potencia entregada al siguiente salto por un único nodo (misma expresión que BalanceTree)
+        """
+        if self.withCap and not cap >= P:
+            P = cap
+
+        if self.withLosses:
+            P = P - BalanceTree.losses(P, loss_coef)
+
+        return P
+
+    def update(self, changes, links=None):
+        """
+        Función para aplicar un conjunto disperso de cargas nuevas (índice de nodo -> carga) y propagarlas hacia el root
+
+        Si se pasa el listado de enlaces del grafo (Graph.links) se actualiza la dirección de los enlaces cuyo flujo
+        cambia de sentido. Devuelve [balance, abs_flux].
+        """
+        if not self.consistent:
+            for index, load in changes.items():
+                self.loads[index] = load
+            self.recompute()
+            return [self.balance, self.abs_flux]
+
+        root = self.tree.root
+
+        for index, load in changes.items():
+            diff = load - self.loads[index]
+            self.loads[index] = load
+
+            # Subimos por el camino hacia el root mientras cambie la potencia entregada
+            node = index
+            while diff != 0 and node != root:
+                old_incident = self.incident[node]
+                old_delivered = self.delivered[node]
+
+                incident = old_incident + diff
+                delivered = self.deliver(incident, self.loss_coef[node], self.cap[node])
+
+                self.incident[node] = incident
+                self.delivered[node] = delivered
+                self.abs_flux += abs(delivered) - abs(old_delivered)
+
+                # Mismo criterio que globalBalance para la dirección del flujo
+                if links is not None and (incident < 0) != (old_incident < 0):
+                    down = incident < 0
+                    links[self.slot[node]].direction = "down" if down else "up"
+                    links[self.rev_slot[node]].direction = "up" if down else "down"
+
+                diff = delivered - old_delivered
+                node = self.parent[node]
+
+            if node == root:
+                self.incident[root] += diff
+                self.balance += diff
+
+        return [float(self.balance), float(self.abs_flux)]
+
+    def setDirections(self, links):
+        """
+        Función para fijar la dirección de todos los enlaces del árbol según la potencia incidente de cada nodo
+        """
+        for origin in self.tree.order_origins.tolist():
+            down = self.incident[origin] < 0
+            links[self.slot[origin]].direction = "down" if down else "up"
+            links[self.rev_slot[origin]].direction = "up" if down else "down"
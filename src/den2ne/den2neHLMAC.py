@@ -6,13 +6,19 @@ class HLMAC(object):
         Clase para gestionar las HLMACs asignadas
     """
 
-    def __init__(self, hlmac_parent_addr, name, dependency):
+    def __init__(self, hlmac_parent_addr, name, dependency, link=None):
         """
             Constructor de la clase HLMAC 
+
+            Si se indica el enlace hacia el padre (link), se acumulan las métricas del camino (ver HLMAC.path_metrics)
         """
         [self.hlmac, self.depends_on] = HLMAC.hlmac_assign_address(hlmac_parent_addr, name, dependency)
+        self.depends_mask = HLMAC.dependency_mask(hlmac_parent_addr, dependency)
+        self.parent = hlmac_parent_addr
+        self.dependency = dependency
+        self.depth = len(self.hlmac)
         self.used = False
-        self.active = False
+        [self.dist, self.r_link, self.r_eff] = HLMAC.path_metrics(hlmac_parent_addr, link)
 
     def getOrigin(self):
         """
@@ -51,6 +57,39 @@ class HLMAC(object):
 
         return [new_addr, new_dependence]
 
+    @staticmethod
+    def dependency_mask(hlmac_parent_addr, dependency):
+        """
+            Método para obtener las dependencias como máscara de bits (bit i -> switch i): las del padre más la propia
+        """
+        mask = 0 if hlmac_parent_addr is None else hlmac_parent_addr.depends_mask
+
+        if dependency is not None:
+            mask |= 1 << dependency
+
+        return mask
+
+    @staticmethod
+    def path_metrics(hlmac_parent_addr, link):
+        """
+            Método para acumular las métricas del camino al root que no dependen de la carga:
+
+            - dist: distancia total (misma suma, y en el mismo orden, que Den2ne.getTotalDistance)
+            - r_link: resistencia efectiva del enlace hacia el siguiente salto
+            - r_eff: resistencia efectiva acumulada hasta el root
+
+            El root no tiene camino (todo a cero). Si no se conoce el enlace, o el padre no tiene métricas, quedan a None.
+        """
+        if hlmac_parent_addr is None:
+            return [0, 0.0, 0.0]
+
+        if link is None or hlmac_parent_addr.dist is None:
+            return [None, None, None]
+
+        r_link = link.getResistance()
+
+        return [hlmac_parent_addr.dist + link.dist, r_link, hlmac_parent_addr.r_eff + r_link]
+
     @staticmethod
     def hlmac_cmp_address(hlmac_a, hlmac_b):
         """
@@ -85,3 +124,90 @@ class HLMAC(object):
             ret_str = str(deps.depends_on)
 
         return ret_str
+
+
+class HLMACCompact(object):
+    """
+        Clase para gestionar las HLMACs en modo compacto
+
+        Cada HLMAC solo guarda la referencia a la HLMAC padre (el prefijo se comparte), el salto que añade, su
+        dependencia y su longitud. El camino completo y las dependencias se materializan bajo demanda.
+    """
+
+    __slots__ = ('parent', 'name', 'dependency', 'depends_mask', 'depth', 'hops', 'used', 'dist', 'r_link', 'r_eff')
+
+    def __init__(self, hlmac_parent_addr, name, dependency, link=None):
+        """
+            Constructor de la clase HLMACCompact
+        """
+        self.parent = hlmac_parent_addr
+        self.name = name
+        self.dependency = dependency
+        self.depends_mask = HLMAC.dependency_mask(hlmac_parent_addr, dependency)
+        self.depth = 1 if hlmac_parent_addr is None else hlmac_parent_addr.depth + 1
+        self.hops = None  # Caché (frozenset) de los nodos del camino, ver hlmac_check_loop
+        self.used = False
+        [self.dist, self.r_link, self.r_eff] = HLMAC.path_metrics(hlmac_parent_addr, link)
+
+    @property
+    def hlmac(self):
+        """
+            Lista de saltos desde el root hasta el nodo (se construye en cada acceso)
+        """
+        ret_hlmac = [None] * self.depth
+        curr = self
+
+        for i in range(self.depth - 1, -1, -1):
+            ret_hlmac[i] = curr.name
+            curr = curr.parent
+
+        return ret_hlmac
+
+    @property
+    def depends_on(self):
+        """
+            Lista de switches de los que depende la HLMAC, en el mismo orden que HLMAC.depends_on
+        """
+        ret_deps = list()
+        curr = self
+
+        while curr is not None:
+            if curr.dependency is not None:
+                ret_deps.append(curr.dependency)
+            curr = curr.parent
+
+        ret_deps.reverse()
+
+        return ret_deps
+
+    def getOrigin(self):
+        """
+            Funcion para conseguir el origen de la HLMAC
+        """
+        return self.name
+
+    def getNextHop(self):
+        """
+            Funcion para conseguir el siguiente salto de la HLMAC
+        """
+        ret_val = None
+        if self.parent is not None:
+            ret_val = self.parent.name
+        return ret_val
+
+    def releaseHops(self):
+        """
+            Funcion para liberar la caché de nodos del camino una vez que ya no se van a comprobar más bucles
+        """
+        self.hops = None
+
+    @staticmethod
+    def hlmac_check_loop(hlmac_a, name):
+        """
+            Función para detectar bucles en una HLMAC a asignar. La primera comprobación construye el conjunto de
+            nodos del camino y las siguientes son O(1)
+        """
+        if hlmac_a.hops is None:
+            hlmac_a.hops = frozenset(hlmac_a.hlmac)
+
+        return name in hlmac_a.hops
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+from .den2neALG import Den2ne
+from .den2neHLMAC import HLMAC, HLMACCompact
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+
+
+# Instancia de Multiroot de cada proceso del pool, junto con la función (y sus argumentos) a aplicar a cada root
+worker_multiroot = None
+worker_function = None
+worker_args = tuple()
+
+
+def init_worker(multiroot, function, args):
+    # Con fork el grafo y las IDs ya difundidas se heredan sin serializar
+    global worker_multiroot, worker_function, worker_args
+    worker_multiroot = multiroot
+    worker_function = function
+    worker_args = args
+
+
+def spread_root(root):
+    return root, worker_multiroot.spreadRoot(root)
+
+
+def run_root(root):
+    return root, worker_function(root, worker_multiroot.view(root), *worker_args)
+
+
+class Multiroot(object):
+    """
+    Clase para difundir las IDs desde varios roots candidatos sobre un mismo grafo
+
+    El grafo (nodos, enlaces, índices, adyacencia y tablas de perdidas) se construye una única vez y se comparte entre
+    todos los roots. De cada root solo se guardan sus HLMACs codificadas como punteros al padre (ver Graph.encodeIDs),
+    y view(root) etiqueta el grafo compartido con ellas. Como el grafo es uno solo, únicamente la última vista
+    devuelta es válida; para trabajar con varios roots a la vez se usa map, que reparte los roots en un pool de
+    procesos.
+    """
+
+    def __init__(self, graph, roots, compact=False):
+        """
+        Constructor de la clase Multiroot
+        """
+        self.G = graph
+        self.roots = list(roots)
+        self.compact = compact
+        self.hlmac_type = HLMACCompact if compact else HLMAC
+
+        # HLMACs codificadas de cada root (ver spread)
+        self.ids = dict()
+
+        # Estado inicial del grafo (cargas, enlaces y switches), del que parte la difusión de cada root
+        self.initial = graph.snapshot()
+
+    @staticmethod
+    def getContext():
+        """
+        Función para obtener el contexto del pool: con fork los procesos heredan el grafo sin serializarlo
+        """
+        if "fork" in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context("fork")
+
+        return multiprocessing.get_context()
+
+    def reset(self, root):
+        """
+        Función para devolver el grafo a su estado inicial, sin HLMACs, y fijar el root
+        """
+        self.G.restore(self.initial)
+        self.G.clearIDs()
+        self.G.root = root
+
+    def spreadRoot(self, root):
+        """
+        Función para difundir las IDs desde un root y devolverlas codificadas
+        """
+        self.reset(root)
+        Den2ne(self.G, self.compact).spread_ids()
+
+        return self.G.encodeIDs()
+
+    def spread(self, workers=None, chunksize=1):
+        """
+        Función para difundir las IDs desde todos los roots, repartiéndolos entre workers procesos (1: en este proceso)
+
+        Además, deja en Node.ids_root_count el número de roots desde los que le llega alguna ID a cada nodo.
+        """
+        if workers == 1:
+            for root in self.roots:
+                self.ids[root] = self.spreadRoot(root)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=self.getContext(),
+                                     initializer=init_worker, initargs=(self, None, tuple())) as executor:
+                for root, ids in executor.map(spread_root, self.roots, chunksize=chunksize):
+                    self.ids[root] = ids
+
+        # Tras la difusión el grafo se queda sin HLMACs hasta que se pida una vista
+        self.reset(self.G.root)
+
+        count = np.zeros(len(self.G.names), dtype=np.int64)
+        for root in self.roots:
+            count[np.unique(self.ids[root]["node"])] += 1
+
+        for name, root_count in zip(self.G.names, count.tolist()):
+            self.G.nodes[name].ids_root_count = root_count
+
+        return self.ids
+
+    def view(self, root):
+        """
+        Función para etiquetar el grafo compartido con las HLMACs de un root y obtener su instancia de Den2ne
+
+        Si el root no se ha difundido todavía se difunde en ese momento.
+        """
+        if root not in self.ids:
+            self.ids[root] = self.spreadRoot(root)
+
+        self.reset(root)
+        self.G.decodeIDs(self.ids[root], self.hlmac_type)
+
+        return Den2ne(self.G, self.compact)
+
+    def map(self, function, workers=None, chunksize=1, args=tuple()):
+        """
+        Generador que aplica function(root, vista, *args) a cada root en un pool de workers procesos (1: en este
+        proceso) y devuelve (root, resultado) en el orden de self.roots
+
+        Los roots que no se hayan difundido con spread se difunden en el proceso que los atiende.
+        """
+        if workers == 1:
+            for root in self.roots:
+                yield root, function(root, self.view(root), *args)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=self.getContext(),
+                                 initializer=init_worker, initargs=(self, function, args)) as executor:
+            for root, result in executor.map(run_root, self.roots, chunksize=chunksize):
+                yield root, result
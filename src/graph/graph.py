@@ -1,7 +1,10 @@
 #!/usr/bin/python3
 
-from .node import Node
+import json
+import numpy as np
+from .node import Node, Selection
 from .link import Link
+from den2ne.den2neHLMAC import HLMAC, HLMACCompact
 
 
 class Graph(object):
@@ -15,6 +18,20 @@ class Graph(object):
         """
         self.nodes = dict()
         self.root = root
+
+        # Selección de IDs activas compartida por todos los nodos (ver Node.getActiveID)
+        self.selection = Selection()
+
+        # Indexado denso de los nodos y adyacencia en formato CSR (ver buildIndex)
+        self.index = dict()
+        self.names = list()
+        self.links = list()
+        self.link_slot = dict()
+        self.adj_offsets = np.zeros(1, dtype=np.int64)
+        self.adj_targets = np.zeros(0, dtype=np.int64)
+        self.adj_links = np.zeros(0, dtype=np.int64)
+        self.loss_coef = np.zeros(0)
+        self.link_cap = np.zeros(0)
         self.sw_config = self.buildSwitchConfig(switches)
         self.json_path = json_path
         if self.json_path == None:
@@ -22,6 +39,9 @@ class Graph(object):
         else:
             self.load_json()
 
+    # Versión del formato de save_json/load_json
+    JSON_VERSION = 1
+
     def buildGraph(self, delta, loads, edges, switches, edges_conf):
         """
             Función para generar el grafo
@@ -29,20 +49,20 @@ class Graph(object):
 
         # Primero vamos a añadir todos los nodos normales del grafo, ya que los tenemos listados con sus cargas en loads.
         for node in loads:
-            self.nodes[node] = Node(node, Node.NORMAL, loads[node][delta])
+            self.nodes[node] = Node(node, Node.NORMAL, loads[node][delta], self.selection)
 
         # Acto seguido vamos añadir todos los nodos virtuales
         for edge in edges:
             if edge["node_a"] not in self.nodes:
-                self.nodes[edge["node_a"]] = Node(edge["node_a"], Node.VIRTUAL, 0)
+                self.nodes[edge["node_a"]] = Node(edge["node_a"], Node.VIRTUAL, 0, self.selection)
             elif edge["node_b"] not in self.nodes:
-                self.nodes[edge["node_b"]] = Node(edge["node_b"], Node.VIRTUAL, 0)
+                self.nodes[edge["node_b"]] = Node(edge["node_b"], Node.VIRTUAL, 0, self.selection)
 
         for sw_edge in switches:
             if sw_edge["node_a"] not in self.nodes:
-                self.nodes[sw_edge["node_a"]] = Node(sw_edge["node_a"], Node.VIRTUAL, 0)
+                self.nodes[sw_edge["node_a"]] = Node(sw_edge["node_a"], Node.VIRTUAL, 0, self.selection)
             elif sw_edge["node_b"] not in self.nodes:
-                self.nodes[sw_edge["node_b"]] = Node(sw_edge["node_b"], Node.VIRTUAL, 0)
+                self.nodes[sw_edge["node_b"]] = Node(sw_edge["node_b"], Node.VIRTUAL, 0, self.selection)
 
         # A continuación, vamos a añadir a los nodos sus vecinos. Cada enlace es bi-direccional.
         for edge in edges:
@@ -53,6 +73,67 @@ class Graph(object):
             self.nodes[sw_edge["node_a"]].addNeighbor(sw_edge["node_b"], Link.SWITCH, sw_edge["state"], 0, 0, 0, 0)
             self.nodes[sw_edge["node_b"]].addNeighbor(sw_edge["node_a"], Link.SWITCH, sw_edge["state"], 0, 0, 0, 0)
 
+        self.buildIndex()
+
+    def buildIndex(self):
+        """
+            Función para internar los nombres de los nodos a índices enteros densos y construir la adyacencia en formato CSR
+
+            - adj_offsets[i]:adj_offsets[i+1] delimita los vecinos del nodo i
+            - adj_targets contiene el índice de cada vecino
+            - adj_links contiene el slot (posición en self.links) del enlace dirigido i -> vecino
+            - link_slot es un hash (i, j) -> slot para localizar un enlace en O(1)
+            - loss_coef y link_cap tienen, por slot, el coeficiente de perdidas y la capacidad (inf para switches)
+        """
+        self.index = dict()
+        self.names = list()
+        self.links = list()
+        self.link_slot = dict()
+
+        for name in self.nodes:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+
+        offsets = [0]
+        targets = list()
+
+        for name in self.names:
+            i = self.index[name]
+            for neighbor, link in zip(self.nodes[name].neighbors, self.nodes[name].links):
+                j = self.index[neighbor]
+                # Ante enlaces duplicados nos quedamos con el primero (igual que neighbors.index())
+                if (i, j) not in self.link_slot:
+                    self.link_slot[(i, j)] = len(self.links)
+                self.links.append(link)
+                targets.append(j)
+            offsets.append(len(targets))
+
+        self.adj_offsets = np.array(offsets, dtype=np.int64)
+        self.adj_targets = np.array(targets, dtype=np.int64)
+        self.adj_links = np.arange(len(self.links), dtype=np.int64)
+
+        # Tablas por enlace dirigido para el cálculo vectorizado de perdidas y capacidades
+        self.loss_coef = np.array([link.loss_coef for link in self.links], dtype=float)
+        self.link_cap = np.array([np.inf if link.capacity is None else link.capacity for link in self.links], dtype=float)
+
+    def getLosses(self, P_in, slots):
+        """
+            Función para calcular las perdidas de un conjunto de enlaces (slots) dada la potencia incidente en cada uno
+        """
+        return Link.losses(P_in, self.loss_coef[slots])
+
+    def getLinkSlot(self, node_a, node_b):
+        """
+            Función para obtener el slot del enlace dirigido node_a -> node_b
+        """
+        return self.link_slot[(self.index[node_a], self.index[node_b])]
+
+    def getLink(self, node_a, node_b):
+        """
+            Función para obtener el Obj Link que va de node_a a node_b
+        """
+        return self.links[self.link_slot[(self.index[node_a], self.index[node_b])]]
+
     def buildSwitchConfig(self, switch):
         """
             Función para procesar la configuración inicial de los enlaces switch
@@ -65,20 +146,41 @@ class Graph(object):
             sw_config[switch.index(sw_links)] = sw_links
             sw_config[switch.index(sw_links)]["pruned"] = False
 
+        # Indexamos los switches para no tener que recorrer sw_config en cada búsqueda
+        self.buildSwitchIndex(sw_config)
+
         return sw_config
 
+    def buildSwitchIndex(self, sw_config):
+        """
+            Función para construir los índices de búsqueda de enlaces switch:
+
+            - sw_index: nombre de nodo -> ID del primer switch (en orden de sw_config) en el que aparece
+            - sw_pairs: par de nodos (sin orden) -> ID del switch que los une
+        """
+        self.sw_index = dict()
+        self.sw_pairs = dict()
+
+        for key in sw_config:
+            for name in (sw_config[key]['node_a'], sw_config[key]['node_b']):
+                if name not in self.sw_index:
+                    self.sw_index[name] = key
+
+            pair = frozenset((sw_config[key]['node_a'], sw_config[key]['node_b']))
+            if pair not in self.sw_pairs:
+                self.sw_pairs[pair] = key
+
     def findSwitchID(self, name):
         """
             Función para buscar el index del enlace Switch dado el nombre de alguno de sus extremos
         """
-        index = None
+        return self.sw_index.get(name)
 
-        for key in self.sw_config:
-            if self.sw_config[key]['node_a'] == name or self.sw_config[key]['node_b'] == name:
-                index = key
-                break
-
-        return index
+    def findSwitchID_by_pair(self, node_a, node_b):
+        """
+            Función para buscar el index del enlace Switch que une node_a y node_b (None si no es un switch)
+        """
+        return self.sw_pairs.get(frozenset((node_a, node_b)))
 
     def getSwitchConfig(self, id):
         """
@@ -86,6 +188,20 @@ class Graph(object):
         """
         return self.sw_config[id]['state']
 
+    def getSwitchStates(self):
+        """
+            Función para obtener el estado de todos los switches, en el orden de sw_config
+        """
+        return [self.sw_config[key]['state'] for key in self.sw_config]
+
+    def setSwitchStates(self, states):
+        """
+            Función para volver al estado de los switches obtenido con getSwitchStates (los podados no se tocan)
+        """
+        for key, state in zip(self.sw_config, states):
+            if not self.sw_config[key]['pruned'] and self.sw_config[key]['state'] != state:
+                self.setSwitchConfig(key, state)
+
     def setSwitchConfig(self, id, state, pruned=None):
         """
             Función para establecer el estado de un enlace de tipo switch 
@@ -102,10 +218,10 @@ class Graph(object):
         # que la info de estado siga siendo coherente.
 
         # Node A
-        self.nodes[self.sw_config[id]['node_a']].links[self.nodes[self.sw_config[id]['node_a']].neighbors.index(self.sw_config[id]['node_b'])].state = state
+        self.getLink(self.sw_config[id]['node_a'], self.sw_config[id]['node_b']).state = state
 
         # Node B
-        self.nodes[self.sw_config[id]['node_b']].links[self.nodes[self.sw_config[id]['node_b']].neighbors.index(self.sw_config[id]['node_a'])].state = state
+        self.getLink(self.sw_config[id]['node_b'], self.sw_config[id]['node_a']).state = state
 
         # Estos dos ultimos dos pasos si se va a eleiminar posteriormente uno de los nodos
         # va da igual, ya que el obj link se va a eliminar.. Pero de esta forma, hacemos que el metodo
@@ -121,7 +237,7 @@ class Graph(object):
         # Si por el contrario, la dirección es "down", la potencia va de node_a al node_b
 
         # Node A
-        self.nodes[node_a].links[self.nodes[node_a].neighbors.index(node_b)].direction = direction
+        self.getLink(node_a, node_b).direction = direction
 
     def getLinkCapacity(self, node_a, node_b):
         """
@@ -130,16 +246,67 @@ class Graph(object):
         ret_cap = None
 
         # Vamos al nodo A, y miramos el enlace con el vecino node_b
+        link = self.getLink(node_a, node_b)
 
         # Si el enlace es de tipo switch.. no hay capacidad
-        if self.nodes[node_a].links[self.nodes[node_a].neighbors.index(node_b)].type == Link.NORMAL:
-            ret_cap = self.nodes[node_a].links[self.nodes[node_a].neighbors.index(node_b)].capacity
+        if link.type == Link.NORMAL:
+            ret_cap = link.capacity
 
         return ret_cap
 
-    def removeNode(self, name):
+    def snapshot(self):
+        """
+            Función para guardar el estado mutable del grafo (cargas, IDs activas, dirección y estado de los enlaces
+            y estado de los switches) en arrays, alineados con el indexado denso, para restaurarlo después con restore
+        """
+        nodes = self.nodes.values()
+
+        return {
+            "loads": np.array([node.load for node in nodes], dtype=float),
+            "active": np.array([-1 if node.getActiveID() is None else node.active_index for node in nodes], dtype=np.int64),
+            "directions": [link.direction for link in self.links],
+            "states": [link.state for link in self.links],
+            "switches": [(self.sw_config[key]['state'], self.sw_config[key]['pruned']) for key in self.sw_config],
+        }
+
+    def restore(self, snapshot):
+        """
+            Función para devolver el grafo al estado guardado con snapshot, en O(n) y sin copiar nodos, enlaces ni IDs
+        """
+        if len(snapshot["loads"]) != len(self.names) or len(snapshot["directions"]) != len(self.links):
+            raise ValueError("The snapshot does not match the current graph index")
+
+        # Cargas e IDs activas: se descarta la selección actual y se vuelve a fijar la guardada
+        self.selection.clear()
+        for node, load, active in zip(self.nodes.values(), snapshot["loads"].tolist(), snapshot["active"].tolist()):
+            node.load = load
+            if active >= 0:
+                node.setActiveID(active)
+
+        for link, direction, state in zip(self.links, snapshot["directions"], snapshot["states"]):
+            link.direction = direction
+            link.state = state
+
+        for key, (state, pruned) in zip(self.sw_config, snapshot["switches"]):
+            self.sw_config[key]['state'] = state
+            self.sw_config[key]['pruned'] = pruned
+
+    def clearIDs(self):
+        """
+            Función para eliminar las HLMACs de todos los nodos (y con ellas la selección de IDs activas)
+        """
+        self.selection.clear()
+        self.selection.ids_version += 1
+        for node in self.nodes.values():
+            node.ids = list()
+            node.ids_index = dict()
+            node.ids_indexed = 0
+
+    def removeNode(self, name, reindex=True):
         """
             Funcion para eliminar un nodo del grafo
+
+            Si se van a eliminar varios nodos seguidos, se puede pasar reindex=False y llamar a buildIndex() al final.
         """
 
         # Primero vamos a los vecinos y eleminimos los enlaces con el
@@ -153,6 +320,11 @@ class Graph(object):
 
         # Por último eliminamos el nodo de la lista del grafo
         self.nodes.pop(name)
+        self.selection.ids_version += 1
+
+        # Los índices densos han cambiado, hay que volver a internar
+        if reindex:
+            self.buildIndex()
 
     def pruneGraph(self):
         """
@@ -179,10 +351,10 @@ class Graph(object):
 
         # Lets open the switch links so that they dont consume anything
         for node in nodes_to_prune['sweep_1']:
-            self.setSwitchConfig(self.findSwitchID(node), 'open', 'pruned')
+            self.setSwitchConfig(self.findSwitchID_by_pair(node, self.nodes[node].neighbors[0]), 'open', 'pruned')
 
         for node in nodes_to_prune['sweep_1']:
-            self.removeNode(node)
+            self.removeNode(node, reindex=False)
 
         # Second sweep
         for node in self.nodes:
@@ -194,7 +366,131 @@ class Graph(object):
                 nodes_to_prune['sweep_2'].append(self.nodes[node].name)
 
         for node in nodes_to_prune['sweep_2']:
-            self.removeNode(node)
+            self.removeNode(node, reindex=False)
+
+        self.buildIndex()
 
         return nodes_to_prune['sweep_1'] + nodes_to_prune['sweep_2']
 
+    def save_json(self, path):
+        """
+            Función para guardar el grafo ya construido (y podado, en su caso) junto con las HLMACs difundidas
+
+            Los nodos se guardan por su índice denso, los enlaces dirigidos en orden de slot (lo que conserva el orden
+            de vecinos de cada nodo) y las HLMACs como punteros al padre (ver encodeIDs), sin listas de saltos.
+        """
+        links = {
+            "src": [self.index[link.node_a] for link in self.links],
+            "dst": [self.index[link.node_b] for link in self.links],
+            "type": [link.type for link in self.links],
+            "state": [link.state for link in self.links],
+            "dist": [link.dist for link in self.links],
+            "conf": [link.conf for link in self.links],
+            "coef_r": [link.coef_R for link in self.links],
+            "capacity": [link.capacity for link in self.links],
+        }
+
+        data = {
+            "version": Graph.JSON_VERSION,
+            "root": self.root,
+            "names": self.names,
+            "types": [self.nodes[name].type for name in self.names],
+            "loads": [self.nodes[name].load for name in self.names],
+            "links": links,
+            "sw_config": [[key, self.sw_config[key]] for key in self.sw_config],
+            "compact": any(isinstance(id, HLMACCompact) for node in self.nodes.values() for id in node.ids[:1]),
+            "ids": self.encodeIDs(),
+        }
+
+        with open(path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+
+    def load_json(self, compact=None):
+        """
+            Función para cargar un grafo guardado con save_json (desde self.json_path), con sus HLMACs ya difundidas
+
+            Con compact=True las HLMACs se reconstruyen como HLMACCompact (ver Den2ne); por defecto, con el mismo tipo
+            con el que se guardaron.
+        """
+        with open(self.json_path, "r") as file:
+            data = json.load(file)
+
+        if data.get("version") != Graph.JSON_VERSION:
+            raise ValueError(f"Unsupported graph file version: {data.get('version')}")
+
+        self.root = data["root"]
+        self.nodes = dict()
+
+        for name, type_node, load in zip(data["names"], data["types"], data["loads"]):
+            self.nodes[name] = Node(name, type_node, load, self.selection)
+
+        # Los enlaces se crean en orden de slot, es decir, en el mismo orden de vecinos de cada nodo
+        names = data["names"]
+        links = data["links"]
+        for src, dst, type_link, state, dist, conf, coef_r, capacity in zip(
+            links["src"], links["dst"], links["type"], links["state"], links["dist"], links["conf"], links["coef_r"], links["capacity"]
+        ):
+            self.nodes[names[src]].addNeighbor(names[dst], type_link, state, dist, conf, coef_r, 0)
+            self.nodes[names[src]].links[-1].capacity = capacity
+
+        self.sw_config = {key: entry for key, entry in data["sw_config"]}
+        self.buildSwitchIndex(self.sw_config)
+        self.buildIndex()
+
+        if compact is None:
+            compact = data["compact"]
+
+        self.decodeIDs(data["ids"], HLMACCompact if compact else HLMAC)
+
+    def encodeIDs(self):
+        """
+            Función para codificar las HLMACs de todos los nodos como punteros al padre
+
+            Se recorren por longitud (el padre siempre va antes que sus hijas) y de cada una se guarda el índice del nodo,
+            la posición en la lista de IDs del nodo, el índice (en esta misma codificación) de la HLMAC padre (-1 para
+            el root), la dependencia del switch (-1 si no hay) y el flag used.
+        """
+        ids = [(id.depth, i, pos, id) for i, name in enumerate(self.names) for pos, id in enumerate(self.nodes[name].ids)]
+        ids.sort(key=lambda entry: entry[0])
+
+        position = {id(entry[3]): k for k, entry in enumerate(ids)}
+
+        return {
+            "node": [i for _, i, _, _ in ids],
+            "pos": [pos for _, _, pos, _ in ids],
+            "parent": [-1 if hlmac.parent is None else position[id(hlmac.parent)] for _, _, _, hlmac in ids],
+            "dependency": [-1 if hlmac.dependency is None else hlmac.dependency for _, _, _, hlmac in ids],
+            "used": [hlmac.used for _, _, _, hlmac in ids],
+        }
+
+    def decodeIDs(self, ids, hlmac_type=HLMAC):
+        """
+            Función para reconstruir las HLMACs de los nodos a partir de encodeIDs (sustituye a las que hubiera)
+        """
+        hlmacs = list()
+        nodes = ids["node"]
+        node_ids = [[None] * count for count in np.bincount(nodes, minlength=len(self.names)).tolist()]
+
+        for node, pos, parent, dependency, used in zip(nodes, ids["pos"], ids["parent"], ids["dependency"], ids["used"]):
+            name = self.names[node]
+
+            if parent < 0:
+                hlmac = hlmac_type(None, name, None)
+            else:
+                hlmac = hlmac_type(
+                    hlmacs[parent],
+                    name,
+                    None if dependency < 0 else dependency,
+                    self.links[self.link_slot[(node, nodes[parent])]],
+                )
+
+            hlmac.used = used
+            hlmacs.append(hlmac)
+            node_ids[node][pos] = hlmac
+
+        for name, ids_list in zip(self.names, node_ids):
+            self.nodes[name].ids = ids_list
+            self.nodes[name].ids_index = dict()
+            self.nodes[name].ids_indexed = 0
+
+        self.selection.ids_version += 1
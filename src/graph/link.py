@@ -34,6 +34,13 @@ class Link(object):
             self.capacity = None
             self.coef_R = None
 
+        # Resistencia efectiva y coeficiente de perdidas (r_eff / V^2) unificados para enlaces normales y switches
+        if self.type == Link.SWITCH:
+            self.resistance = Link.SWITCH_R
+        else:
+            self.resistance = self.coef_R * (Link.ft2meters(self.dist) / 1000)
+        self.loss_coef = self.resistance / (Link.VOLTAGE) ** 2
+
     @staticmethod
     def ft2meters(fts):
         """
@@ -52,14 +59,7 @@ class Link(object):
         """
         Función para calcular las perdidas de un enlace de forma agnostica
         """
-        Loss = 0.0  # kW
-
-        if self.type == Link.SWITCH:
-            Loss = Link.getLosses_Switch(Pin)
-        else:
-            Loss = self.getLosses_Link(Pin)
-
-        return Loss
+        return Link.losses(Pin, self.loss_coef)
 
     @staticmethod
     def getLosses_Switch(P_in):
@@ -78,3 +78,26 @@ class Link(object):
         )  # El coef_R esta en ohms/km -> la distancia nos venía en fts
 
         return (((r_eff) / (Link.VOLTAGE) ** 2) * (P_in * 1000) ** 2) / 1000
+
+    def getResistance(self):
+        """
+        Función para obtener la resistencia efectiva del enlace (Ohms), la misma que usan getLosses_Switch y getLosses_Link
+        """
+        return self.resistance
+
+    @staticmethod
+    def getLosses_R(P_in, r_eff):
+        """
+        Función para calcular las perdidas dada una potencia incidente (kW) y una resistencia efectiva (Ohms)
+        """
+        return (((r_eff) / (Link.VOLTAGE) ** 2) * (P_in * 1000) ** 2) / 1000
+
+    @staticmethod
+    def losses(P_in, loss_coef):
+        """
+        Función para calcular las perdidas (kW) dada la potencia incidente (kW) y el coeficiente de perdidas del enlace
+
+        Admite escalares o arrays de NumPy (por ejemplo, Graph.loss_coef[slots] para todos los enlaces de un nivel del
+        árbol). Es la misma expresión que getLosses_Switch y getLosses_Link con r_eff / V^2 ya calculado.
+        """
+        return ((loss_coef) * (P_in * 1000) ** 2) / 1000
@@ -4,6 +4,28 @@ from den2ne.den2neHLMAC import HLMAC
 from .link import Link
 
 
+class Selection(object):
+    """
+        Clase para llevar la generación de la selección de IDs activas, compartida por todos los nodos de un grafo
+    """
+
+    def __init__(self):
+        """
+            Constructor de la clase Selection
+        """
+        self.generation = 0
+        self.version = 0  # Cambia con cualquier modificación de la selección (limpieza o nueva ID activa)
+        self.ids_version = 0  # Cambia cuando se añaden o se borran IDs en cualquier nodo
+        self.load_version = 0  # Cambia con cualquier escritura de la carga de un nodo (ver Node.load)
+
+    def clear(self):
+        """
+            Función para invalidar de golpe la ID activa de todos los nodos que comparten la selección
+        """
+        self.generation += 1
+        self.version += 1
+
+
 class Node(object):
     """
         Clase para gestionar un nodo del grafo
@@ -13,18 +35,44 @@ class Node(object):
     NORMAL = 1
     VIRTUAL = 0
 
-    def __init__(self, name, type_node, load=0):
+    def __init__(self, name, type_node, load=0, selection=None):
         """
             Constructor de la clase Node
         """
         self.name = name
         self.type = type_node
+
+        # Selección compartida por todos los nodos del grafo (IDs activas y versiones de IDs y cargas), antes que la
+        # carga, que la usa
+        self.selection = selection if selection is not None else Selection()
         self.load = load
         self.neighbors = list()
         self.links = list()
         self.ids = list()
+        self.ids_index = dict()  # HLMAC (tupla de saltos) -> posición en self.ids
+        self.ids_indexed = 0  # Número de IDs de self.ids ya incorporadas a ids_index
         self.ids_root_count = 0  # Lo usamos solamente para den2neMultiroot.
 
+        # ID activa: posición en self.ids, válida solo si se fijó en la generación actual de la selección
+        self.active_index = None
+        self.active_generation = -1
+
+    @property
+    def load(self):
+        """
+            Carga del nodo
+        """
+        return self._load
+
+    @load.setter
+    def load(self, load):
+        """
+            Al escribir la carga se avisa a la selección compartida, para que quien guarde datos derivados de las cargas
+            (por ejemplo, las cargas encerradas de Den2ne) sepa que ya no son válidos
+        """
+        self._load = load
+        self.selection.load_version += 1
+
     def addNeighbor(self, neighbor, type_link, state, dist, conf, coef_r, i_max):
         """
             Funcion para añadir un vecino
@@ -32,19 +80,38 @@ class Node(object):
         self.neighbors.append(neighbor)
         self.links.append(Link(self.name, neighbor, type_link, state, dist, conf, coef_r, i_max))
 
+    def addID(self, id):
+        """
+            Funcion para añadir una ID (HLMAC) al nodo
+        """
+        self.ids.append(id)
+        self.selection.ids_version += 1
+
     def getActiveID(self):
         """
             Función para obtener el ID activo
         """
         ret_ID = None
 
-        for id in self.ids:
-            if id.active is True:
-                ret_ID = id
-                break
+        if self.active_generation == self.selection.generation:
+            ret_ID = self.ids[self.active_index]
 
         return ret_ID
 
+    def setActiveID(self, index):
+        """
+            Función para fijar como activa la ID de la posición dada (sustituye a la activa anterior, si la hay)
+        """
+        self.active_index = index
+        self.active_generation = self.selection.generation
+        self.selection.version += 1
+
+    def isActiveID(self, id):
+        """
+            Función para comprobar si una ID es la activa del nodo
+        """
+        return self.getActiveID() is id
+
     def getIndexID(self, id_to_check):
         """
             Funcion para obtener el indexs de una lista de saltos
@@ -54,9 +121,12 @@ class Node(object):
         
         ret_index = None
 
-        for id in self.ids:
-            if id_to_check == id.hlmac:
-                ret_index = self.ids.index(id)
-                break
+        # El índice se completa bajo demanda con las IDs que hayan llegado desde la última consulta
+        # (con HLMACs repetidas se conserva la primera posición, como en la búsqueda lineal)
+        for index in range(self.ids_indexed, len(self.ids)):
+            self.ids_index.setdefault(tuple(self.ids[index].hlmac), index)
+        self.ids_indexed = len(self.ids)
+
+        ret_index = self.ids_index.get(tuple(id_to_check))
             
         return ret_index
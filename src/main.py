@@ -3,7 +3,10 @@
 import pathlib
 from graph.graph import Graph
 from den2ne.den2neALG import Den2ne
+from den2ne.den2neMultiroot import Multiroot
 from dataCollector.dataCollector import DataGatherer
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import time
 
 
@@ -55,9 +58,21 @@ def print_debug(delta, criteria, scenario, balance, flux, enclosed, iteration):
     print(message)
 
 
+def write_outdata(filename, out_data):
+    # Una fila por criterio con los resultados de los tres escenarios de un instante
+    with open(filename, "w") as file:
+        file.write("criterion,power_ideal,abs_ideal,power_wloss,abs_wloss,power_wlossCap,abs_wlossCap,timestamp_ideal,timestamp_wloss,timestamp_wlossCap,iteration_ideal,iteration_wloss,iteration_wlossCap,sw_toggles\n")
+        for criterion in out_data:
+            file.write(
+                f'{criterion},{out_data[criterion]["total_balance_ideal"]},{out_data[criterion]["abs_flux"]},'
+                f'{out_data[criterion]["total_balance_with_losses"]},{out_data[criterion]["abs_flux_with_losses"]},'
+                f'{out_data[criterion]["total_balance_with_lossesCap"]},{out_data[criterion]["abs_flux_with_lossesCap"]},'
+                f'{out_data[criterion]["timestamp_ideal"]},{out_data[criterion]["timestamp_wloss"]},{out_data[criterion]["timestamp_wlossCap"]},{out_data[criterion]["iteration_ideal"]},{out_data[criterion]["iteration_wloss"]},{out_data[criterion]["iteration_wlossCap"]},{out_data[criterion]["sw_toggles"]}\n'
+            )
+
 
-# Vamos a programar unas pruebas globales sobre la topología IEEE 123
-def test_ieee123():
+# Vamos a programar unas pruebas globales sobre la topología IEEE 123 (deltas: instantes a estudiar, todos por defecto)
+def test_ieee123(deltas=None):
 
     # Variables
     dirs = ["reports", "csv", "fig"]
@@ -82,7 +97,6 @@ def test_ieee123():
     edges = DataGatherer.getEdges("data/"+ topo_name + "/" +"links.csv")
     edges_conf = DataGatherer.getEdges_Config("data/links/links_config_8.csv")
     sw_edges = DataGatherer.getSwitches("data/"+ topo_name + "/" + "switches.csv")
-    positions = DataGatherer.getPositions("data/"+ topo_name + "/" + "node_positions.csv")
 
     # Creamos la var del grafo para el primer instante
     G = Graph(0, loads, edges, sw_edges, edges_conf, root="150")
@@ -96,8 +110,14 @@ def test_ieee123():
     # Primera fase: difusión de IDs
     G_den2ne_alg.spread_ids()
 
+    # Configuración inicial de los switches
+    sw_states = G.getSwitchStates()
+
     # Vamos a iterar por todos los intantes de cargas
-    for delta in range(0, len(loads["1"])):
+    if deltas is None:
+        deltas = range(0, len(loads["1"]))
+
+    for delta in deltas:
 
         out_data[delta] = dict()
 
@@ -107,36 +127,14 @@ def test_ieee123():
             # Init Loads
             G_den2ne_alg.updateLoads(loads, delta)
 
+            # Cambios de estado de los switches en los tres escenarios de este criterio, partiendo siempre de la
+            # configuración inicial para que no dependan del criterio o el instante anterior (ver test_ieee123_parallel)
+            G_den2ne_alg.G.setSwitchStates(sw_states)
+            sw_toggles = G_den2ne_alg.switch_toggles
+
             #  ----------------     Ideal balance      ----------------
-            # Var init
-            total_balance_ideal = float()
-            abs_flux = float()
-            iteration_ideal = 0
-            start_ideal = time.time() * 1000
-
-            while True:
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion) 
-                 
-                [total_balance_ideal_ret, abs_flux_ret] = G_den2ne_alg.globalBalance(
-                    withLosses=False,
-                    withCap=False,
-                    withDebugPlot=False,
-                    positions=positions,
-                    path="results/",
-                )
-
-                # Add curr iteration
-                iteration_ideal += 1
-                total_balance_ideal += total_balance_ideal_ret
-                abs_flux += abs_flux_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-
-            end_ideal = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_ideal, abs_flux, iteration_ideal, timestamp_ideal] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_IDEAL)
             print_debug(delta,criterion,"IDEAL",total_balance_ideal,abs_flux,G_den2ne_alg.are_enlclosedLoads(), iteration_ideal)
 
             # Genearación de informes
@@ -148,37 +146,8 @@ def test_ieee123():
             G_den2ne_alg.updateLoads(loads, delta)
 
             #  ----------------     Withloss balance      ----------------
-            # Var init
-            total_balance_with_losses = float()
-            abs_flux_with_losses = float()
-            iteration_wloss = 0
-            start_wloss = time.time() * 1000
-
-            while True:
-                
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion)
-
-                [total_balance_with_losses_ret, abs_flux_with_losses_ret] = (
-                    G_den2ne_alg.globalBalance(
-                        withLosses=True,
-                        withCap=False,
-                        withDebugPlot=False,
-                        positions=positions,
-                        path="results/",
-                    )
-                )
-
-                # Add curr iteration
-                iteration_wloss += 1
-                total_balance_with_losses += total_balance_with_losses_ret
-                abs_flux_with_losses += abs_flux_with_losses_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-            end_wloss = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_losses, abs_flux_with_losses, iteration_wloss, timestamp_wloss] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES)
             print_debug(delta,criterion,"LOSS",total_balance_with_losses,abs_flux_with_losses,G_den2ne_alg.are_enlclosedLoads(), iteration_wloss)
 
             # Genearación de informes
@@ -190,37 +159,8 @@ def test_ieee123():
             G_den2ne_alg.updateLoads(loads, delta)
 
             #  ----------------     Withloss and Cap balance      ----------------
-            # Var init
-            total_balance_with_lossesCap = float()
-            abs_flux_with_lossesCap = float()
-            iteration_wlossCap = 0
-            start_wlossCap = time.time() * 1000
-
-            while True:
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion)
-
-                [total_balance_with_lossesCap_ret, abs_flux_with_lossesCap_ret] = (
-                    G_den2ne_alg.globalBalance(
-                        withLosses=True,
-                        withCap=True,
-                        withDebugPlot=False,
-                        positions=positions,
-                        path="results/",
-                    )
-                )
-
-                # Add curr iteration
-                iteration_wlossCap += 1
-                total_balance_with_lossesCap += total_balance_with_lossesCap_ret
-                abs_flux_with_lossesCap += abs_flux_with_lossesCap_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-
-            end_wlossCap = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_lossesCap, abs_flux_with_lossesCap, iteration_wlossCap, timestamp_wlossCap] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES_CAP)
             print_debug(delta,criterion,"LOSS_CAP",total_balance_with_lossesCap,abs_flux_with_lossesCap,G_den2ne_alg.are_enlclosedLoads(), iteration_wlossCap)
 
             # ------------------------ Save data --------------------------
@@ -231,12 +171,13 @@ def test_ieee123():
                 "abs_flux_with_losses": abs_flux_with_losses,
                 "total_balance_with_lossesCap": total_balance_with_lossesCap,
                 "abs_flux_with_lossesCap": abs_flux_with_lossesCap,
-                "timestamp_ideal": end_ideal - start_ideal,
-                "timestamp_wloss": end_wloss - start_wloss,
-                "timestamp_wlossCap": end_wlossCap - start_wlossCap,
+                "timestamp_ideal": timestamp_ideal,
+                "timestamp_wloss": timestamp_wloss,
+                "timestamp_wlossCap": timestamp_wlossCap,
                 "iteration_ideal": iteration_ideal,
                 "iteration_wloss": iteration_wloss,
                 "iteration_wlossCap": iteration_wlossCap,
+                "sw_toggles": G_den2ne_alg.switch_toggles - sw_toggles,
             }
 
             # Genearación de informes
@@ -254,25 +195,138 @@ def test_ieee123():
             )
 
         # Exportar datos
-        with open(f"results/{topo_name}/csv/outdata_d{delta}.csv", "w") as file:
-            file.write("criterion,power_ideal,abs_ideal,power_wloss,abs_wloss,power_wlossCap,abs_wlossCap,timestamp_ideal,timestamp_wloss,timestamp_wlossCap,iteration_ideal,iteration_wloss,iteration_wlossCap\n")
-            for criterion in out_data[delta]:
-                file.write(
-                    f'{criterion},{out_data[delta][criterion]["total_balance_ideal"]},{out_data[delta][criterion]["abs_flux"]},'
-                    f'{out_data[delta][criterion]["total_balance_with_losses"]},{out_data[delta][criterion]["abs_flux_with_losses"]},'
-                    f'{out_data[delta][criterion]["total_balance_with_lossesCap"]},{out_data[delta][criterion]["abs_flux_with_lossesCap"]},'
-                    f'{out_data[delta][criterion]["timestamp_ideal"]},{out_data[delta][criterion]["timestamp_wloss"]},{out_data[delta][criterion]["timestamp_wlossCap"]},{out_data[delta][criterion]["iteration_ideal"]},{out_data[delta][criterion]["iteration_wloss"]},{out_data[delta][criterion]["iteration_wlossCap"]}\n'
-                )
+        write_outdata(f"results/{topo_name}/csv/outdata_d{delta}.csv", out_data[delta])
 
     G_den2ne_alg.write_ids_report(f"results/{topo_name}/reports/report_ids.txt")
 
 
-# Vamos a programar unas pruebas globales sobre la topología IEEE 123
-def test_ieee123_fullrandom():
+# Balance de todos los instantes de carga de una vez (solo criterios que no dependen de la carga)
+# El perfil de cargas se lee desde una caché binaria mapeada en memoria y se procesa por bloques de window instantes
+def test_ieee123_batch(window=24):
+
+    # Variables
+    topo_name = "ieee123_batch"
+    criteria = [
+        Den2ne.CRITERION_NUM_HOPS,
+        Den2ne.CRITERION_DISTANCE,
+    ]
+    scenarios = {
+        "ideal": (False, False),
+        "wloss": (True, False),
+        "wlossCap": (True, True),
+    }
+
+    # Preparamos los directorios de resultados
+    pathlib.Path("results/" + topo_name + "/csv").mkdir(parents=True, exist_ok=True)
+    pathlib.Path("results/" + topo_name + "/cache").mkdir(parents=True, exist_ok=True)
+
+    # Recolectamos los datos
+    loads = DataGatherer.getLoadProfile("data/loads/loads_v2.csv", 3, cache=f"results/{topo_name}/cache/loads_v2")
+    edges = DataGatherer.getEdges("data/ieee123/links.csv")
+    edges_conf = DataGatherer.getEdges_Config("data/links/links_config_8.csv")
+    sw_edges = DataGatherer.getSwitches("data/ieee123/switches.csv")
+
+    # Creamos el grafo, podamos y difundimos los IDs
+    G = Graph(0, loads, edges, sw_edges, edges_conf, root="150")
+    G.pruneGraph()
+    G_den2ne_alg = Den2ne(G)
+    G_den2ne_alg.spread_ids()
+
+    for criterion in criteria:
+
+        with open(f"results/{topo_name}/csv/outdata_c{criterion}.csv", "w") as file:
+            file.write("delta,power_ideal,abs_ideal,power_wloss,abs_wloss,power_wlossCap,abs_wlossCap,iteration_ideal,iteration_wloss,iteration_wlossCap\n")
+
+            for (first, loads_window) in loads.windows(G.names, window):
+
+                out_data = dict()
+
+                for scenario in scenarios:
+                    (withLosses, withCap) = scenarios[scenario]
+
+                    start = time.time() * 1000
+                    out_data[scenario] = G_den2ne_alg.globalBalanceDeltas(loads_window, criterion, withLosses, withCap)
+                    end = time.time() * 1000
+
+                    print(f"[DEBUG][Criteria {criterion:>3}] [Scenario {scenario:<15}] --> [Deltas {first}-{first + loads_window.shape[1] - 1} in {end - start:.2f} ms]")
+
+                # Exportar datos
+                for i in range(0, loads_window.shape[1]):
+                    file.write(
+                        f'{first + i},{out_data["ideal"][0][i]},{out_data["ideal"][1][i]},'
+                        f'{out_data["wloss"][0][i]},{out_data["wloss"][1][i]},'
+                        f'{out_data["wlossCap"][0][i]},{out_data["wlossCap"][1][i]},'
+                        f'{out_data["ideal"][2][i]},{out_data["wloss"][2][i]},{out_data["wlossCap"][2][i]}\n'
+                    )
+
+
+# Nombres de cada escenario de Den2ne.SCENARIOS en los informes y en out_data (mismas claves que test_ieee123):
+# (sufijo de los informes, etiqueta de depuración, balance, flujo absoluto, sufijo de tiempo e iteraciones)
+SCENARIO_NAMES = {
+    Den2ne.SCENARIO_IDEAL: ("ideal", "IDEAL", "total_balance_ideal", "abs_flux", "ideal"),
+    Den2ne.SCENARIO_LOSSES: ("losses", "LOSS", "total_balance_with_losses", "abs_flux_with_losses", "wloss"),
+    Den2ne.SCENARIO_LOSSES_CAP: ("lossesCap", "LOSS_CAP", "total_balance_with_lossesCap", "abs_flux_with_lossesCap", "wlossCap"),
+}
+
+# Instancia de Den2ne de cada proceso del pool (grafo etiquetado con las IDs ya difundidas) y configuración inicial
+# de los switches
+worker_alg = None
+worker_sw_states = None
+
+
+def init_worker(alg, sw_states):
+    # Con fork el grafo se hereda sin serializar, en otro caso se recibe una vez por proceso
+    global worker_alg, worker_sw_states
+    worker_alg = alg
+    worker_sw_states = sw_states
+
+
+def run_task(task):
+    # Cada tarea es un instante y un criterio, y solo trae las cargas de su instante: {nodo: [carga]}
+    (topo_name, delta, criterion, delta_loads) = task
+
+    # Igual que test_ieee123: los cambios de los switches se cuentan desde la configuración inicial
+    worker_alg.G.setSwitchStates(worker_sw_states)
+    sw_toggles = worker_alg.switch_toggles
+
+    out_data = dict()
+    for scenario in Den2ne.SCENARIOS:
+        (report_name, debug_name, balance_key, flux_key, suffix) = SCENARIO_NAMES[scenario]
+
+        worker_alg.updateLoads(delta_loads, 0)
+
+        # Selección de IDs y balance global hasta que no queden cargas encerradas
+        [total_balance, abs_flux, iteration, timestamp] = worker_alg.solve(criterion, scenario)
+        print_debug(delta, criterion, debug_name, total_balance, abs_flux, worker_alg.are_enlclosedLoads(), iteration)
+
+        # Mismos informes que el driver secuencial
+        worker_alg.write_loads_report(
+            f"results/{topo_name}/reports/report_loads_d{delta}_{report_name}_c{criterion}.txt"
+        )
+
+        out_data[balance_key] = total_balance
+        out_data[flux_key] = abs_flux
+        out_data["timestamp_" + suffix] = timestamp
+        out_data["iteration_" + suffix] = iteration
+
+    out_data["sw_toggles"] = worker_alg.switch_toggles - sw_toggles
+
+    worker_alg.write_swConfig_report(
+        f"results/{topo_name}/reports/report_swConfig_d{delta}_c{criterion}.txt"
+    )
+    worker_alg.write_swConfig_CSV(
+        f"results/{topo_name}/csv/swConfig_d{delta}_c{criterion}.csv"
+    )
+
+    return (delta, criterion, out_data)
+
+
+# Mismo barrido que test_ieee123, repartiendo las tareas (instante, criterio) en un pool de procesos
+def test_ieee123_parallel(workers=None, chunksize=4, deltas=None):
 
     # Variables
     dirs = ["reports", "csv", "fig"]
-    topo_name = "ieee123_fullrandom"
+    topo_name = "ieee123_parallel"
     criteria = [
         Den2ne.CRITERION_NUM_HOPS,
         Den2ne.CRITERION_DISTANCE,
@@ -280,207 +334,190 @@ def test_ieee123_fullrandom():
         Den2ne.CRITERION_POWER_TO_ZERO,
         Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES,
     ]
-    
+
+    # Preparamos los directorios de resultados
+    for dir in dirs:
+        pathlib.Path("results/" + topo_name + "/" + dir).mkdir(
+            parents=True, exist_ok=True
+        )
+
     # Recolectamos los datos
     loads = DataGatherer.getLoads("data/loads/loads_v2.csv", 3)
     edges = DataGatherer.getEdges("data/ieee123/links.csv")
     edges_conf = DataGatherer.getEdges_Config("data/links/links_config_8.csv")
     sw_edges = DataGatherer.getSwitches("data/ieee123/switches.csv")
-    positions = DataGatherer.getPositions("data/ieee123/node_positions.csv")
 
-    #nodes_to_test = ['150', '251', '610', '451', '47', '350', '1', '7', '2', '27']
+    # Creamos el grafo, podamos y difundimos los IDs una sola vez
+    G = Graph(0, loads, edges, sw_edges, edges_conf, root="150")
+    G.pruneGraph()
+    G_den2ne_alg = Den2ne(G)
+    G_den2ne_alg.spread_ids()
 
-    for node in positions:
+    # Una tarea por instante y criterio (los tres escenarios van seguidos, como en test_ieee123)
+    if deltas is None:
+        deltas = range(0, len(loads["1"]))
 
-        curr_root = node['node']
+    tasks = list()
+    for delta in deltas:
+        delta_loads = {node: [loads[node][delta]] for node in loads}
+        for criterion in criteria:
+            tasks.append((topo_name, delta, criterion, delta_loads))
 
-        # Preparamos los directorios de resultados
-        for dir in dirs:
-            pathlib.Path("results/" + topo_name + "/" + "root_" + curr_root + "/" + dir).mkdir(
-                parents=True, exist_ok=True
-        )
-        
-        # New out data 
-        out_data = dict()
-
-        # Creamos la var del grafo para el primer instante
-        G = Graph(0, loads, edges, sw_edges, edges_conf, root=curr_root)
-
-        # Iniciamos el algoritmo
-        G_den2ne_alg = Den2ne(G)
-
-        # Primera fase: difusión de IDs
-        G_den2ne_alg.spread_ids()
-
-        # Vamos a iterar por todos los intantes de cargas
-        for delta in range(0, len(loads["1"])):
-
-            out_data[delta] = dict()
-
-            # Vamos a iterar por criterio
-            for criterion in criteria:
-
-                # Init Loads
-                G_den2ne_alg.updateLoads(loads, delta)
-
-                #  ----------------     Ideal balance      ----------------
-                # Var init
-                total_balance_ideal = float()
-                abs_flux = float()
-                iteration_ideal = 0
-                start_ideal = time.time() * 1000
-
-                while True:
-                    # Select IDs
-                    G_den2ne_alg.clearSelectedIDs()
-                    G_den2ne_alg.selectBestIDs(criterion) 
-                    
-                    [total_balance_ideal_ret, abs_flux_ret] = G_den2ne_alg.globalBalance(
-                        withLosses=False,
-                        withCap=False,
-                        withDebugPlot=False,
-                        positions=positions,
-                        path="results/",
-                    )
+    # Con fork los procesos heredan el grafo etiquetado
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
 
-                    # Add curr iteration
-                    iteration_ideal += 1
-                    total_balance_ideal += total_balance_ideal_ret
-                    abs_flux += abs_flux_ret
-
-                    # Check if we have enclosed loads
-                    if not G_den2ne_alg.are_enlclosedLoads():
-                        break
-
-                end_ideal = time.time() * 1000
-                print_debug(delta,criterion,"IDEAL",total_balance_ideal,abs_flux,G_den2ne_alg.are_enlclosedLoads(), iteration_ideal)
-
-                # Genearación de informes
-                G_den2ne_alg.write_loads_report(
-                    f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_ideal_c{criterion}.txt"
-                )
-
-                # Re-Init loads
-                G_den2ne_alg.updateLoads(loads, delta)
-
-                #  ----------------     Withloss balance      ----------------
-                # Var init
-                total_balance_with_losses = float()
-                abs_flux_with_losses = float()
-                iteration_wloss = 0
-                start_wloss = time.time() * 1000
-
-                while True:
-                    
-                    # Select IDs
-                    G_den2ne_alg.clearSelectedIDs()
-                    G_den2ne_alg.selectBestIDs(criterion)
-
-                    [total_balance_with_losses_ret, abs_flux_with_losses_ret] = (
-                        G_den2ne_alg.globalBalance(
-                            withLosses=True,
-                            withCap=False,
-                            withDebugPlot=False,
-                            positions=positions,
-                            path="results/",
-                        )
-                    )
+    out_data = dict()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(G_den2ne_alg, G.getSwitchStates())) as executor:
+        for (delta, criterion, data) in executor.map(run_task, tasks, chunksize=chunksize):
+            out_data.setdefault(delta, dict())[criterion] = data
 
-                    # Add curr iteration
-                    iteration_wloss += 1
-                    total_balance_with_losses += total_balance_with_losses_ret
-                    abs_flux_with_losses += abs_flux_with_losses_ret
-
-                    # Check if we have enclosed loads
-                    if not G_den2ne_alg.are_enlclosedLoads():
-                        break
-                end_wloss = time.time() * 1000
-                print_debug(delta,criterion,"LOSS",total_balance_with_losses,abs_flux_with_losses,G_den2ne_alg.are_enlclosedLoads(), iteration_wloss)
-
-                # Genearación de informes
-                G_den2ne_alg.write_loads_report(
-                    f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_losses_c{criterion}.txt"
-                )
-
-                # Re-Init loads
-                G_den2ne_alg.updateLoads(loads, delta)
-
-                #  ----------------     Withloss and Cap balance      ----------------
-                # Var init
-                total_balance_with_lossesCap = float()
-                abs_flux_with_lossesCap = float()
-                iteration_wlossCap = 0
-                start_wlossCap = time.time() * 1000
-
-                while True:
-                    # Select IDs
-                    G_den2ne_alg.clearSelectedIDs()
-                    G_den2ne_alg.selectBestIDs(criterion)
-
-                    [total_balance_with_lossesCap_ret, abs_flux_with_lossesCap_ret] = (
-                        G_den2ne_alg.globalBalance(
-                            withLosses=True,
-                            withCap=True,
-                            withDebugPlot=False,
-                            positions=positions,
-                            path="results/",
-                        )
-                    )
+    # Exportar datos
+    for delta in out_data:
+        write_outdata(f"results/{topo_name}/csv/outdata_d{delta}.csv", out_data[delta])
 
-                    # Add curr iteration
-                    iteration_wlossCap += 1
-                    total_balance_with_lossesCap += total_balance_with_lossesCap_ret
-                    abs_flux_with_lossesCap += abs_flux_with_lossesCap_ret
-
-                    # Check if we have enclosed loads
-                    if not G_den2ne_alg.are_enlclosedLoads():
-                        break
-
-                end_wlossCap = time.time() * 1000
-                print_debug(delta,criterion,"LOSS_CAP",total_balance_with_lossesCap,abs_flux_with_lossesCap,G_den2ne_alg.are_enlclosedLoads(), iteration_wlossCap)
-
-                # ------------------------ Save data --------------------------
-                out_data[delta][criterion] = {
-                    "total_balance_ideal": total_balance_ideal,
-                    "abs_flux": abs_flux,
-                    "total_balance_with_losses": total_balance_with_losses,
-                    "abs_flux_with_losses": abs_flux_with_losses,
-                    "total_balance_with_lossesCap": total_balance_with_lossesCap,
-                    "abs_flux_with_lossesCap": abs_flux_with_lossesCap,
-                    "timestamp_ideal": end_ideal - start_ideal,
-                    "timestamp_wloss": end_wloss - start_wloss,
-                    "timestamp_wlossCap": end_wlossCap - start_wlossCap,
-                    "iteration_ideal": iteration_ideal,
-                    "iteration_wloss": iteration_wloss,
-                    "iteration_wlossCap": iteration_wlossCap,
-                }
-
-                # Genearación de informes
-                G_den2ne_alg.write_swConfig_report(
-                    f"results/{topo_name}/root_{curr_root}/reports/report_swConfig_d{delta}_c{criterion}.txt"
-                )
-
-                G_den2ne_alg.write_loads_report(
-                    f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_lossesCap_c{criterion}.txt"
-                )
-
-                # Generamos la configuración logica
-                G_den2ne_alg.write_swConfig_CSV(
-                    f"results/{topo_name}/root_{curr_root}/csv/swConfig_d{delta}_c{criterion}.csv"
-                )
-
-            # Exportar datos
-            with open(f"results/{topo_name}/root_{curr_root}/csv/outdata_d{delta}.csv", "w") as file:
-                file.write("criterion,power_ideal,abs_ideal,power_wloss,abs_wloss,power_wlossCap,abs_wlossCap,timestamp_ideal,timestamp_wloss,timestamp_wlossCap,iteration_ideal,iteration_wloss,iteration_wlossCap\n")
-                for criterion in out_data[delta]:
-                    file.write(
-                        f'{criterion},{out_data[delta][criterion]["total_balance_ideal"]},{out_data[delta][criterion]["abs_flux"]},'
-                        f'{out_data[delta][criterion]["total_balance_with_losses"]},{out_data[delta][criterion]["abs_flux_with_losses"]},'
-                        f'{out_data[delta][criterion]["total_balance_with_lossesCap"]},{out_data[delta][criterion]["abs_flux_with_lossesCap"]},'
-                        f'{out_data[delta][criterion]["timestamp_ideal"]},{out_data[delta][criterion]["timestamp_wloss"]},{out_data[delta][criterion]["timestamp_wlossCap"]},{out_data[delta][criterion]["iteration_ideal"]},{out_data[delta][criterion]["iteration_wloss"]},{out_data[delta][criterion]["iteration_wlossCap"]}\n'
-                    )
+    G_den2ne_alg.write_ids_report(f"results/{topo_name}/reports/report_ids.txt")
+
+
+# Estudio de un root del barrido fullrandom, sobre la vista del grafo etiquetada con sus HLMACs (ver Multiroot)
+def run_root_fullrandom(curr_root, G_den2ne_alg, topo_name, criteria, loads):
+
+    # Variables
+    dirs = ["reports", "csv", "fig"]
+
+    # Preparamos los directorios de resultados
+    for dir in dirs:
+        pathlib.Path("results/" + topo_name + "/" + "root_" + curr_root + "/" + dir).mkdir(
+            parents=True, exist_ok=True
+    )
+
+    # New out data
+    out_data = dict()
+
+    # Configuración inicial de los switches (la vista parte del estado inicial del grafo)
+    sw_states = G_den2ne_alg.G.getSwitchStates()
+
+    # Vamos a iterar por todos los intantes de cargas
+    for delta in range(0, len(loads["1"])):
+
+        out_data[delta] = dict()
+
+        # Vamos a iterar por criterio
+        for criterion in criteria:
+
+            # Init Loads
+            G_den2ne_alg.updateLoads(loads, delta)
+
+            # Cambios de estado de los switches en los tres escenarios de este criterio, partiendo siempre de la
+            # configuración inicial para que no dependan del criterio o el instante anterior (ver test_ieee123_parallel)
+            G_den2ne_alg.G.setSwitchStates(sw_states)
+            sw_toggles = G_den2ne_alg.switch_toggles
+
+            #  ----------------     Ideal balance      ----------------
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_ideal, abs_flux, iteration_ideal, timestamp_ideal] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_IDEAL)
+            print_debug(delta,criterion,"IDEAL",total_balance_ideal,abs_flux,G_den2ne_alg.are_enlclosedLoads(), iteration_ideal)
+
+            # Genearación de informes
+            G_den2ne_alg.write_loads_report(
+                f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_ideal_c{criterion}.txt"
+            )
+
+            # Re-Init loads
+            G_den2ne_alg.updateLoads(loads, delta)
+
+            #  ----------------     Withloss balance      ----------------
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_losses, abs_flux_with_losses, iteration_wloss, timestamp_wloss] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES)
+            print_debug(delta,criterion,"LOSS",total_balance_with_losses,abs_flux_with_losses,G_den2ne_alg.are_enlclosedLoads(), iteration_wloss)
+
+            # Genearación de informes
+            G_den2ne_alg.write_loads_report(
+                f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_losses_c{criterion}.txt"
+            )
+
+            # Re-Init loads
+            G_den2ne_alg.updateLoads(loads, delta)
+
+            #  ----------------     Withloss and Cap balance      ----------------
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_lossesCap, abs_flux_with_lossesCap, iteration_wlossCap, timestamp_wlossCap] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES_CAP)
+            print_debug(delta,criterion,"LOSS_CAP",total_balance_with_lossesCap,abs_flux_with_lossesCap,G_den2ne_alg.are_enlclosedLoads(), iteration_wlossCap)
+
+            # ------------------------ Save data --------------------------
+            out_data[delta][criterion] = {
+                "total_balance_ideal": total_balance_ideal,
+                "abs_flux": abs_flux,
+                "total_balance_with_losses": total_balance_with_losses,
+                "abs_flux_with_losses": abs_flux_with_losses,
+                "total_balance_with_lossesCap": total_balance_with_lossesCap,
+                "abs_flux_with_lossesCap": abs_flux_with_lossesCap,
+                "timestamp_ideal": timestamp_ideal,
+                "timestamp_wloss": timestamp_wloss,
+                "timestamp_wlossCap": timestamp_wlossCap,
+                "iteration_ideal": iteration_ideal,
+                "iteration_wloss": iteration_wloss,
+                "iteration_wlossCap": iteration_wlossCap,
+                "sw_toggles": G_den2ne_alg.switch_toggles - sw_toggles,
+            }
 
-        G_den2ne_alg.write_ids_report(f"results/{topo_name}/root_{curr_root}/reports/report_ids.txt")
+            # Genearación de informes
+            G_den2ne_alg.write_swConfig_report(
+                f"results/{topo_name}/root_{curr_root}/reports/report_swConfig_d{delta}_c{criterion}.txt"
+            )
+
+            G_den2ne_alg.write_loads_report(
+                f"results/{topo_name}/root_{curr_root}/reports/report_loads_d{delta}_lossesCap_c{criterion}.txt"
+            )
+
+            # Generamos la configuración logica
+            G_den2ne_alg.write_swConfig_CSV(
+                f"results/{topo_name}/root_{curr_root}/csv/swConfig_d{delta}_c{criterion}.csv"
+            )
+
+        # Exportar datos
+        write_outdata(f"results/{topo_name}/root_{curr_root}/csv/outdata_d{delta}.csv", out_data[delta])
+
+    G_den2ne_alg.write_ids_report(f"results/{topo_name}/root_{curr_root}/reports/report_ids.txt")
+
+    return curr_root
+
+
+# Vamos a programar unas pruebas globales sobre la topología IEEE 123, con cada nodo como root
+def test_ieee123_fullrandom(workers=None):
+
+    # Variables
+    topo_name = "ieee123_fullrandom"
+    criteria = [
+        Den2ne.CRITERION_NUM_HOPS,
+        Den2ne.CRITERION_DISTANCE,
+        Den2ne.CRITERION_LOW_LINKS_LOSSES,
+        Den2ne.CRITERION_POWER_TO_ZERO,
+        Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES,
+    ]
+    
+    # Recolectamos los datos
+    loads = DataGatherer.getLoads("data/loads/loads_v2.csv", 3)
+    edges = DataGatherer.getEdges("data/ieee123/links.csv")
+    edges_conf = DataGatherer.getEdges_Config("data/links/links_config_8.csv")
+    sw_edges = DataGatherer.getSwitches("data/ieee123/switches.csv")
+    positions = DataGatherer.getPositions("data/ieee123/node_positions.csv")
+
+    #nodes_to_test = ['150', '251', '610', '451', '47', '350', '1', '7', '2', '27']
+
+    # El grafo se construye una sola vez y se comparte entre todos los roots candidatos
+    G = Graph(0, loads, edges, sw_edges, edges_conf)
+    multiroot = Multiroot(G, [node['node'] for node in positions])
+
+    # Primera fase: difusión de IDs desde todos los roots
+    multiroot.spread(workers)
+
+    # Segunda fase: estudio de cada root, repartiendo los roots entre los procesos del pool
+    for curr_root, _ in multiroot.map(run_root_fullrandom, workers, args=(topo_name, criteria, loads)):
+        print(f"Root {curr_root} done")
 
 
 
@@ -526,6 +563,9 @@ def test_ieee34():
     # Primera fase: difusión de IDs
     G_den2ne_alg.spread_ids()
 
+    # Configuración inicial de los switches
+    sw_states = G.getSwitchStates()
+
     # Vamos a iterar por todos los instantes de cargas
     for delta in range(0, len(loads["826"])):
 
@@ -537,36 +577,14 @@ def test_ieee34():
             # Init Loads
             G_den2ne_alg.updateLoads(loads, delta)
 
+            # Cambios de estado de los switches en los tres escenarios de este criterio, partiendo siempre de la
+            # configuración inicial para que no dependan del criterio o el instante anterior (ver test_ieee123_parallel)
+            G_den2ne_alg.G.setSwitchStates(sw_states)
+            sw_toggles = G_den2ne_alg.switch_toggles
+
             #  ----------------     Ideal balance      ----------------
-            # Var init
-            total_balance_ideal = float()
-            abs_flux = float()
-            iteration_ideal = 0
-            start_ideal = time.time() * 1000
-
-            while True:
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion) 
-                 
-                [total_balance_ideal_ret, abs_flux_ret] = G_den2ne_alg.globalBalance(
-                    withLosses=False,
-                    withCap=False,
-                    withDebugPlot=False,
-                    positions=None,
-                    path="results/",
-                )
-
-                # Add curr iteration
-                iteration_ideal += 1
-                total_balance_ideal += total_balance_ideal_ret
-                abs_flux += abs_flux_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-
-            end_ideal = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_ideal, abs_flux, iteration_ideal, timestamp_ideal] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_IDEAL)
             print_debug(delta,criterion,"IDEAL",total_balance_ideal,abs_flux,G_den2ne_alg.are_enlclosedLoads(), iteration_ideal)
 
             # Genearación de informes
@@ -578,37 +596,8 @@ def test_ieee34():
             G_den2ne_alg.updateLoads(loads, delta)
 
             #  ----------------     Withloss balance      ----------------
-            # Var init
-            total_balance_with_losses = float()
-            abs_flux_with_losses = float()
-            iteration_wloss = 0
-            start_wloss = time.time() * 1000
-
-            while True:
-                
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion)
-
-                [total_balance_with_losses_ret, abs_flux_with_losses_ret] = (
-                    G_den2ne_alg.globalBalance(
-                        withLosses=True,
-                        withCap=False,
-                        withDebugPlot=False,
-                        positions=None,
-                        path="results/",
-                    )
-                )
-
-                # Add curr iteration
-                iteration_wloss += 1
-                total_balance_with_losses += total_balance_with_losses_ret
-                abs_flux_with_losses += abs_flux_with_losses_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-            end_wloss = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_losses, abs_flux_with_losses, iteration_wloss, timestamp_wloss] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES)
             print_debug(delta,criterion,"LOSS",total_balance_with_losses,abs_flux_with_losses,G_den2ne_alg.are_enlclosedLoads(), iteration_wloss)
 
             # Genearación de informes
@@ -620,37 +609,8 @@ def test_ieee34():
             G_den2ne_alg.updateLoads(loads, delta)
 
             #  ----------------     Withloss and Cap balance      ----------------
-            # Var init
-            total_balance_with_lossesCap = float()
-            abs_flux_with_lossesCap = float()
-            iteration_wlossCap = 0
-            start_wlossCap = time.time() * 1000
-
-            while True:
-                # Select IDs
-                G_den2ne_alg.clearSelectedIDs()
-                G_den2ne_alg.selectBestIDs(criterion)
-
-                [total_balance_with_lossesCap_ret, abs_flux_with_lossesCap_ret] = (
-                    G_den2ne_alg.globalBalance(
-                        withLosses=True,
-                        withCap=True,
-                        withDebugPlot=False,
-                        positions=None,
-                        path="results/",
-                    )
-                )
-
-                # Add curr iteration
-                iteration_wlossCap += 1
-                total_balance_with_lossesCap += total_balance_with_lossesCap_ret
-                abs_flux_with_lossesCap += abs_flux_with_lossesCap_ret
-
-                # Check if we have enclosed loads
-                if not G_den2ne_alg.are_enlclosedLoads():
-                    break
-
-            end_wlossCap = time.time() * 1000
+            # Selección de IDs y balance global hasta que no queden cargas encerradas
+            [total_balance_with_lossesCap, abs_flux_with_lossesCap, iteration_wlossCap, timestamp_wlossCap] = G_den2ne_alg.solve(criterion, Den2ne.SCENARIO_LOSSES_CAP)
             print_debug(delta,criterion,"LOSS_CAP",total_balance_with_lossesCap,abs_flux_with_lossesCap,G_den2ne_alg.are_enlclosedLoads(), iteration_wlossCap)
 
             # ------------------------ Save data --------------------------
@@ -661,12 +621,13 @@ def test_ieee34():
                 "abs_flux_with_losses": abs_flux_with_losses,
                 "total_balance_with_lossesCap": total_balance_with_lossesCap,
                 "abs_flux_with_lossesCap": abs_flux_with_lossesCap,
-                "timestamp_ideal": end_ideal - start_ideal,
-                "timestamp_wloss": end_wloss - start_wloss,
-                "timestamp_wlossCap": end_wlossCap - start_wlossCap,
+                "timestamp_ideal": timestamp_ideal,
+                "timestamp_wloss": timestamp_wloss,
+                "timestamp_wlossCap": timestamp_wlossCap,
                 "iteration_ideal": iteration_ideal,
                 "iteration_wloss": iteration_wloss,
                 "iteration_wlossCap": iteration_wlossCap,
+                "sw_toggles": G_den2ne_alg.switch_toggles - sw_toggles,
             }
 
             # Genearación de informes
@@ -684,18 +645,13 @@ def test_ieee34():
             )
 
         # Exportar datos
-        with open(f"results/{topo_name}/csv/outdata_d{delta}.csv", "w") as file:
-            file.write("criterion,power_ideal,abs_ideal,power_wloss,abs_wloss,power_wlossCap,abs_wlossCap,timestamp_ideal,timestamp_wloss,timestamp_wlossCap,iteration_ideal,iteration_wloss,iteration_wlossCap\n")
-            for criterion in out_data[delta]:
-                file.write(
-                    f'{criterion},{out_data[delta][criterion]["total_balance_ideal"]},{out_data[delta][criterion]["abs_flux"]},'
-                    f'{out_data[delta][criterion]["total_balance_with_losses"]},{out_data[delta][criterion]["abs_flux_with_losses"]},'
-                    f'{out_data[delta][criterion]["total_balance_with_lossesCap"]},{out_data[delta][criterion]["abs_flux_with_lossesCap"]},'
-                    f'{out_data[delta][criterion]["timestamp_ideal"]},{out_data[delta][criterion]["timestamp_wloss"]},{out_data[delta][criterion]["timestamp_wlossCap"]},{out_data[delta][criterion]["iteration_ideal"]},{out_data[delta][criterion]["iteration_wloss"]},{out_data[delta][criterion]["iteration_wlossCap"]}\n'
-                )
+        write_outdata(f"results/{topo_name}/csv/outdata_d{delta}.csv", out_data[delta])
 
     G_den2ne_alg.write_ids_report(f"results/{topo_name}/reports/report_ids.txt")
 
 
 if __name__ == "__main__":
+    # Caché binaria de los CSV de entrada, para no volver a procesarlos en cada ejecución
+    DataGatherer.setCacheDir(".den2ne_cache")
+
     test_ieee34()
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+# Copia de Den2ne.flowInertia/IDsCheck tal y como estaban antes de consistentIDs, como funciones sobre un Den2ne,
+# para comparar con ellas en test_consistency.py
+
+from den2ne.den2neALG import Den2ne
+
+
+def flowInertia(alg, ids_to_fix=None, n_repetition=None):
+    """
+    Función para preservar la coherencia en el grafo de los distintos flujos
+    """
+    if (
+        ids_to_fix != None
+    ):  # Si no es la primera llamada de flowInertia, entonces cogemos las ids que no se han cambiado para tratar con ellas
+        ids_list = ids_to_fix
+    else:  # Si es la primera vez que se llama a flowInertia, se ejecuta seleccionando las IDs más grandes
+        # Vamos a ordenar la lista de globals ids
+        alg.global_ids.sort(key=Den2ne.key_sort_by_HLMAC_len, reverse=True)
+        ids_list = [
+            j
+            for j in alg.global_ids
+            if len(alg.global_ids[0].hlmac) == len(j.hlmac)
+        ]
+    for ids_max_len in ids_list:
+        for i in range(len(ids_max_len.hlmac) - 2, 0, -1):
+
+            # Vamos a ver la ID más larga en el camino hacia el root
+            nextNode = alg.G.nodes[ids_max_len.hlmac[i]]
+
+            # Miramos el index que debería haber
+            nextID = nextNode.ids[nextNode.getIndexID(ids_max_len.hlmac[0 : i + 1])]
+
+            if nextID not in alg.global_ids:
+                # Sacamos la ID antigua de la lista
+                alg.global_ids.remove(nextNode.getActiveID())
+
+                # Establecemos como activa la nueva ID
+                nextNode.setActiveID(nextNode.ids.index(nextID))
+
+                # Actualizamos la lista
+                alg.global_ids.append(nextID)
+
+                # Por último, notificamos a nuestros vecinos de la ramas anexas a la rama
+                # principal, para que sean conscientes de la incercia que está ocurriendo
+                # en aras de que entregen su potencia, antes que se recorra el camino principal
+                for neighbor in nextNode.neighbors:
+
+                    # Para que sea un vecino valido no tiene que ser ni el nextHop ni el anterior
+                    if (
+                        neighbor not in ids_max_len.hlmac
+                    ):  # Pongo esto porque si está en la id principal ya lo vamos a revisar más tarde y es tiempo de computo perdido creo yo
+
+                        # En este punto desconocemos la longitud de la rama.. por ello vamos a recorrerla con un while
+                        branch_nodes_to_attend = [neighbor]
+                        branch_nodes_to_attended = [nextNode.name]
+
+                        while len(branch_nodes_to_attend) > 0:
+
+                            # Hay que visitar todos los vecinos de la rama que no hayan sido visitados
+                            curr_node = alg.G.nodes[branch_nodes_to_attend[0]]
+                            # Bucle de exploración, comprobamos que no hayan sido visitados
+                            # Atendemos al nodo en cuestión, si su HLMAC es más corta que el nodo de la rama
+                            # principal, hay un problema.. hay que cambiar la HLMAC activa por la HLMAC que siga la incercia del
+                            # camino principal
+                            # Creo que esto deberíamos hacerlo solo si su anterior paso es el nodo que hemos cambiado
+                            # es decir, si en este caso hemos cambiado el 0, solo cambiar los que en su ids tengan un 0
+                            if nextID.getOrigin() in curr_node.getActiveID().hlmac:
+                                # Entonces este nodo está utilizando el nodo cuya ids hemos cambiado
+                                # Tenemos que revisar que esta ID esté bien
+                                if len(curr_node.getActiveID().hlmac) <= len(
+                                    nextID.hlmac
+                                ) or nextID.hlmac.index(
+                                    nextNode.name
+                                ) != curr_node.getActiveID().hlmac.index(
+                                    nextNode.name
+                                ):
+                                    possible_id = list()
+                                    # Con la conectividad alta pueden darse casos que incluyan todos los nodos necesarios, más unos extras que no se corresponden con la id que queremos
+                                    # Entonces lo que hacemos es guardar todas las ids que cumplen la condición de los saltos, y cogemos la más pequeña, que es la que tiene los saltos necesarios, sin extras
+                                    for id in curr_node.ids:
+                                        if all(
+                                            hop in id.hlmac for hop in nextID.hlmac
+                                        ):
+                                            possible_id.append(id)
+                                    if possible_id:
+                                        possible_id.sort(
+                                            key=Den2ne.key_sort_by_HLMAC_len
+                                        )  # Cogemos la más pequeña
+                                        # Sacamos la ID antigua de la lista
+                                        alg.global_ids.remove(
+                                            curr_node.getActiveID()
+                                        )
+
+                                        # Marcamos como activa la nueva ID
+                                        curr_node.setActiveID(
+                                            curr_node.ids.index(possible_id[0])
+                                        )
+
+                                        # Añadidmos la nueva ID a la lista
+                                        alg.global_ids.append(possible_id[0])
+                                        # Si cambiamos la id, añadimos los vecinos a revisar
+                                        for neig in curr_node.neighbors:
+                                            if neig not in branch_nodes_to_attended:
+                                                branch_nodes_to_attend.append(neig)
+
+                                # Desalojamos al nodo atendido, y lo marcamos como atendido
+                                branch_nodes_to_attended.append(curr_node.name)
+                                branch_nodes_to_attend.pop(0)
+                            else:
+                                # Desalojamos al nodo atendido, y lo marcamos como atendido
+                                branch_nodes_to_attended.append(curr_node.name)
+                                branch_nodes_to_attend.pop(0)
+    # Una vez realizado flow inertia revisamos que los ids sean correctos
+    # Para evitar bucles infinitos pasamos el parámetro repeticion
+    if n_repetition == None or n_repetition <= 10:
+        IDsCheck(alg, n_repetition)
+
+
+def IDsCheck(alg, n_repetition=0):
+    """
+    Función que revisa que todas las IDs seleccionadas son coherentes
+    y por tanto no se quedará carga en nodos distintos al root
+    """
+    ids_to_fix = list()
+    if n_repetition == None:
+        n_repetition = 0
+    else:
+        n_repetition = n_repetition + 1
+    for i in alg.global_ids:
+        nextHop = i.getNextHop()
+        if nextHop != None and alg.G.nodes[nextHop].getActiveID().hlmac.index(
+            nextHop
+        ) > i.hlmac.index(nextHop):
+            ids_to_fix.append(i)
+    if len(ids_to_fix) != 0:
+        flowInertia(alg, ids_to_fix, n_repetition)
@@ -0,0 +1,133 @@
+import unittest
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+from den2ne.den2neBalance import BalanceTree, SparseBalance
+from dataCollector.dataCollector import DataGatherer
+
+
+class TestBalanceArray(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loads = DataGatherer.getLoads("src/data/loads/loads_v2.csv", 3)
+        cls.edges = DataGatherer.getEdges("src/data/ieee123/links.csv")
+        cls.edges_conf = DataGatherer.getEdges_Config("src/data/links/links_config_8.csv")
+        cls.sw_edges = DataGatherer.getSwitches("src/data/ieee123/switches.csv")
+
+        cls.G = Graph(0, cls.loads, cls.edges, cls.sw_edges, cls.edges_conf, root="150")
+        cls.G.pruneGraph()
+        cls.G_den2ne_alg = Den2ne(cls.G)
+        cls.G_den2ne_alg.spread_ids()
+
+    def balance(self, criterion, delta, withLosses, withCap, vectorized):
+        self.G_den2ne_alg.updateLoads(self.loads, delta)
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(criterion)
+
+        if vectorized:
+            ret = self.G_den2ne_alg.globalBalanceArray(withLosses, withCap)
+        else:
+            ret = self.G_den2ne_alg.globalBalance(withLosses, withCap, False, None, None)
+
+        return ret, [node.load for node in self.G.nodes.values()]
+
+    def test_a_same_as_global_balance(self):
+        for criterion in [Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES]:
+            for withLosses, withCap in [(False, False), (True, False), (True, True)]:
+                self.assertEqual(
+                    self.balance(criterion, 40, withLosses, withCap, False),
+                    self.balance(criterion, 40, withLosses, withCap, True)
+                )
+
+    def test_b_all_deltas_at_once(self):
+        deltas = range(0, len(self.loads["1"]), 12)
+
+        for withLosses, withCap in [(False, False), (True, False), (True, True)]:
+            [balance, abs_flux, iterations] = self.G_den2ne_alg.globalBalanceDeltas(
+                self.loads, Den2ne.CRITERION_NUM_HOPS, withLosses, withCap
+            )
+            self.assertEqual(len(balance), len(self.loads["1"]))
+
+            for delta in deltas:
+                ([ret_balance, ret_flux], _) = self.balance(Den2ne.CRITERION_NUM_HOPS, delta, withLosses, withCap, False)
+                self.assertEqual(balance[delta], ret_balance)
+                self.assertEqual(abs_flux[delta], ret_flux)
+                self.assertEqual(iterations[delta], 1)
+
+    def test_c_all_deltas_rejects_load_criteria(self):
+        with self.assertRaises(ValueError):
+            self.G_den2ne_alg.globalBalanceDeltas(self.loads, Den2ne.CRITERION_POWER_TO_ZERO, False, False)
+
+    def test_d_incremental_balance(self):
+        for withLosses, withCap in [(False, False), (True, False), (True, True)]:
+            self.G_den2ne_alg.updateLoads(self.loads, 0)
+            self.G_den2ne_alg.clearSelectedIDs()
+            self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_NUM_HOPS)
+            self.G_den2ne_alg.incrementalBalance(dict(), withLosses, withCap)
+            state = self.G_den2ne_alg.incremental
+            self.assertTrue(state.consistent)
+
+            for delta in range(1, len(self.loads["1"]), 12):
+                changes = {node: self.loads[node][delta] for node in self.loads if self.G.nodes[node].load != self.loads[node][delta]}
+                [balance, abs_flux] = self.G_den2ne_alg.incrementalBalance(changes, withLosses, withCap)
+                directions = [link.direction for link in self.G.links]
+
+                ([ret_balance, ret_flux], _) = self.balance(Den2ne.CRITERION_NUM_HOPS, delta, withLosses, withCap, True)
+                self.assertAlmostEqual(balance, ret_balance, places=6)
+                self.assertAlmostEqual(abs_flux, ret_flux, places=6)
+                self.assertEqual(directions, [link.direction for link in self.G.links])
+
+                # La nueva selección lleva al mismo árbol, así que el estado incremental se conserva
+                self.G_den2ne_alg.updateLoads(self.loads, delta)
+                self.G_den2ne_alg.incremental = state
+                self.G_den2ne_alg.incrementalBalance(dict(), withLosses, withCap)
+                self.assertIs(self.G_den2ne_alg.incremental, state)
+
+    def test_e_sparse_balance(self):
+        for criterion in [Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_DISTANCE]:
+            [balance, abs_flux, flows] = self.G_den2ne_alg.globalBalanceSparse(self.loads, criterion)
+            self.assertEqual(flows.shape, (len(self.G.names), len(self.loads["1"])))
+
+            # Se usa la selección del propio criterio, sin tocarla
+            selected = [node.active_index for node in self.G.nodes.values()]
+
+            # Misma selección con globalBalanceArray (salvo el orden de las sumas)
+            for delta in range(0, len(self.loads["1"]), 12):
+                ([ret_balance, ret_flux], loads) = self.balance(criterion, delta, False, False, True)
+                self.assertEqual([node.active_index for node in self.G.nodes.values()], selected)
+
+                self.assertFalse(self.G_den2ne_alg.are_enlclosedLoads())
+                self.assertAlmostEqual(balance[delta], ret_balance, places=6)
+                self.assertAlmostEqual(abs_flux[delta], ret_flux, places=6)
+
+                # Sentido del flujo de cada enlace del árbol
+                for name, flow in zip(self.G.names, flows[:, delta].tolist()):
+                    next_hop = self.G.nodes[name].getActiveID().getNextHop()
+                    if next_hop is not None:
+                        self.assertEqual(self.G.getLink(name, next_hop).direction, "up" if flow >= 0 else "down")
+
+        with self.assertRaises(ValueError):
+            self.G_den2ne_alg.globalBalanceSparse(self.loads, Den2ne.CRITERION_POWER_TO_ZERO)
+
+    def test_f_sparse_balance_tree(self):
+        # Root 0 con la cadena 0 <- 1 <- 2 y la hoja 0 <- 3 (parent vector, en cualquier orden)
+        tree = BalanceTree([2, 0, 1, 3], [1, -1, 0, 0], [3, 1, 2, 2], [0, -1, 1, 2], [0, -1, 1, 2], 0)
+        [balance, abs_flux, flows] = SparseBalance(tree, 4).balance([1.0, 2.0, -4.0, 0.5])
+        self.assertEqual(flows.tolist(), [0.0, -2.0, -4.0, 0.5])
+        self.assertEqual(balance, -0.5)
+        self.assertEqual(abs_flux, 6.5)
+
+        # Los siguientes saltos de 1 y 2 forman un ciclo que no llega al root
+        tree = BalanceTree([0, 1, 2], [-1, 2, 1], [1, 2, 2], [-1, 0, 1], [-1, 0, 1], 0)
+        with self.assertRaises(ValueError):
+            SparseBalance(tree, 3)
+
+        # Cadena 0 <- 1 <- 2 en la que 1 se procesaría antes que su hijo 2: no es consistente
+        tree = BalanceTree([0, 1, 2], [-1, 0, 1], [1, 3, 2], [-1, 0, 1], [-1, 0, 1], 0)
+        self.assertFalse(tree.isConsistent(3))
+        with self.assertRaises(ValueError):
+            SparseBalance(tree, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import random
+import unittest
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+from dataCollector.dataCollector import DataGatherer
+from legacy_flow_inertia import flowInertia
+
+
+class TestConsistency(unittest.TestCase):
+
+    TOPOLOGIES = {
+        "ieee123": ("src/data/loads/loads_v2.csv", "src/data/ieee123/links.csv", "src/data/ieee123/switches.csv", "150", True),
+        "ieee34": ("src/data/loads/loads_34nodes.csv", "src/data/ieee34/links_original_2.csv", "src/data/ieee34/switches.csv", "800", False),
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        edges_conf = DataGatherer.getEdges_Config("src/data/links/links_config_8.csv")
+
+        cls.edges_conf = edges_conf
+        cls.algs = dict()
+        cls.consistent_algs = dict()
+        for topo, (loads_path, edges_path, switches_path, root, prune) in cls.TOPOLOGIES.items():
+            loads = DataGatherer.getLoads(loads_path, 3)
+            for algs, consistent in ((cls.algs, False), (cls.consistent_algs, True)):
+                G = Graph(0, loads, DataGatherer.getEdges(edges_path), DataGatherer.getSwitches(switches_path), edges_conf, root=root)
+                if prune:
+                    G.pruneGraph()
+                G_den2ne_alg = Den2ne(G, consistent=consistent)
+                G_den2ne_alg.spread_ids()
+                algs[topo] = (G_den2ne_alg, loads)
+
+    def select(self, alg, loads, delta, criterion):
+        alg.updateLoads(loads, delta)
+        alg.clearSelectedIDs()
+        alg.selectBestIDs(criterion)
+        return [node.active_index for node in alg.G.nodes.values()]
+
+    def assertConsistent(self, alg):
+        for node in alg.G.nodes.values():
+            id = node.getActiveID()
+            if id.parent is not None:
+                self.assertTrue(alg.G.nodes[id.getNextHop()].isActiveID(id.parent))
+
+    def coherentPath(self, alg, selected, id):
+        while id.parent is not None:
+            parent = alg.G.nodes[id.getNextHop()]
+            if parent.ids[selected[alg.G.index[parent.name]]] is not id.parent:
+                return False
+            id = id.parent
+        return True
+
+    def test_a_consistent_repair(self):
+        for topo, (alg, loads) in self.algs.items():
+            for delta in range(0, len(next(iter(loads.values()))), 12):
+                for criterion in range(6):
+                    selected = self.select(alg, loads, delta, criterion)
+                    total = sum(node.load for node in alg.G.nodes.values())
+
+                    changed = alg.consistentIDs()
+                    self.assertConsistent(alg)
+                    fixed = [node.active_index for node in alg.G.nodes.values()]
+                    self.assertEqual(changed, sum(a != b for a, b in zip(selected, fixed)))
+
+                    # Desempate: los nodos cuyo camino seleccionado ya era coherente hasta el root conservan su ID (en
+                    # estas topologías no quedan huérfanos, así que no se fuerza ningún camino)
+                    for node, index in zip(alg.G.nodes.values(), selected):
+                        if self.coherentPath(alg, selected, node.ids[index]):
+                            self.assertEqual(node.active_index, index)
+
+                    # No queda ninguna carga encerrada tras una pasada y, sin pérdidas, llega al root toda la carga
+                    [balance, _] = alg.globalBalance(False, False, False, None, None)
+                    self.assertFalse(alg.are_enlclosedLoads())
+                    self.assertAlmostEqual(balance, total, places=6)
+
+    def test_b_keeps_consistent_selection(self):
+        (alg, loads) = self.algs["ieee123"]
+        for criterion in (Den2ne.CRITERION_POWER_TO_ZERO, Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES):
+            self.select(alg, loads, 40, criterion)
+            alg.consistentIDs()
+            fixed = [node.active_index for node in alg.G.nodes.values()]
+
+            # Una segunda pasada no cambia nada
+            self.assertEqual(alg.consistentIDs(), 0)
+            self.assertEqual([node.active_index for node in alg.G.nodes.values()], fixed)
+
+    def test_c_consistent_selection(self):
+        for topo, (alg, loads) in self.algs.items():
+            (consistent_alg, _) = self.consistent_algs[topo]
+            for criterion in range(6):
+                self.select(alg, loads, 40, criterion)
+                alg.consistentIDs()
+                expected = [node.active_index for node in alg.G.nodes.values()]
+
+                # Con consistent, selectBestIDs y solve ya dejan la selección coherente
+                self.assertEqual(self.select(consistent_alg, loads, 40, criterion), expected)
+                self.assertConsistent(consistent_alg)
+
+                consistent_alg.updateLoads(loads, 40)
+                [_, _, iterations, _] = consistent_alg.solve(criterion, Den2ne.SCENARIO_IDEAL)
+                self.assertEqual(iterations, 1)
+                self.assertFalse(consistent_alg.are_enlclosedLoads())
+
+    def test_d_same_as_flow_inertia(self):
+        for topo, (alg, loads) in self.algs.items():
+            (consistent_alg, _) = self.consistent_algs[topo]
+            for delta in range(0, len(next(iter(loads.values()))), 12):
+                for criterion in range(6):
+                    for (withLosses, withCap) in Den2ne.SCENARIOS.values():
+                        # Comportamiento anterior: selección del criterio + flowInertia/IDsCheck
+                        self.select(alg, loads, delta, criterion)
+                        flowInertia(alg)
+                        inertia = [node.active_index for node in alg.G.nodes.values()]
+                        [balance_inertia, _] = alg.globalBalance(withLosses, withCap, False, None, None)
+
+                        # consistent=True
+                        fixed = self.select(consistent_alg, loads, delta, criterion)
+                        [balance, _] = consistent_alg.globalBalance(withLosses, withCap, False, None, None)
+
+                        # Mismas cargas encerradas tras una pasada (ninguna) y, sin pérdidas o con el mismo árbol, mismo
+                        # balance
+                        self.assertEqual(consistent_alg.getEnclosedNodes(), alg.getEnclosedNodes())
+                        self.assertFalse(consistent_alg.are_enlclosedLoads())
+                        if not withLosses or fixed == inertia:
+                            self.assertAlmostEqual(balance, balance_inertia, places=6)
+
+    def test_e_random_mesh(self):
+        # Malla aleatoria como las de ccomplex/gen_topos.py: árbol de expansión más 1.5 enlaces extra por nodo
+        random.seed(1)
+        lengths = [100, 125, 150, 175, 200, 225, 250, 275, 300, 325, 350, 375, 400, 425, 450, 475, 500, 525, 550, 575,
+                   650, 700, 750, 800, 825, 1000]
+        nodes = [str(n) for n in range(1, 201)]
+        random.shuffle(nodes)
+        edges = list()
+        seen = set()
+        for a, b in zip(nodes, nodes[1:]):
+            seen.add(frozenset((a, b)))
+            edges.append({"node_a": a, "node_b": b, "dist": random.choice(lengths), "conf": random.randint(1, 12)})
+        while len(edges) < len(nodes) - 1 + int(len(nodes) * 1.5):
+            a, b = random.sample(nodes, 2)
+            if frozenset((a, b)) not in seen:
+                seen.add(frozenset((a, b)))
+                edges.append({"node_a": a, "node_b": b, "dist": random.choice(lengths), "conf": random.randint(1, 12)})
+
+        loads = {node: [random.uniform(-4, 4)] for node in nodes}
+        G = Graph(0, loads, edges, [], self.edges_conf, root="34")
+        G_den2ne_alg = Den2ne(G)
+        G_den2ne_alg.spread_ids()
+
+        # La selección sin reparar queda en la caché, pero no se restaura al pasar a consistent
+        self.select(G_den2ne_alg, loads, 0, Den2ne.CRITERION_DISTANCE)
+        self.assertGreater(G_den2ne_alg.consistentIDs(), 0)
+        self.select(G_den2ne_alg, loads, 0, Den2ne.CRITERION_DISTANCE)
+        G_den2ne_alg.consistent = True
+
+        # Con distancia, el nodo 160 conserva su ID y deja sin ninguna ID coherente a su hijo 16: hay que forzar el
+        # camino de la primera ID de 16
+        for criterion in range(6):
+            self.select(G_den2ne_alg, loads, 0, criterion)
+            self.assertConsistent(G_den2ne_alg)
+            self.assertEqual(G_den2ne_alg.consistentIDs(), 0)
+
+            G_den2ne_alg.globalBalance(False, False, False, None, None)
+            self.assertFalse(G_den2ne_alg.are_enlclosedLoads())
+
+if __name__ == "__main__":
+    unittest.main()
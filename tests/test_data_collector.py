@@ -0,0 +1,63 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from dataCollector.dataCollector import DataGatherer
+
+
+class TestDataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        DataGatherer.setCacheDir(self.tmp.name)
+
+    def tearDown(self):
+        DataGatherer.setCacheDir(None)
+        self.tmp.cleanup()
+
+    def test_a_same_data_from_cache(self):
+        readers = [
+            (DataGatherer.getLoads, ("src/data/loads/loads_v2.csv", 3)),
+            (DataGatherer.getEdges, ("src/data/ieee123/links.csv",)),
+            (DataGatherer.getSwitches, ("src/data/ieee123/switches.csv",)),
+            (DataGatherer.getPositions, ("src/data/ieee123/node_positions.csv",)),
+            (DataGatherer.getEdges_Config, ("src/data/links/links_config_8.csv",)),
+        ]
+
+        for reader, args in readers:
+            parsed = reader(*args)
+            cached = reader(*args)
+            self.assertEqual(parsed, cached)
+            self.assertEqual([type(value) for value in parsed], [type(value) for value in cached])
+
+        self.assertEqual(len(os.listdir(self.tmp.name)), len(readers))
+
+    def test_b_key_includes_params(self):
+        self.assertNotEqual(DataGatherer.getLoads("src/data/loads/loads_v2.csv", 1), DataGatherer.getLoads("src/data/loads/loads_v2.csv", 3))
+        self.assertNotEqual(
+            DataGatherer.getCachePath("src/data/loads/loads_v2.csv", "loads", (1,)),
+            DataGatherer.getCachePath("src/data/loads/loads_v2.csv", "loads", (3,))
+        )
+
+    def test_c_missing_file(self):
+        # El error se informa una sola vez (el del lector), no también desde la caché
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(DataGatherer.getEdges(os.path.join(self.tmp.name, "missing.csv")), [])
+        self.assertEqual(len(output.getvalue().splitlines()), 1)
+
+    def test_d_edges_header(self):
+        # links.csv de ccomplex/gen_topos.py: una sola línea de cabecera
+        filename = os.path.join(self.tmp.name, "links.csv")
+        with open(filename, "w") as file:
+            file.write("Node A,Node B,Length (ft.),Config.\n1,2,100,3\n2,3,200,4\n")
+
+        expected = [{"node_a": "1", "node_b": "2", "dist": 100, "conf": 3}, {"node_a": "2", "node_b": "3", "dist": 200, "conf": 4}]
+        self.assertEqual(DataGatherer.getEdges(filename, header=1), expected)
+        self.assertEqual(DataGatherer.getEdges(filename, header=1), expected)
+        self.assertEqual(DataGatherer.getEdges(filename), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from graph.graph import Graph
+from graph.link import Link
+from graph.node import Node
+from den2ne.den2neHLMAC import HLMAC
+from dataCollector.dataCollector import DataGatherer
+
+
+class TestGraphIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loads = DataGatherer.getLoads("src/data/loads/loads_v2.csv", 3)
+        cls.edges = DataGatherer.getEdges("src/data/ieee123/links.csv")
+        cls.edges_conf = DataGatherer.getEdges_Config("src/data/links/links_config.csv")
+        cls.sw_edges = DataGatherer.getSwitches("src/data/ieee123/switches.csv")
+
+        cls.G = Graph(0, cls.loads, cls.edges, cls.sw_edges, cls.edges_conf, root="150")
+        cls.G.pruneGraph()
+
+    def test_a_index_is_dense(self):
+        self.assertEqual(len(self.G.names), len(self.G.nodes))
+        self.assertEqual(sorted(self.G.index.values()), list(range(len(self.G.nodes))))
+
+    def test_b_csr_matches_neighbors(self):
+        for name in self.G.nodes:
+            i = self.G.index[name]
+            start, end = self.G.adj_offsets[i], self.G.adj_offsets[i + 1]
+            self.assertEqual(
+                [self.G.names[j] for j in self.G.adj_targets[start:end]],
+                self.G.nodes[name].neighbors
+            )
+            for neighbor, link in zip(self.G.nodes[name].neighbors, self.G.nodes[name].links):
+                self.assertIs(self.G.getLink(name, neighbor), link)
+
+    def test_c_switch_index(self):
+        for name in self.G.nodes:
+            expected = None
+            for key in self.G.sw_config:
+                if name in (self.G.sw_config[key]["node_a"], self.G.sw_config[key]["node_b"]):
+                    expected = key
+                    break
+            self.assertEqual(self.G.findSwitchID(name), expected)
+
+        for key in self.G.sw_config:
+            self.assertEqual(self.G.findSwitchID_by_pair(self.G.sw_config[key]["node_b"], self.G.sw_config[key]["node_a"]), key)
+        self.assertIsNone(self.G.findSwitchID_by_pair("1", "2"))
+
+    def test_d_loss_table(self):
+        P = np.linspace(-50, 50, len(self.G.links))
+        slots = np.arange(len(self.G.links))
+        losses = self.G.getLosses(P, slots)
+
+        for slot, link in enumerate(self.G.links):
+            if link.type == Link.SWITCH:
+                expected = Link.getLosses_Switch(P[slot])
+            else:
+                expected = link.getLosses_Link(P[slot])
+            self.assertEqual(losses[slot], expected)
+            self.assertEqual(link.getLosses(P[slot]), expected)
+
+    def test_e_index_id_first_duplicate(self):
+        node = Node("x", Node.NORMAL)
+        for hops in (["150", "x"], ["150", "y", "x"], ["150", "x"], ["150", "z", "x"]):
+            id = HLMAC(None, "150", None)
+            id.hlmac = hops
+            node.addID(id)
+
+        # Con HLMACs repetidas gana la primera posición, también tras consultas intercaladas
+        self.assertEqual(node.getIndexID(["150", "y", "x"]), 1)
+        self.assertEqual(node.getIndexID(["150", "x"]), 0)
+        self.assertEqual(node.getIndexID(["150", "z", "x"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
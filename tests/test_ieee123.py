@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from graph.graph import Graph
 from den2ne.den2neALG import Den2ne
@@ -42,5 +44,261 @@ class TestIEEE123(unittest.TestCase):
         self.assertIsInstance(balance, (int, float))
         self.assertIsInstance(flux, (int, float))
 
+    def test_e_ids_index(self):
+        for node in self.G_den2ne_alg.G.nodes.values():
+            for index, id in enumerate(node.ids):
+                self.assertTrue(id.used)
+                self.assertEqual(node.getIndexID(id.hlmac), index)
+
+    def test_f_compact_ids(self):
+        G = Graph(0, self.loads, self.edges, self.sw_edges, self.edges_conf, root="150")
+        G.pruneGraph()
+        Den2ne(G, compact=True).spread_ids()
+        for name, node in G.nodes.items():
+            ids = self.G_den2ne_alg.G.nodes[name].ids
+            self.assertEqual([id.hlmac for id in node.ids], [id.hlmac for id in ids])
+            self.assertEqual([id.depends_on for id in node.ids], [id.depends_on for id in ids])
+            self.assertEqual([id.depth for id in node.ids], [len(id.hlmac) for id in ids])
+
+    def test_g_active_ids(self):
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_NUM_HOPS)
+        for node in self.G_den2ne_alg.G.nodes.values():
+            self.assertIn(node.getActiveID(), node.ids)
+            self.assertTrue(node.isActiveID(node.getActiveID()))
+        self.G_den2ne_alg.clearSelectedIDs()
+        for node in self.G_den2ne_alg.G.nodes.values():
+            self.assertIsNone(node.getActiveID())
+
+    def test_h_snapshot_restore(self):
+        self.G_den2ne_alg.updateLoads(self.loads, 1)
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_POWER_TO_ZERO)
+        snapshot = self.G_den2ne_alg.snapshot()
+        active = [node.getActiveID() for node in self.G.nodes.values()]
+
+        ret = self.G_den2ne_alg.globalBalance(True, True, False, None, None)
+        self.G_den2ne_alg.restore(snapshot)
+        self.assertEqual([node.getActiveID() for node in self.G.nodes.values()], active)
+        self.assertEqual(self.G_den2ne_alg.globalBalance(True, True, False, None, None), ret)
+
+    def test_i_path_metrics(self):
+        self.G_den2ne_alg.updateLoads(self.loads, 1)
+        closed_form = Den2ne(self.G, closedFormLosses=True)
+        for node in self.G.nodes.values():
+            for id in node.ids:
+                hops = id.hlmac
+                self.assertEqual(id.dist, sum(self.G.getLink(hops[i], hops[i + 1]).dist for i in range(len(hops) - 1)))
+                self.assertAlmostEqual(id.r_eff, sum(self.G.getLink(hops[i], hops[i + 1]).getResistance() for i in range(len(hops) - 1)))
+
+                # Con un único salto la aproximación en forma cerrada es exacta
+                if id.depth <= 2:
+                    self.assertAlmostEqual(closed_form.getTotalLinks_Losses(id), self.G_den2ne_alg.getTotalLinks_Losses(id))
+
+    def test_j_save_load_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ieee123.json")
+            self.G.save_json(path)
+            G = Graph(0, dict(), list(), list(), dict(), json_path=path)
+
+        self.assertEqual(G.root, self.G.root)
+        self.assertEqual(G.names, self.G.names)
+        self.assertEqual(G.sw_config, self.G.sw_config)
+        for name, node in G.nodes.items():
+            original = self.G.nodes[name]
+            self.assertEqual(node.neighbors, original.neighbors)
+            self.assertEqual([(link.type, link.state, link.capacity, link.loss_coef) for link in node.links],
+                             [(link.type, link.state, link.capacity, link.loss_coef) for link in original.links])
+            self.assertEqual([(id.hlmac, id.depends_on, id.dist, id.used) for id in node.ids],
+                             [(id.hlmac, id.depends_on, id.dist, id.used) for id in original.ids])
+
+        # El grafo cargado se puede usar directamente, sin volver a difundir las IDs
+        G_den2ne_alg = Den2ne(G)
+        G_den2ne_alg.updateLoads(self.loads, 1)
+        G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+        self.assertEqual(len(G_den2ne_alg.global_ids), len(G.nodes))
+
+    def test_k_spread_ids_best(self):
+        G = Graph(0, self.loads, self.edges, self.sw_edges, self.edges_conf, root="150")
+        G.pruneGraph()
+        G_den2ne_alg = Den2ne(G)
+        G_den2ne_alg.spread_ids_best(Den2ne.METRIC_DISTANCE, k=4)
+
+        for name, node in G.nodes.items():
+            dists = [id.dist for id in node.ids]
+            self.assertTrue(0 < len(node.ids) <= 4)
+            self.assertEqual(dists, sorted(dists))
+            for id in node.ids:
+                self.assertEqual(id.getOrigin(), name)
+                self.assertEqual(len(set(id.hlmac)), len(id.hlmac))
+
+            # La mejor ID por distancia nunca es peor que la mejor de la difusión por orden de llegada
+            self.assertLessEqual(dists[0], min(id.dist for id in self.G.nodes[name].ids))
+
+        G_den2ne_alg.updateLoads(self.loads, 1)
+        G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+        self.assertTrue(all(node.getActiveID() is node.ids[0] for node in G.nodes.values()))
+
+    def test_l_solve(self):
+        for delta in (0, 40, 80):
+            for criterion in (Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_LOW_LINKS_LOSSES, Den2ne.CRITERION_POWER_TO_ZERO):
+                for scenario, (withLosses, withCap) in Den2ne.SCENARIOS.items():
+                    # Bucle de los drivers de main.py
+                    self.G_den2ne_alg.updateLoads(self.loads, delta)
+                    total_balance = 0.0
+                    abs_flux = 0.0
+                    iteration = 0
+                    while True:
+                        self.G_den2ne_alg.clearSelectedIDs()
+                        self.G_den2ne_alg.selectBestIDs(criterion)
+                        [balance, flux] = self.G_den2ne_alg.globalBalance(withLosses, withCap, False, None, None)
+                        total_balance += balance
+                        abs_flux += flux
+                        iteration += 1
+                        if not self.G_den2ne_alg.are_enlclosedLoads():
+                            break
+                    active = [node.active_index for node in self.G.nodes.values()]
+
+                    self.G_den2ne_alg.updateLoads(self.loads, delta)
+                    result = self.G_den2ne_alg.solve(criterion, scenario)
+
+                    self.assertEqual(result[:3], [total_balance, abs_flux, iteration])
+                    self.assertEqual([node.active_index for node in self.G.nodes.values()], active)
+                    self.assertFalse(self.G_den2ne_alg.are_enlclosedLoads())
+
+    def test_m_enclosed_nodes(self):
+        for criterion in (Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_POWER_TO_ZERO):
+            self.G_den2ne_alg.updateLoads(self.loads, 40)
+            while True:
+                self.G_den2ne_alg.clearSelectedIDs()
+                self.G_den2ne_alg.selectBestIDs(criterion)
+                self.G_den2ne_alg.globalBalance(True, False, False, None, None)
+
+                # El conjunto mantenido durante el balance coincide con recorrer todos los nodos
+                expected = set(name for name, node in self.G.nodes.items() if node.load != 0 and name != self.G.root)
+                self.assertIsNotNone(self.G_den2ne_alg.enclosed)
+                self.assertEqual(self.G_den2ne_alg.getEnclosedNodes(), expected)
+                if not self.G_den2ne_alg.are_enlclosedLoads():
+                    break
+
+        # Las escrituras de cargas desde fuera del algoritmo también invalidan el conjunto
+        snapshot = self.G.snapshot()
+        name = next(name for name in self.G.names if name != self.G.root)
+        self.G.nodes[name].load = 1.5
+        self.assertEqual(self.G_den2ne_alg.getEnclosedNodes(), {name})
+
+        self.G.nodes[name].load = 0.0
+        self.assertFalse(self.G_den2ne_alg.are_enlclosedLoads())
+
+        self.G_den2ne_alg.updateLoads(self.loads, 40)
+        loaded = self.G.snapshot()
+        self.G.restore(snapshot)
+        self.assertFalse(self.G_den2ne_alg.are_enlclosedLoads())
+        self.G.restore(loaded)
+        expected = set(name for name, node in self.G.nodes.items() if node.load != 0 and name != self.G.root)
+        self.assertTrue(expected)
+        self.assertEqual(self.G_den2ne_alg.getEnclosedNodes(), expected)
+
+    def test_n_balance_order(self):
+        self.G_den2ne_alg.updateLoads(self.loads, 10)
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+
+        # El orden por cubetas es el mismo que el de la ordenación estable
+        expected = sorted(self.G_den2ne_alg.global_ids, key=Den2ne.key_sort_by_HLMAC_len, reverse=True)
+        order = self.G_den2ne_alg.getBalanceOrder()
+        self.assertEqual([id.hlmac for id in order], [id.hlmac for id in expected])
+
+        # Con la misma selección en el siguiente instante se reutiliza el orden
+        self.G_den2ne_alg.globalBalance(True, False, False, None, None)
+        self.assertEqual(len(self.G_den2ne_alg.global_ids), 1)
+        self.G_den2ne_alg.updateLoads(self.loads, 11)
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+        self.assertIs(self.G_den2ne_alg.getBalanceOrder(), order)
+
+    def test_o_selection_cache(self):
+        for criterion in (Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_DISTANCE):
+            self.G_den2ne_alg.selection_cache.clear()
+            self.G_den2ne_alg.clearSelectedIDs()
+            self.G_den2ne_alg.selectBestIDs(criterion)
+            expected = [node.getActiveID() for node in self.G.nodes.values()]
+            switches = [sw["state"] for sw in self.G.sw_config.values()]
+            entry = self.G_den2ne_alg.selection_cache[self.G_den2ne_alg.getSelectionKey(criterion)]
+
+            # Desordenamos los switches y volvemos a seleccionar: la selección sale de la caché
+            for sw in self.G.sw_config:
+                if not self.G.sw_config[sw]["pruned"]:
+                    self.G.setSwitchConfig(sw, "closed")
+            self.G_den2ne_alg.clearSelectedIDs()
+            self.G_den2ne_alg.selectBestIDs(criterion)
+
+            self.assertEqual(len(self.G_den2ne_alg.selection_cache), 1)
+            self.assertIs(self.G_den2ne_alg.selection_cache[self.G_den2ne_alg.getSelectionKey(criterion)], entry)
+            self.assertEqual([node.getActiveID() for node in self.G.nodes.values()], expected)
+            self.assertEqual(self.G_den2ne_alg.global_ids, expected)
+            self.assertEqual([sw["state"] for sw in self.G.sw_config.values()], switches)
+
+        # Los criterios que dependen de la carga no se guardan
+        self.G_den2ne_alg.clearSelectedIDs()
+        self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_POWER_TO_ZERO)
+        self.assertEqual(len(self.G_den2ne_alg.selection_cache), 1)
+
+        # Con consistent la selección es otra entrada de la caché (no se restaura la selección sin reparar)
+        self.G_den2ne_alg.consistent = True
+        try:
+            self.G_den2ne_alg.clearSelectedIDs()
+            self.G_den2ne_alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+            self.assertEqual(len(self.G_den2ne_alg.selection_cache), 2)
+            self.assertIn(self.G_den2ne_alg.getSelectionKey(Den2ne.CRITERION_DISTANCE), self.G_den2ne_alg.selection_cache)
+        finally:
+            self.G_den2ne_alg.consistent = False
+
+    def test_p_power2zero_scores(self):
+        alg = self.G_den2ne_alg
+        scorers = {
+            Den2ne.CRITERION_POWER_TO_ZERO: lambda id: 0.5 * alg.getTotalPower2Zero(id) + 0.5 * id.depth,
+            Den2ne.CRITERION_POWER_TO_ZERO_WITH_LOSSES: alg.getTotalPower2Zero_with_Losses,
+        }
+
+        for delta in range(0, 96, 8):
+            alg.updateLoads(self.loads, delta)
+            for criterion, scorer in scorers.items():
+                alg.clearSelectedIDs()
+                alg.selectBestIDs(criterion)
+
+                # La puntuación en bloque elige la misma ID (la primera en caso de empate) que la de cada ID por separado
+                for node in self.G.nodes.values():
+                    scores = [scorer(id) for id in node.ids]
+                    self.assertIs(node.getActiveID(), node.ids[scores.index(min(scores))])
+
+    def test_q_switch_toggles(self):
+        alg = self.G_den2ne_alg
+        alg.updateLoads(self.loads, 20)
+        for criterion in (Den2ne.CRITERION_NUM_HOPS, Den2ne.CRITERION_POWER_TO_ZERO):
+            alg.clearSelectedIDs()
+            alg.selectBestIDs(criterion)
+
+            # La máscara de dependencias es la unión de las listas depends_on
+            closed = set(sw for id in alg.global_ids for sw in id.depends_on)
+            mask = alg.setSwitchesConfig()
+            self.assertEqual(set(sw for sw in self.G.sw_config if (mask >> sw) & 1), closed)
+            for sw, config in self.G.sw_config.items():
+                if sw in closed:
+                    self.assertEqual(config["state"], "closed")
+                elif not config["pruned"]:
+                    self.assertEqual(config["state"], "open")
+
+            # Volver a aplicar la misma selección no cambia ningún switch; cambiar uno a mano cuenta un cambio
+            toggles = alg.switch_toggles
+            alg.setSwitchesConfig()
+            self.assertEqual(alg.switch_toggles, toggles)
+
+            sw = next(sw for sw, config in self.G.sw_config.items() if not config["pruned"])
+            self.G.setSwitchConfig(sw, "open" if sw in closed else "closed")
+            alg.setSwitchesConfig()
+            self.assertEqual(alg.switch_toggles, toggles + 1)
+
+
 if __name__ == "__main__":
     unittest.main()
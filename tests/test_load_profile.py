@@ -0,0 +1,91 @@
+import glob
+import os
+import tempfile
+import unittest
+import numpy as np
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+from dataCollector.dataCollector import DataGatherer
+
+
+class TestLoadProfile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loads = DataGatherer.getLoads("src/data/loads/loads_v2.csv", 3)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.profile = DataGatherer.getLoadProfile("src/data/loads/loads_v2.csv", 3, cache=os.path.join(cls.tmp.name, "loads_v2"))
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.profile
+        cls.tmp.cleanup()
+
+    def test_a_same_as_get_loads(self):
+        self.assertIsInstance(self.profile.data, np.memmap)
+        self.assertEqual(list(self.profile), list(self.loads))
+        for node in self.loads:
+            self.assertEqual(self.profile[node].tolist(), self.loads[node])
+
+        # La segunda lectura reutiliza la caché
+        profile = DataGatherer.getLoadProfile("src/data/loads/loads_v2.csv", 3, cache=os.path.join(self.tmp.name, "loads_v2"))
+        self.assertEqual(profile.getDelta(5), self.profile.getDelta(5))
+
+    def test_b_update_loads(self):
+        edges = DataGatherer.getEdges("src/data/ieee123/links.csv")
+        edges_conf = DataGatherer.getEdges_Config("src/data/links/links_config_8.csv")
+        sw_edges = DataGatherer.getSwitches("src/data/ieee123/switches.csv")
+        G = Graph(0, self.loads, edges, sw_edges, edges_conf, root="150")
+        G.pruneGraph()
+        G_den2ne_alg = Den2ne(G)
+
+        for delta in [0, 50, 95]:
+            G_den2ne_alg.updateLoads(self.loads, delta)
+            expected = [node.load for node in G.nodes.values()]
+            G_den2ne_alg.updateLoads(self.profile, delta)
+            self.assertEqual([node.load for node in G.nodes.values()], expected)
+
+            window = self.profile.window(G.names, delta, delta + 1)
+            self.assertEqual(window[:, 0].tolist(), expected)
+
+    def test_c_cache_key(self):
+        cache = os.path.join(self.tmp.name, "loads_key")
+        filename = os.path.join(self.tmp.name, "loads.csv")
+        with open(filename, "w") as file:
+            file.write("node,d0,d1\n1,1.23456,2.5\n2,-0.98765,1\n")
+
+        # Cada redondeo tiene su propia caché
+        self.assertEqual(DataGatherer.getLoadProfile(filename, 3, cache=cache)["1"].tolist(), [1.235, 2.5])
+        self.assertEqual(DataGatherer.getLoadProfile(filename, 1, cache=cache)["1"].tolist(), [1.2, 2.5])
+        self.assertEqual(DataGatherer.getLoadProfile(filename, 3, cache=cache)["2"].tolist(), [-0.988, 1.0])
+
+        # Un CSV modificado no reutiliza la caché anterior, y las líneas vacías no cuentan como nodos
+        with open(filename, "w") as file:
+            file.write("node,d0,d1\n1,4,5\n\n2,6,7\n3,8,9\n\n")
+
+        profile = DataGatherer.getLoadProfile(filename, 3, cache=cache)
+        self.assertEqual(profile.data.shape, (2, 3))
+        self.assertEqual(list(profile), ["1", "2", "3"])
+        self.assertEqual(profile.getDelta(1), {"1": 5.0, "2": 7.0, "3": 9.0})
+
+        # La caché anterior del mismo redondeo se borra; la del otro redondeo se conserva hasta que se vuelve a leer
+        self.assertEqual(len(glob.glob(cache + "_*.npy")), 4)
+        self.assertEqual(DataGatherer.getLoadProfile(filename, 1, cache=cache)["1"].tolist(), [4.0, 5.0])
+        self.assertEqual(len(glob.glob(cache + "_*.npy")), 4)
+
+    def test_d_time_major(self):
+        # Cada instante es un bloque contiguo (instantes x nodos), con y sin caché
+        uncached = DataGatherer.getLoadProfile("src/data/loads/loads_v2.csv", 3)
+        for profile in (self.profile, uncached):
+            self.assertEqual(profile.data.shape, (len(self.loads["1"]), len(self.loads)))
+            self.assertTrue(profile.data.flags["C_CONTIGUOUS"])
+            self.assertEqual(profile.getDelta(7), {node: loads[7] for node, loads in self.loads.items()})
+
+            names = ["missing"] + list(self.loads)[::-1]
+            window = profile.window(names, 3, 6)
+            self.assertEqual(window[0].tolist(), [0.0, 0.0, 0.0])
+            self.assertEqual(window[1:].tolist(), [self.loads[name][3:6] for name in names[1:]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import unittest
+import main
+
+
+class TestParallelDriver(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Los drivers leen de data/ y escriben en results/ relativos al directorio de trabajo
+        cls.cwd = os.getcwd()
+        cls.tmp = tempfile.TemporaryDirectory()
+        os.symlink(os.path.join(cls.cwd, "src", "data"), os.path.join(cls.tmp.name, "data"))
+        os.chdir(cls.tmp.name)
+
+        cls.deltas = [0, 50]
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.test_ieee123(deltas=cls.deltas)
+            main.test_ieee123_parallel(workers=2, chunksize=1, deltas=cls.deltas)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.tmp.cleanup()
+
+    def read_csv(self, filename):
+        with open(filename, "r") as file:
+            return list(csv.reader(file))
+
+    def test_a_same_outdata(self):
+        for delta in self.deltas:
+            sequential = self.read_csv(f"results/ieee123/csv/outdata_d{delta}.csv")
+            parallel = self.read_csv(f"results/ieee123_parallel/csv/outdata_d{delta}.csv")
+
+            # Mismas columnas y mismas filas, salvo los tiempos de ejecución
+            self.assertEqual(sequential[0], parallel[0])
+            columns = [i for i, column in enumerate(sequential[0]) if not column.startswith("timestamp_")]
+            self.assertEqual(len(sequential), len(parallel))
+            for row, parallel_row in zip(sequential, parallel):
+                self.assertEqual([row[i] for i in columns], [parallel_row[i] for i in columns])
+
+    def test_b_same_reports(self):
+        for kind in ("reports", "csv"):
+            names = sorted(os.listdir(f"results/ieee123/{kind}"))
+            self.assertEqual(names, sorted(os.listdir(f"results/ieee123_parallel/{kind}")))
+
+            for name in names:
+                if name.startswith("outdata_"):
+                    continue
+                with open(f"results/ieee123/{kind}/{name}") as file, open(f"results/ieee123_parallel/{kind}/{name}") as other:
+                    self.assertEqual(file.read(), other.read(), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from graph.graph import Graph
+from den2ne.den2neALG import Den2ne
+from den2ne.den2neMultiroot import Multiroot
+from dataCollector.dataCollector import DataGatherer
+
+
+def balance_root(root, alg, loads):
+    alg.updateLoads(loads, 1)
+    alg.selectBestIDs(Den2ne.CRITERION_DISTANCE)
+    return alg.globalBalance(withLosses=True, withCap=False, withDebugPlot=False, positions=None, path="results/")
+
+
+class TestMultiroot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loads = DataGatherer.getLoads("src/data/loads/loads_v2.csv", 3)
+        cls.edges = DataGatherer.getEdges("src/data/ieee123/links.csv")
+        cls.edges_conf = DataGatherer.getEdges_Config("src/data/links/links_config.csv")
+        cls.sw_edges = DataGatherer.getSwitches("src/data/ieee123/switches.csv")
+        cls.roots = ["150", "1", "47", "610"]
+
+    def build(self, root):
+        return Graph(0, self.loads, self.edges, self.sw_edges, self.edges_conf, root=root)
+
+    def spread(self, root):
+        G = self.build(root)
+        alg = Den2ne(G)
+        alg.spread_ids()
+        return alg
+
+    def test_a_same_ids_as_spread(self):
+        multiroot = Multiroot(self.build("150"), self.roots)
+        multiroot.spread(workers=1)
+
+        for root in self.roots:
+            expected = self.spread(root)
+            alg = multiroot.view(root)
+            self.assertEqual(alg.root, root)
+            for name, node in alg.G.nodes.items():
+                ids = expected.G.nodes[name].ids
+                self.assertEqual([(id.hlmac, id.depends_on, id.dist) for id in node.ids],
+                                 [(id.hlmac, id.depends_on, id.dist) for id in ids])
+
+        self.assertEqual(multiroot.G.nodes["1"].ids_root_count, len(self.roots))
+
+    def test_b_map_in_pool(self):
+        multiroot = Multiroot(self.build("150"), self.roots)
+        multiroot.spread(workers=2)
+        results = dict(multiroot.map(balance_root, workers=2, args=(self.loads,)))
+
+        self.assertEqual(list(results), self.roots)
+        for root in self.roots:
+            self.assertEqual(results[root], balance_root(root, self.spread(root), self.loads))
+
+
+if __name__ == "__main__":
+    unittest.main()